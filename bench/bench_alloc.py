@@ -0,0 +1,142 @@
+"""Benchmark of the memory allocated by the block transactions of SMBus.
+
+Every block transaction is run against a backend that returns
+immediately, once with the scratch union each SMBus object reuses and
+once allocating a new union per call with ffi.new as earlier versions
+did.  For each the time per call, the peak bytes of Python objects
+allocated by a single call, e.g. the result list, and the bytes still
+allocated after a number of calls are reported (tracemalloc, not
+available on PyPy).  The unions allocated by ffi.new are not visible to
+tracemalloc, their cost shows in the time per call:
+
+    python bench/bench_alloc.py
+    python bench/bench_alloc.py --output alloc.json
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from smbus import SMBus, ffi  # noqa: E402
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+sys.path.insert(0, os.path.dirname(__file__))
+from bench_smbus import ADDR, NullBackend  # noqa: E402
+
+
+class FreshUnionSMBus(SMBus):
+    """SMBus allocating a new union for every transaction"""
+
+    @property
+    def _data(self):
+        return ffi.new("union i2c_smbus_data *")
+
+    @_data.setter
+    def _data(self, value):
+        pass
+
+
+def block_calls():
+    block = bytes(bytearray(range(32)))
+    return [
+        ('read_block_data', lambda bus: bus.read_block_data(ADDR, 1)),
+        ('read_block_data_bytes',
+         lambda bus: bus.read_block_data_bytes(ADDR, 1)),
+        ('write_block_data', lambda bus: bus.write_block_data(ADDR, 1, block)),
+        ('block_process_call',
+         lambda bus: bus.block_process_call(ADDR, 1, block)),
+        ('read_i2c_block_data', lambda bus: bus.read_i2c_block_data(ADDR, 1)),
+        ('read_i2c_block_data_bytes',
+         lambda bus: bus.read_i2c_block_data_bytes(ADDR, 1)),
+        ('write_i2c_block_data',
+         lambda bus: bus.write_i2c_block_data(ADDR, 1, block)),
+    ]
+
+
+class FullBlockBackend(NullBackend):
+    """NullBackend returning 32 byte blocks"""
+
+    def access(self, fd, read_write, cmd, size, data):
+        data.block[0] = 32
+        return 0
+
+
+def per_call(fn, number):
+    """Best time of one call in ns"""
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e9
+
+
+def allocated(fn, number):
+    """(peak bytes of one call, bytes retained after number calls)"""
+    if tracemalloc is None:
+        return None, None
+    fn()
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        fn()
+        peak = tracemalloc.get_traced_memory()[1] - start
+        for i in range(number):
+            fn()
+        return peak, tracemalloc.get_traced_memory()[0] - start
+    finally:
+        tracemalloc.stop()
+
+
+def run(number):
+    results = {}
+    for variant, cls in (('scratch', SMBus), ('fresh', FreshUnionSMBus)):
+        bus = cls(1, backend=FullBlockBackend())
+        for name, call in block_calls():
+            peak, retained = allocated(lambda: call(bus), number)
+            results.setdefault(name, {})[variant] = {
+                'ns': per_call(lambda: call(bus), number),
+                'peak_bytes': peak,
+                'retained_bytes': retained,
+            }
+    return {
+        'meta': {
+            'implementation': platform.python_implementation(),
+            'python': platform.python_version(),
+            'number': number,
+        },
+        'results': results,
+    }
+
+
+def print_table(results):
+    print("%-26s %10s %10s %10s %10s" % (
+        'benchmark', 'ns', 'fresh ns', 'peak B', 'retained'))
+    for name, r in sorted(results['results'].items()):
+        scratch, fresh = r['scratch'], r['fresh']
+
+        def fmt(value, spec='%10d'):
+            return spec % value if value is not None else '%10s' % '-'
+        print("%-26s %10.1f %10.1f %s %s" % (
+            name, scratch['ns'], fresh['ns'], fmt(scratch['peak_bytes']),
+            fmt(scratch['retained_bytes'])))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', '--number', type=int, default=20000)
+    parser.add_argument('-o', '--output', help='write JSON results to file')
+    options = parser.parse_args()
+
+    results = run(options.number)
+    print_table(results)
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""Benchmark of the time to import smbus.
+
+Each run starts a fresh interpreter; the time of an interpreter running
+"pass" is subtracted, so the result is the cost "import smbus" adds to a
+short-lived script.  Opening the first bus, which loads the compiled
+extension, is measured separately.  With --budget the script exits with
+status 1 if importing takes longer than that many milliseconds:
+
+    python bench/bench_import.py --budget 20
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+BASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+SCRIPTS = [
+    ('baseline', 'pass'),
+    ('import', 'import smbus'),
+    ('import_and_load', 'import smbus; smbus.SMBus()'),
+]
+
+
+def run_script(code, repeat):
+    """Best wall clock time of a fresh interpreter running code in ms"""
+    times = []
+    for i in range(repeat):
+        start = time.time()
+        subprocess.check_call([sys.executable, '-c', code], cwd=BASE_DIR)
+        times.append((time.time() - start) * 1e3)
+    return min(times)
+
+
+def loaded_modules():
+    """Modules of smbus and cffi loaded by import smbus"""
+    code = ("import sys; before = set(sys.modules); import smbus; "
+            "print(' '.join(sorted(m for m in set(sys.modules) - before "
+            "if 'smbus' in m or 'cffi' in m)))")
+    out = subprocess.check_output([sys.executable, '-c', code], cwd=BASE_DIR)
+    return out.decode().split()
+
+
+def run(repeat):
+    times = dict((name, run_script(code, repeat)) for name, code in SCRIPTS)
+    baseline = times.pop('baseline')
+    return {
+        'meta': {
+            'implementation': platform.python_implementation(),
+            'python': platform.python_version(),
+            'repeat': repeat,
+        },
+        'baseline_ms': baseline,
+        'import_ms': times['import'] - baseline,
+        'load_ms': times['import_and_load'] - times['import'],
+        'modules': loaded_modules(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-r', '--repeat', type=int, default=20)
+    parser.add_argument('-o', '--output', help='write JSON results to file')
+    parser.add_argument('--budget', type=float,
+                        help='maximum milliseconds import smbus may take')
+    options = parser.parse_args()
+
+    results = run(options.repeat)
+    print("interpreter       %8.1f ms" % results['baseline_ms'])
+    print("import smbus      %8.1f ms" % results['import_ms'])
+    print("load extension    %8.1f ms" % results['load_ms'])
+    print("modules loaded    %s" % ' '.join(results['modules']))
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if options.budget is not None and results['import_ms'] > options.budget:
+        print("OVER BUDGET import smbus took %.1f ms, budget %.1f ms" % (
+            results['import_ms'], options.budget))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+"""Benchmark of the software PEC of smbus.pec.
+
+The CRC-8 kernel is timed on buffers of typical SMBus frame sizes and
+larger ones, as the table driven C implementation behind smbus.pec.crc8
+and as pure Python table and bitwise loops for comparison.  The word and
+block transactions are then timed with and without SoftwarePEC against
+a backend that returns immediately with a valid PEC, i.e. the overhead
+PEC adds to the same transaction emulated with I2C_RDWR:
+
+    python bench/bench_pec.py
+    python bench/bench_pec.py --output pec.json
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from smbus import SMBus, ffi  # noqa: E402
+from smbus.pec import SoftwarePEC, crc8  # noqa: E402
+from smbus.smbus import SMBUS  # noqa: E402
+
+sys.path.insert(0, os.path.dirname(__file__))
+from bench_smbus import ADDR, NullBackend  # noqa: E402
+
+SIZES = (2, 5, 35, 256, 4096, 65536)
+
+
+def _table():
+    table = []
+    for i in range(256):
+        crc = i
+        for bit in range(8):
+            crc = (crc << 1 ^ 0x07 if crc & 0x80 else crc << 1) & 0xFF
+        table.append(crc)
+    return table
+
+
+TABLE = _table()
+
+
+def python_table_crc8(data, crc=0):
+    table = TABLE
+    for byte in bytearray(data):
+        crc = table[crc ^ byte]
+    return crc
+
+
+def python_bitwise_crc8(data, crc=0):
+    for byte in bytearray(data):
+        crc ^= byte
+        for bit in range(8):
+            crc = (crc << 1 ^ 0x07 if crc & 0x80 else crc << 1) & 0xFF
+    return crc
+
+
+KERNELS = [
+    ('c_table', crc8),
+    ('python_table', python_table_crc8),
+    ('python_bitwise', python_bitwise_crc8),
+]
+
+
+class PecReplyBackend(NullBackend):
+    """NullBackend of an adapter supporting plain I2C only, answering
+    reads with zero data and a valid PEC"""
+
+    def __init__(self, replies):
+        # read length -> reply
+        self.replies = replies
+
+    def funcs(self, fd, funcs):
+        funcs[0] = SMBUS.I2C_FUNC_I2C
+        return 0
+
+    def rdwr(self, fd, msgs, nmsgs):
+        last = msgs[nmsgs - 1]
+        if last.flags & SMBUS.I2C_M_RD:
+            ffi.memmove(last.buf, self.replies[last.len], last.len)
+        return nmsgs
+
+
+def replies():
+    """Replies of read_word_data(ADDR, 1) and read_block_data(ADDR, 1),
+    with and without PEC"""
+    header = bytearray([ADDR << 1, 1, ADDR << 1 | 1])
+    word = bytearray(2)
+    block = bytearray([32]) + bytearray(32)
+    return {
+        2: bytes(word),
+        33: bytes(block),
+        3: bytes(word + bytearray([crc8(header + word)])),
+        34: bytes(block + bytearray([crc8(header + block)])),
+    }
+
+
+def transaction_calls():
+    block = bytes(bytearray(range(32)))
+    return [
+        ('read_word_data', lambda bus: bus.read_word_data(ADDR, 1)),
+        ('write_word_data', lambda bus: bus.write_word_data(ADDR, 1, 0x1234)),
+        ('read_block_data', lambda bus: bus.read_block_data(ADDR, 1)),
+        ('write_block_data', lambda bus: bus.write_block_data(ADDR, 1, block)),
+    ]
+
+
+def best(fn, number):
+    """Best time of one call in seconds"""
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number
+
+
+def run(number):
+    kernels = {}
+    for size in SIZES:
+        data = bytes(bytearray(i & 0xFF for i in range(size)))
+        n = max(1, number * 16 // size)
+        for name, kernel in KERNELS:
+            if name == 'python_bitwise' and size > 4096:
+                continue
+            seconds = best(lambda: kernel(data), n)
+            kernels.setdefault(str(size), {})[name] = {
+                'ns': seconds * 1e9,
+                'mb_per_s': size / seconds / 1e6,
+            }
+    transactions = {}
+    plain = SMBus(1, backend=PecReplyBackend(replies()))
+    plain.funcs_policy = 'emulate'
+    pec = SMBus(1, backend=PecReplyBackend(replies()))
+    pec.add_layer(SoftwarePEC())
+    for name, call in transaction_calls():
+        transactions[name] = {
+            'rdwr_ns': best(lambda: call(plain), number) * 1e9,
+            'pec_ns': best(lambda: call(pec), number) * 1e9,
+        }
+    return {
+        'meta': {
+            'implementation': platform.python_implementation(),
+            'python': platform.python_version(),
+            'number': number,
+        },
+        'kernels': kernels,
+        'transactions': transactions,
+    }
+
+
+def print_table(results):
+    names = [name for name, kernel in KERNELS]
+    print("%-8s %s" % ('bytes', ' '.join('%16s' % n for n in names)))
+    for size in SIZES:
+        r = results['kernels'][str(size)]
+        print("%-8d %s" % (size, ' '.join(
+            '%11.1f MB/s' % r[n]['mb_per_s'] if n in r else '%16s' % '-'
+            for n in names)))
+    print()
+    print("%-20s %10s %10s" % ('transaction', 'ns', 'pec ns'))
+    for name, r in sorted(results['transactions'].items()):
+        print("%-20s %10.1f %10.1f" % (name, r['rdwr_ns'], r['pec_ns']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', '--number', type=int, default=20000)
+    parser.add_argument('-o', '--output', help='write JSON results to file')
+    options = parser.parse_args()
+
+    results = run(options.number)
+    print_table(results)
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,292 @@
+"""Benchmark suite for the per-transaction overhead of SMBus.
+
+Every SMBus transaction method, smbus_data_to_list and list_to_smbus_data
+are timed.  No I2C hardware is needed, each method is measured three ways:
+
+  sim     complete call against smbus.sim.SimulatedBus with no latency
+  python  complete call against a backend that returns immediately, i.e.
+          the Python overhead of SMBus itself
+  ffi     the bare C helper the method uses, called on a file descriptor
+          that rejects the ioctl (one FFI crossing plus one syscall)
+
+together with the peak bytes allocated by a single call (tracemalloc,
+not available on PyPy).  Results are printed as a table or written as
+JSON, which --compare checks against an earlier run:
+
+    python bench/bench_smbus.py --output results.json
+    python bench/bench_smbus.py --compare results.json --tolerance 0.2
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import cffi  # noqa: E402
+from smbus import SMBus, i2c_msg  # noqa: E402
+from smbus import ffi, list_to_smbus_data, smbus_data_to_list  # noqa: E402
+from smbus import smbus_data_to_bytes  # noqa: E402
+from smbus.__about__ import __version__  # noqa: E402
+from smbus.backend import KERNEL  # noqa: E402
+from smbus.sim import SimulatedBus, RegisterDevice  # noqa: E402
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+ADDR = 0x50
+
+
+class NullBackend(object):
+    """Backend completing every transaction immediately"""
+
+    def open(self, bus):
+        return 0
+
+    def close(self, fd):
+        pass
+
+    def ioctl(self, fd, request, arg):
+        return 0
+
+    def funcs(self, fd, funcs):
+        funcs[0] = 0xFFFFFFFF
+        return 0
+
+    def access(self, fd, read_write, cmd, size, data):
+        return 0
+
+    def xfer(self, fd, cur, addr, read_write, cmd, size, value):
+        return 0
+
+    def xfer_retry(self, fd, cur, addr, read_write, cmd, size, value, tries,
+                   delay_us, attempts):
+        return 0
+
+    def rdwr(self, fd, msgs, nmsgs):
+        return nmsgs
+
+    def read_block_into(self, fd, cmd, size, buf, length):
+        return length
+
+    def read_registers(self, fd, size, cmds, vals, n):
+        return n
+
+    def write_registers(self, fd, size, cmds, vals, n):
+        return n
+
+    def read_i2c_block_stream(self, fd, cmd, buf, length, chunk):
+        return length
+
+    def write_i2c_block_stream(self, fd, cmd, buf, length, chunk, tries,
+                               delay_us, written):
+        return length
+
+    def read_fifo(self, fd, cmd, buf, length):
+        return length
+
+
+def transactions():
+    """(name, call, ffi call) for every benchmark; call(bus) performs the
+    transaction, ffi call(fd) the bare C helper"""
+    block = list(range(16))
+    buf = bytearray(16)
+    page = bytearray(128)
+    data = ffi.new("union i2c_smbus_data *")
+    cmds = ffi.new("__u8[]", list(range(8)))
+    vals = ffi.new("__u16[]", 8)
+    xfer = KERNEL.xfer
+    access = KERNEL.access
+
+    def transfer(bus):
+        bus.transfer([i2c_msg.write(ADDR, [0]), i2c_msg.read(ADDR, 2)])
+
+    def rdwr(fd):
+        msgs = ffi.new("struct i2c_msg[]", 2)
+        KERNEL.rdwr(fd, msgs, 2)
+
+    return [
+        ('write_quick', lambda bus: bus.write_quick(ADDR),
+         lambda fd: xfer(fd, ADDR, ADDR, 0, 0, 0, 0)),
+        ('read_byte', lambda bus: bus.read_byte(ADDR),
+         lambda fd: xfer(fd, ADDR, ADDR, 1, 0, 1, 0)),
+        ('write_byte', lambda bus: bus.write_byte(ADDR, 1),
+         lambda fd: xfer(fd, ADDR, ADDR, 0, 1, 1, 0)),
+        ('read_byte_data', lambda bus: bus.read_byte_data(ADDR, 1),
+         lambda fd: xfer(fd, ADDR, ADDR, 1, 1, 2, 0)),
+        ('read_byte_data_status',
+         lambda bus: bus.read_byte_data_status(ADDR, 1),
+         lambda fd: KERNEL.xfer_retry(fd, ADDR, ADDR, 1, 1, 2, 0, 1, 0,
+                                      ffi.NULL)),
+        ('write_byte_data', lambda bus: bus.write_byte_data(ADDR, 1, 2),
+         lambda fd: xfer(fd, ADDR, ADDR, 0, 1, 2, 2)),
+        ('read_word_data', lambda bus: bus.read_word_data(ADDR, 1),
+         lambda fd: xfer(fd, ADDR, ADDR, 1, 1, 3, 0)),
+        ('write_word_data', lambda bus: bus.write_word_data(ADDR, 1, 2),
+         lambda fd: xfer(fd, ADDR, ADDR, 0, 1, 3, 2)),
+        ('process_call', lambda bus: bus.process_call(ADDR, 1, 2),
+         lambda fd: xfer(fd, ADDR, ADDR, 0, 1, 4, 2)),
+        ('read_block_data', lambda bus: bus.read_block_data(ADDR, 1),
+         lambda fd: access(fd, 1, 1, 5, data)),
+        ('read_block_data_bytes',
+         lambda bus: bus.read_block_data_bytes(ADDR, 1),
+         lambda fd: access(fd, 1, 1, 5, data)),
+        ('read_block_data_into',
+         lambda bus: bus.read_block_data_into(ADDR, 1, buf),
+         lambda fd: KERNEL.read_block_into(fd, 1, 5, ffi.from_buffer(buf), 16)),
+        ('write_block_data', lambda bus: bus.write_block_data(ADDR, 1, block),
+         lambda fd: access(fd, 0, 1, 5, data)),
+        ('block_process_call',
+         lambda bus: bus.block_process_call(ADDR, 1, block),
+         lambda fd: access(fd, 0, 1, 7, data)),
+        ('read_i2c_block_data',
+         lambda bus: bus.read_i2c_block_data(ADDR, 1, 16),
+         lambda fd: access(fd, 1, 1, 8, data)),
+        ('read_i2c_block_data_bytes',
+         lambda bus: bus.read_i2c_block_data_bytes(ADDR, 1, 16),
+         lambda fd: access(fd, 1, 1, 8, data)),
+        ('read_i2c_block_data_into',
+         lambda bus: bus.read_i2c_block_data_into(ADDR, 1, buf),
+         lambda fd: KERNEL.read_block_into(fd, 1, 8, ffi.from_buffer(buf), 16)),
+        ('write_i2c_block_data',
+         lambda bus: bus.write_i2c_block_data(ADDR, 1, block),
+         lambda fd: access(fd, 0, 1, 6, data)),
+        ('read_i2c_block_data_stream',
+         lambda bus: bus.read_i2c_block_data_stream(ADDR, 0, page),
+         lambda fd: KERNEL.read_i2c_block_stream(fd, 0, ffi.from_buffer(page),
+                                                 128, 32)),
+        ('write_i2c_block_data_stream',
+         lambda bus: bus.write_i2c_block_data_stream(ADDR, 0, page),
+         lambda fd: KERNEL.write_i2c_block_stream(
+             fd, 0, ffi.from_buffer(page), 128, 32, 1, 0, ffi.NULL)),
+        ('read_registers', lambda bus: bus.read_registers(ADDR, list(range(8))),
+         lambda fd: KERNEL.read_registers(fd, 2, cmds, vals, 8)),
+        ('write_registers',
+         lambda bus: bus.write_registers(ADDR, [(i, i) for i in range(8)]),
+         lambda fd: KERNEL.write_registers(fd, 2, cmds, vals, 8)),
+        ('transfer', transfer, rdwr),
+    ]
+
+
+def conversions():
+    data = ffi.new("union i2c_smbus_data *")
+    block = list(range(32))
+    list_to_smbus_data(data, block)
+    return [
+        ('list_to_smbus_data', lambda: list_to_smbus_data(data, block)),
+        ('smbus_data_to_list', lambda: smbus_data_to_list(data)),
+        ('smbus_data_to_bytes', lambda: smbus_data_to_bytes(data)),
+    ]
+
+
+def per_call(fn, number):
+    """Best time of one call in ns"""
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e9
+
+
+def peak_bytes(fn):
+    if tracemalloc is None:
+        return None
+    fn()
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        fn()
+        return tracemalloc.get_traced_memory()[1] - start
+    finally:
+        tracemalloc.stop()
+
+
+def run(number):
+    sim = SMBus(1, backend=SimulatedBus(
+        {ADDR: RegisterDevice(blocks={1: b'\x01\x02\x03\x04'})}))
+    null = SMBus(1, backend=NullBackend())
+    devnull = os.open(os.devnull, os.O_RDWR)
+    results = {}
+    try:
+        for name, call, ffi_call in transactions():
+            results[name] = {
+                'sim_ns': per_call(lambda: call(sim), number),
+                'python_ns': per_call(lambda: call(null), number),
+                'ffi_ns': per_call(lambda: ffi_call(devnull), number),
+                'peak_bytes': peak_bytes(lambda: call(null)),
+            }
+            results[name]['calls_per_sec'] = 1e9 / results[name]['sim_ns']
+        for name, call in conversions():
+            results[name] = {
+                'python_ns': per_call(call, number),
+                'peak_bytes': peak_bytes(call),
+            }
+    finally:
+        os.close(devnull)
+    return {
+        'meta': {
+            'implementation': platform.python_implementation(),
+            'python': platform.python_version(),
+            'cffi': cffi.__version__,
+            'smbus-cffi': __version__,
+            'machine': platform.machine(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'number': number,
+        },
+        'results': results,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Return the names of benchmarks whose python_ns regressed by more
+    than tolerance relative to baseline"""
+    regressions = []
+    for name, result in sorted(results['results'].items()):
+        old = baseline['results'].get(name)
+        if old is None:
+            continue
+        ratio = result['python_ns'] / old['python_ns']
+        if ratio > 1 + tolerance:
+            regressions.append(name)
+            print("REGRESSION %-26s %8.1f ns -> %8.1f ns (%+.0f%%)" % (
+                name, old['python_ns'], result['python_ns'],
+                (ratio - 1) * 100))
+    return regressions
+
+
+def print_table(results):
+    print("%-26s %10s %10s %10s %12s %10s" % (
+        'benchmark', 'sim ns', 'python ns', 'ffi ns', 'calls/s', 'peak B'))
+    for name, r in sorted(results['results'].items()):
+        def fmt(key, spec='%10.1f'):
+            value = r.get(key)
+            return spec % value if value is not None else '%10s' % '-'
+        print("%-26s %s %s %s %s %s" % (
+            name, fmt('sim_ns'), fmt('python_ns'), fmt('ffi_ns'),
+            fmt('calls_per_sec', '%12.0f'), fmt('peak_bytes', '%10d')))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', '--number', type=int, default=20000)
+    parser.add_argument('-o', '--output', help='write JSON results to file')
+    parser.add_argument('--compare', help='JSON results of an earlier run')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed relative slowdown (default 0.2)')
+    options = parser.parse_args()
+
+    results = run(options.number)
+    print_table(results)
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if options.compare:
+        with open(options.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, options.tolerance):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""Microbenchmark for the per-call overhead of smbus.util.validate.
+
+Compares the argument checking wrapper of read_byte_data against the
+undecorated method and the generic closure based validate wrapper used
+before the checkers were generated per method.
+
+    python bench/bench_validate.py [-n NUMBER]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from smbus.util import validate, validators  # noqa: E402
+
+
+def legacy_validate(**schema):
+    """The generic validate wrapper as of smbus-cffi 0.5.1"""
+    def wrapper(fn):
+        code = fn.__code__
+        nargs = code.co_argcount
+        varnames = code.co_varnames
+        defaults = fn.__defaults__ if fn.__defaults__ else []
+        kwdefaults = fn.__kwdefaults__ if fn.__kwdefaults__ else {}
+
+        def validator(*args):
+            largs = len(args)
+
+            if largs != nargs and largs + len(defaults) + len(kwdefaults) != nargs:
+                raise TypeError("%s() takes exactly %d arguments (%d given)" %
+                                (fn.__name__, nargs, len(args) + len(kwdefaults)))
+            for i, value in enumerate(args):
+                name = varnames[i]
+                if name not in schema:
+                    continue
+                typ = schema[name]
+                validators[typ](value)
+            if largs < nargs:
+                for i in range(largs, nargs):
+                    value = defaults[largs - i]
+                    name = varnames[i]
+                    if name not in schema:
+                        continue
+                    typ = schema[name]
+                    validators[typ](value)
+            return fn(*args, **kwdefaults)
+        return validator
+    return wrapper
+
+
+class Bus(object):
+    def read_byte_data(self, addr, cmd):
+        return 0
+
+    undecorated = read_byte_data
+    legacy = legacy_validate(addr=int, cmd=int)(read_byte_data)
+    generated = validate(addr=int, cmd=int)(read_byte_data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', '--number', type=int, default=1000000)
+    options = parser.parse_args()
+
+    bus = Bus()
+    results = {}
+    for name in ('undecorated', 'legacy', 'generated'):
+        method = getattr(bus, name)
+        best = min(timeit.repeat(lambda: method(0x20, 0x10),
+                                 number=options.number, repeat=5))
+        results[name] = best / options.number * 1e9
+    for name in ('legacy', 'generated'):
+        print("%-10s %7.1f ns/call, overhead %7.1f ns" % (
+            name, results[name], results[name] - results['undecorated']))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,12 @@
-from .smbus import ffi
+from ._lazy import lazy
 from .smbus import SMBus
+from .smbus import i2c_msg
+from .smbus import Funcs
 from .smbus import list_to_smbus_data
 from .smbus import smbus_data_to_list
+from .smbus import smbus_data_to_bytes
+from .threadsafe import ThreadSafeSMBus
+from .threadsafe import shared_bus
+
+# the compiled module is loaded on first use, see smbus._lazy
+ffi = lazy(globals(), 'ffi', 'ffi')
@@ -0,0 +1,52 @@
+"""Lazy loading of the compiled _smbus_cffi module.
+
+Loading the extension and _cffi_backend dominates the time to import
+smbus, which short-lived scripts on small boards pay on every run.
+Modules therefore bind ffi and lib with lazy() and the extension is only
+loaded when one of them is first used, usually by creating the first
+SMBus object.  Loading rebinds every name registered with lazy() to the
+real object, so later accesses cost nothing extra."""
+
+_module = None
+_names = []
+
+
+def load():
+    """load() -> the _smbus_cffi module, loading it on the first call"""
+    global _module
+    if _module is None:
+        from . import _smbus_cffi
+        for namespace, name, attr in _names:
+            if isinstance(namespace.get(name), _Lazy):
+                namespace[name] = getattr(_smbus_cffi, attr)
+        del _names[:]
+        _module = _smbus_cffi
+    return _module
+
+
+def lazy(namespace, name, attr):
+    """lazy(namespace, name, attr) -> object
+
+    Return a stand-in for the attribute attr ('ffi' or 'lib') of the
+    extension, to be bound to name in namespace, the globals() of a
+    module.  The name is rebound to the real object once the extension
+    is loaded.
+    """
+    if _module is not None:
+        return getattr(_module, attr)
+    _names.append((namespace, name, attr))
+    return _Lazy(attr)
+
+
+class _Lazy(object):
+    """Stand-in forwarding attribute access to the attribute of the
+    extension, for references taken before it was loaded"""
+
+    def __init__(self, attr):
+        self._attr = attr
+
+    def __getattr__(self, name):
+        return getattr(getattr(load(), self._attr), name)
+
+    def __repr__(self):
+        return '<lazy _smbus_cffi.%s>' % (self._attr,)
@@ -0,0 +1,167 @@
+"""asyncio interface to SMBus.
+
+All transactions of an AsyncSMBus run on one dedicated worker thread, so
+they are serialized per bus and the event loop never blocks on an ioctl.
+Transactions queued while the worker is busy, or in the same iteration
+of the event loop, are executed in a single hop to the worker, each
+result is delivered back to the loop as soon as its transaction is
+done.
+
+Requires Python 3.7 or later."""
+
+import asyncio
+import collections
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .smbus import SMBus
+from .smbus import TRANSACTIONS
+
+
+def _transaction(name):
+    method = getattr(SMBus, name)
+
+    def transaction(self, *args, **kwargs):
+        return self._submit(getattr(self.smbus, name), args, kwargs)
+    transaction.__name__ = name
+    transaction.__doc__ = "%s\n\n        Awaitable version of SMBus.%s." % (
+        method.__doc__.strip().splitlines()[0], name)
+    return transaction
+
+
+class AsyncSMBus(object):
+    """AsyncSMBus([bus[, smbus]]) -> AsyncSMBus
+
+    Return a new AsyncSMBus, (optionally) connected to the specified I2C
+    device interface.  smbus is the synchronous SMBus object to run the
+    transactions on, a new SMBus by default.  Every SMBus transaction
+    method is available as a method returning an awaitable.
+    """
+
+    def __init__(self, bus=-1, smbus=None):
+        self.smbus = smbus if smbus is not None else SMBus()
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._pending = collections.deque()
+        self._lock = threading.Lock()
+        self._scheduled = False
+        self._closed = False
+        if bus >= 0:
+            # opening is quick and only done once, do it synchronously
+            self.smbus.open(bus)
+
+    def _submit(self, fn, args, kwargs):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            if self._closed:
+                raise ValueError("I/O operation on closed AsyncSMBus")
+            self._pending.append((future, fn, args, kwargs))
+            if self._scheduled:
+                return future
+            self._scheduled = True
+        try:
+            loop.run_in_executor(self._executor, self._drain, loop)
+        except BaseException:
+            with self._lock:
+                self._scheduled = False
+                self._pending.clear()
+            raise
+        return future
+
+    def _drain(self, loop):
+        """Run all queued transactions on the worker thread"""
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._scheduled = False
+                    break
+                future, fn, args, kwargs = self._pending.popleft()
+            if future.cancelled():
+                continue
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                loop.call_soon_threadsafe(self._deliver, future, None, e)
+            else:
+                loop.call_soon_threadsafe(self._deliver, future, result,
+                                          None)
+
+    @staticmethod
+    def _deliver(future, result, exc):
+        if future.cancelled():
+            return
+        if exc is not None:
+            future.set_exception(exc)
+        else:
+            future.set_result(result)
+
+    def open(self, bus):
+        """open(bus)
+
+        Awaitable version of SMBus.open.
+        """
+        return self._submit(self.smbus.open, (bus,), {})
+
+    def close(self):
+        """close()
+
+        Disconnect the bus and stop the worker thread once all queued
+        transactions are done.  Returns an awaitable, later transactions
+        raise ValueError.
+        """
+        future = self._submit(self.smbus.close, (), {})
+        with self._lock:
+            self._closed = True
+        self._executor.shutdown(wait=False)
+        return future
+
+    def run(self, fn, *args, **kwargs):
+        """run(fn, *args, **kwargs)
+
+        Call fn(smbus, *args, **kwargs) on the worker thread, e.g. to
+        perform a sequence of transactions without other requests in
+        between.  Returns an awaitable of its result.
+        """
+        return self._submit(fn, (self.smbus,) + args, kwargs)
+
+    def set_pec(self, value):
+        """set_pec(value)
+
+        Awaitable version of setting SMBus.pec.
+        """
+        return self.run(setattr, 'pec', value)
+
+    @property
+    def pec(self):
+        return self.smbus.pec
+
+    def set_timeout(self, value):
+        """set_timeout(value)
+
+        Awaitable version of setting SMBus.timeout.
+        """
+        return self.run(setattr, 'timeout', value)
+
+    @property
+    def timeout(self):
+        return self.smbus.timeout
+
+    def set_retries(self, value):
+        """set_retries(value)
+
+        Awaitable version of setting SMBus.retries.
+        """
+        return self.run(setattr, 'retries', value)
+
+    @property
+    def retries(self):
+        return self.smbus.retries
+
+    @property
+    def funcs(self):
+        return self.smbus.funcs
+
+
+for _name in TRANSACTIONS:
+    setattr(AsyncSMBus, _name, _transaction(_name))
+del _name
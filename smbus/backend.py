@@ -0,0 +1,61 @@
+"""Transport backends for SMBus.
+
+A backend performs the actual bus transactions of an SMBus object.  It
+provides open(bus) returning a file descriptor like handle, close(fd) and
+the following functions, which mirror the C helpers of the compiled
+_smbus_cffi module and return -errno on failure:
+
+    ioctl(fd, request, arg) -> 0
+    funcs(fd, unsigned long *funcs) -> 0
+    access(fd, read_write, cmd, size, union i2c_smbus_data *data) -> 0
+    xfer(fd, cur, addr, read_write, cmd, size, value) -> value
+    xfer_retry(fd, cur, addr, read_write, cmd, size, value, tries, delay_us,
+               int *attempts) -> value
+    rdwr(fd, struct i2c_msg *msgs, nmsgs) -> nmsgs
+    read_block_into(fd, cmd, size, char *buf, len) -> block length
+    read_registers(fd, size, __u8 *cmds, void *vals, n) -> n
+    write_registers(fd, size, __u8 *cmds, __u16 *vals, n) -> n
+    read_i2c_block_stream(fd, cmd, char *buf, len, chunk) -> len
+    write_i2c_block_stream(fd, cmd, char *buf, len, chunk, tries, delay_us,
+                           int *written) -> len
+    read_fifo(fd, cmd, char *buf, len) -> len
+
+KernelBackend uses the i2c-dev interface of the Linux kernel, see
+smbus.sim for a simulated bus."""
+
+import os
+
+from ._lazy import load
+
+MAXPATH = 16
+
+HELPERS = ('ioctl', 'funcs', 'access', 'xfer', 'xfer_retry', 'rdwr', 'read_block_into',
+           'read_registers', 'write_registers', 'read_i2c_block_stream',
+           'write_i2c_block_stream', 'read_fifo')
+
+
+class KernelBackend(object):
+    """Backend using the /dev/i2c-N interface of the Linux kernel"""
+
+    def __getattr__(self, name):
+        # the C helpers are bound on first use, see smbus._lazy
+        if name not in HELPERS:
+            raise AttributeError(name)
+        helper = getattr(load().lib, 'smbus_cffi_' + name)
+        setattr(self, name, helper)
+        return helper
+
+    def open(self, bus):
+        path = "/dev/i2c-%d" % (bus,)
+        if len(path) >= MAXPATH:
+            raise OverflowError("Bus number is invalid.")
+        try:
+            return os.open(path, os.O_RDWR, 0)
+        except OSError as e:
+            raise IOError(e.errno, e.strerror)
+
+    def close(self, fd):
+        os.close(fd)
+
+
+KERNEL = KernelBackend()
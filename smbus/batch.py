@@ -0,0 +1,122 @@
+"""Transaction batches ordered by slave address.
+
+Every SMBus transaction with a different slave address than the one
+before costs an I2C_SLAVE ioctl, so polling many devices round-robin
+doubles the number of syscalls.  A Batch collects independent
+transactions and performs them grouped by slave address, keeping the
+order of the transactions of each device, with at most one address
+switch per device:
+
+    >>> batch = Batch()
+    >>> for addr in sensors:
+    ...     batch.read_word_data(addr, 0x00)
+    ...     batch.write_byte_data(addr, 0x01, 0x80)
+    >>> results = batch.run(bus)
+    >>> batch.switches_saved
+
+Transactions with different devices are assumed to be independent,
+their relative order is not kept.  I2C_RDWR transfers belong to the
+address of their first message; they select no address themselves."""
+
+from .smbus import TRANSACTIONS
+from .smbus import _transaction_addr
+
+
+def _switches(addrs, current):
+    """Number of I2C_SLAVE ioctls selecting addrs in order, starting
+    with the address current"""
+    switches = 0
+    for addr in addrs:
+        if addr is not None and addr != current:
+            switches += 1
+            current = addr
+    return switches
+
+
+class Batch(object):
+    """Batch() -> Batch
+
+    Queue of transactions for Batch.run.  Transactions are added with
+    add(name, *args, **kwargs) or by calling the SMBus method of the same
+    name on the batch, both return the position of the transaction in
+    the results.
+    """
+
+    def __init__(self):
+        # (name, args, kwargs, group address, selected address)
+        self._calls = []
+        self.switches = None
+        self.switches_saved = None
+
+    def __len__(self):
+        return len(self._calls)
+
+    def add(self, name, *args, **kwargs):
+        """add(name, *args, **kwargs) -> index
+
+        Queue the SMBus transaction name with its arguments.
+        """
+        if name not in TRANSACTIONS:
+            raise ValueError("Unknown transaction %r" % (name,))
+        group = _transaction_addr(name, args, kwargs)
+        addr = None if name == 'transfer' else group
+        self._calls.append((name, args, kwargs, group, addr))
+        return len(self._calls) - 1
+
+    def __getattr__(self, name):
+        if name not in TRANSACTIONS:
+            raise AttributeError(name)
+
+        def add(*args, **kwargs):
+            return self.add(name, *args, **kwargs)
+        add.__name__ = name
+        return add
+
+    def clear(self):
+        self._calls = []
+
+    def order(self, current=-1):
+        """order([current]) -> indices
+
+        Positions of the queued transactions in the order they are
+        performed when the slave address current is selected: grouped by
+        address, the group of current first and the others in the order
+        their first transaction was added.
+        """
+        groups = {}
+        keys = []
+        for index, call in enumerate(self._calls):
+            group = call[3]
+            if group not in groups:
+                groups[group] = []
+                keys.append(group)
+            groups[group].append(index)
+        if current in groups:
+            keys.remove(current)
+            keys.insert(0, current)
+        return [index for key in keys for index in groups[key]]
+
+    def run(self, bus):
+        """run(bus) -> results
+
+        Perform the queued transactions on the SMBus object bus and
+        return their results in the order they were added.  A transaction
+        failing with IOError has the exception as its result, the others
+        are still performed.  switches is set to the number of address
+        switches of the run and switches_saved to the number avoided
+        compared with performing the transactions in order.
+        """
+        calls = self._calls
+        current = bus._addr
+        order = self.order(current)
+        self.switches = _switches([calls[i][4] for i in order], current)
+        self.switches_saved = _switches([call[4] for call in calls],
+                                        current) - self.switches
+        results = [None] * len(calls)
+        for index in order:
+            name, args, kwargs = calls[index][:3]
+            try:
+                results[index] = getattr(bus, name)(*args, **kwargs)
+            except EnvironmentError as e:
+                results[index] = e
+        return results
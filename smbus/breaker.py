@@ -0,0 +1,194 @@
+"""Circuit breakers for the devices on an SMBus.
+
+A CircuitBreaker is an SMBus layer (see SMBus.add_layer) tracking the
+health of every slave by (bus, addr).  After threshold consecutive
+transactions with a slave failed with one of the errnos of a missing or
+hung device, its breaker opens: transactions with it fail at once with
+IOError(EHOSTDOWN), or return (None, EHOSTDOWN) for the _status
+variants, without an ioctl, the kernel's address retries or the time
+the bus would otherwise spend on it.  Once reset_timeout seconds have
+passed the next transaction first probes the slave with write_quick, or
+read_byte on adapters without SMBus Quick, and closes the breaker if it
+acknowledges:
+
+    >>> breaker = CircuitBreaker(threshold=3, reset_timeout=5.0)
+    >>> bus.add_layer(breaker)
+    >>> breaker.states()
+
+The same CircuitBreaker may be added to several SMBus objects."""
+
+import errno
+import threading
+import timeit
+
+from .smbus import _errno
+from .smbus import _error
+from .smbus import _transaction_addr
+
+CLOSED = 'closed'
+OPEN = 'open'
+
+# errnos of a slave that does not respond
+FAILURES = (errno.ENXIO, errno.EREMOTEIO, errno.ETIMEDOUT, errno.EIO)
+
+_clock = timeit.default_timer
+
+
+class _Health(object):
+    __slots__ = ('state', 'failures', 'errno', 'opened', 'retry',
+                 'rejected', 'probes')
+
+    def __init__(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.errno = None
+        self.opened = None
+        self.retry = None
+        self.rejected = 0
+        self.probes = 0
+
+
+class CircuitBreaker(object):
+    """CircuitBreaker([threshold[, reset_timeout[, failures]]])
+
+    SMBus layer failing fast for devices that stopped responding, see
+    the module documentation.  threshold is the number of consecutive
+    failures opening a breaker, reset_timeout the seconds between probes
+    of an open breaker and failures the errnos counted as failures.
+    """
+
+    def __init__(self, threshold=5, reset_timeout=1.0, failures=FAILURES):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = frozenset(failures)
+        # (bus, addr) -> _Health
+        self._health = {}
+        self._lock = threading.Lock()
+
+    def _get(self, key):
+        health = self._health.get(key)
+        if health is None:
+            health = self._health[key] = _Health()
+        return health
+
+    def _success(self, key):
+        health = self._health.get(key)
+        if health is not None and health.failures:
+            with self._lock:
+                health.state = CLOSED
+                health.failures = 0
+
+    def _failure(self, key, err):
+        with self._lock:
+            health = self._get(key)
+            health.errno = err
+            if err not in self.failures:
+                return
+            health.failures += 1
+            if health.state == CLOSED and health.failures >= self.threshold:
+                health.state = OPEN
+                health.opened = _clock()
+                health.retry = health.opened + self.reset_timeout
+
+    def _admit(self, bus, key):
+        """True if a transaction with the device of key may proceed,
+        probing it first if its breaker is open and a probe is due"""
+        health = self._health.get(key)
+        if health is None or health.state == CLOSED:
+            return True
+        with self._lock:
+            now = _clock()
+            if now < health.retry:
+                health.rejected += 1
+                return False
+            # one probe per reset_timeout, concurrent callers fail fast
+            health.retry = now + self.reset_timeout
+            health.probes += 1
+        return self.probe(bus, key[1])
+
+    def probe(self, bus, addr):
+        """probe(bus, addr) -> bool
+
+        Probe the slave at addr on the SMBus object bus, closing its
+        breaker if it acknowledges.  The breaker opens again with the
+        next failure.
+        """
+        key = (bus.bus, addr)
+        funcs = bus.funcs
+        quick = funcs is None or 'I2C_FUNC_SMBUS_QUICK' in funcs
+        # the methods of the class bypass the layers, including this one
+        probe = type(bus).write_quick if quick else type(bus).read_byte
+        try:
+            probe(bus, addr)
+        except EnvironmentError as e:
+            with self._lock:
+                self._get(key).errno = _errno(e)
+            return False
+        with self._lock:
+            health = self._get(key)
+            health.state = CLOSED
+            health.failures = max(self.threshold - 1, 0)
+        return True
+
+    def wrap(self, bus, name, method):
+        status = name.endswith('_status')
+        admit = self._admit
+        success = self._success
+        failure = self._failure
+
+        def guarded(*args, **kwargs):
+            key = (bus._bus, _transaction_addr(name, args, kwargs))
+            if not admit(bus, key):
+                if status:
+                    return None, errno.EHOSTDOWN
+                raise _error(errno.EHOSTDOWN)
+            try:
+                result = method(*args, **kwargs)
+            except EnvironmentError as e:
+                failure(key, _errno(e))
+                raise
+            if status and result[1]:
+                failure(key, result[1])
+            else:
+                success(key)
+            return result
+        guarded.__name__ = name
+        guarded.__doc__ = method.__doc__
+        return guarded
+
+    def state(self, bus, addr):
+        """state(bus, addr) -> CLOSED or OPEN
+
+        State of the breaker of the slave at addr on bus number bus.
+        """
+        with self._lock:
+            health = self._health.get((bus, addr))
+            return CLOSED if health is None else health.state
+
+    def states(self):
+        """states() -> dict
+
+        {(bus, addr): {'state', 'failures': consecutive failures, 'errno':
+         of the last failure, 'opened': clock time the breaker opened,
+         'retry': clock time of the next probe, 'rejected': transactions
+         failed fast, 'probes'}} of every device that failed so far.
+        """
+        with self._lock:
+            return dict((key, {
+                'state': h.state, 'failures': h.failures, 'errno': h.errno,
+                'opened': h.opened, 'retry': h.retry,
+                'rejected': h.rejected, 'probes': h.probes,
+            }) for key, h in self._health.items())
+
+    def reset(self, bus=None, addr=None):
+        """reset([bus[, addr]])
+
+        Close and forget the breakers of all devices, of bus number bus
+        or of the slave at addr on it.
+        """
+        with self._lock:
+            for key in list(self._health):
+                if (bus is None or key[0] == bus) and \
+                        (addr is None or key[1] == addr):
+                    del self._health[key]
+
@@ -0,0 +1,255 @@
+"""Register read cache for SMBus.
+
+A RegisterCache is an SMBus layer (see SMBus.add_layer) answering
+read_byte_data, read_word_data and the I2C block reads from memory for
+registers that do not change behind the host's back, such as IDs,
+calibration words or configuration:
+
+    >>> cache = RegisterCache()
+    >>> cache.set_policy(0x50, 0x00, UNTIL_WRITE)   # device ID
+    >>> cache.set_policy(0x50, 0x10, 0.5)           # cached for 0.5s
+    >>> bus.add_layer(cache)
+
+Entries are keyed by (bus, addr, cmd) and the kind of read (byte, word
+or block), so different reads of the same register are cached side by
+side.  Registers are not cached unless
+a policy says otherwise: NEVER, UNTIL_WRITE or a time to live in
+seconds.  Writes through the same SMBus object invalidate the registers
+they overlap, assuming the usual auto-incrementing register pointer, so
+a word write to cmd also invalidates cmd + 1.  Transactions with unknown
+effects on the registers (write_quick, write_byte, process calls, SMBus
+block writes and I2C_RDWR transfers) invalidate the whole device.  At
+most size registers are cached, the least recently used ones are
+evicted first."""
+
+import collections
+import threading
+import timeit
+
+from .metrics import _positional
+from .smbus import _block_length
+
+NEVER = 'never'
+UNTIL_WRITE = 'until-write'
+
+_clock = timeit.default_timer
+
+# cached reads: transaction -> number of registers read, None for the
+# length argument
+_READS = {'read_byte_data': 1, 'read_word_data': 2,
+          'read_i2c_block_data': None, 'read_i2c_block_data_bytes': None}
+
+# kind of the value each read stores, part of the entry key
+_KINDS = {'read_byte_data': 'byte', 'read_word_data': 'word',
+          'read_i2c_block_data': 'block', 'read_i2c_block_data_bytes': 'block'}
+
+# register writes: transaction -> number of registers written, None for
+# the length of the vals argument
+_WRITES = {'write_byte_data': 1, 'write_word_data': 2,
+           'write_byte_data_status': 1, 'write_word_data_status': 2,
+           'write_i2c_block_data': None, 'write_i2c_block_data_stream': None}
+
+# transactions invalidating all registers of the device
+_DEVICE_WRITES = ('write_quick', 'write_byte', 'write_quick_status',
+                  'write_byte_status', 'process_call', 'write_block_data',
+                  'block_process_call')
+
+
+class RegisterCache(object):
+    """RegisterCache([size[, default]]) -> RegisterCache
+
+    SMBus layer caching register reads, see the module documentation.
+    default is the policy of registers without a policy of their own.
+    """
+
+    def __init__(self, size=256, default=NEVER):
+        if size < 1:
+            raise ValueError("Cache size must be at least 1")
+        self.size = size
+        self.default = default
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._policies = {}
+        # (bus, addr, cmd, kind) -> (expiry time or None, nregs, value),
+        # ordered from least to most recently used
+        self._entries = collections.OrderedDict()
+        # (bus, addr) -> set of cached (cmd, kind)
+        self._devices = {}
+        self._lock = threading.Lock()
+
+    def set_policy(self, addr, cmd, policy):
+        """set_policy(addr, cmd, policy)
+
+        Set the policy of register cmd of the device at addr, or of all its
+        registers if cmd is None: NEVER, UNTIL_WRITE or a time to live in
+        seconds.
+        """
+        if policy != NEVER and policy != UNTIL_WRITE:
+            policy = float(policy)
+            if policy <= 0:
+                raise ValueError("Time to live must be positive")
+        self._policies[(addr, cmd)] = policy
+        self.invalidate(addr, cmd)
+
+    def policy(self, addr, cmd):
+        """policy(addr, cmd) -> policy of register cmd of the device at addr"""
+        policies = self._policies
+        policy = policies.get((addr, cmd))
+        if policy is None:
+            policy = policies.get((addr, None), self.default)
+        return policy
+
+    def invalidate(self, addr=None, cmd=None, bus=None):
+        """invalidate([addr[, cmd[, bus]]])
+
+        Drop the cached register cmd of the device at addr, all registers
+        of the device if cmd is None, and everything if addr is None.  bus
+        restricts the invalidation to one bus number.
+        """
+        with self._lock:
+            if addr is None:
+                for key in list(self._entries):
+                    if bus is None or key[0] == bus:
+                        self._drop(key)
+                return
+            for device in list(self._devices):
+                if device[1] == addr and (bus is None or device[0] == bus):
+                    if cmd is None:
+                        self._drop_device(device)
+                    else:
+                        self._drop_range(device, cmd, 1)
+
+    def clear(self):
+        """Drop all cached registers"""
+        self.invalidate()
+
+    def stats(self):
+        """stats() -> dict with the hits, misses, evictions and size"""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions,
+                    'size': len(self._entries)}
+
+    def _drop(self, key):
+        del self._entries[key]
+        device = key[:2]
+        cmds = self._devices[device]
+        cmds.discard(key[2:])
+        if not cmds:
+            del self._devices[device]
+
+    def _drop_device(self, device):
+        for cmd in self._devices.pop(device, ()):
+            del self._entries[device + cmd]
+
+    def _drop_range(self, device, start, count):
+        """Drop the entries of device overlapping registers start to
+        start + count - 1"""
+        cmds = self._devices.get(device)
+        if not cmds:
+            return
+        entries = self._entries
+        end = start + count
+        for cmd in list(cmds):
+            key = device + cmd
+            if cmd[0] < end and start < cmd[0] + entries[key][1]:
+                self._drop(key)
+
+    def _lookup(self, key, nregs):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] == nregs and \
+                    (entry[0] is None or _clock() < entry[0]):
+                self._entries[key] = self._entries.pop(key)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+            return None
+
+    def _store(self, key, policy, nregs, value):
+        expires = None if policy == UNTIL_WRITE else _clock() + policy
+        with self._lock:
+            entries = self._entries
+            if key in entries:
+                self._drop(key)
+            elif len(entries) >= self.size:
+                self._drop(next(iter(entries)))
+                self.evictions += 1
+            entries[key] = (expires, nregs, value)
+            self._devices.setdefault(key[:2], set()).add(key[2:])
+
+    def _write(self, bus, addr, cmd, count):
+        with self._lock:
+            if cmd is None:
+                self._drop_device((bus, addr))
+            else:
+                self._drop_range((bus, addr), cmd, count)
+
+    def wrap(self, bus, name, method):
+        if name in _READS:
+            return self._wrap_read(bus, name, method)
+        if name in _WRITES or name in _DEVICE_WRITES or \
+                name in ('write_registers', 'transfer'):
+            return self._wrap_write(bus, name, method)
+        return method
+
+    def _wrap_read(self, bus, name, method):
+        nregs = _READS[name]
+        kind = _KINDS[name]
+        as_bytes = name.endswith('_bytes')
+        policy_of = self.policy
+        lookup = self._lookup
+        store = self._store
+
+        def cached(*args, **kwargs):
+            if kwargs:
+                args = _positional(name, args, kwargs)
+            addr, cmd = args[0], args[1]
+            policy = policy_of(addr, cmd)
+            if policy == NEVER:
+                return method(*args)
+            n = nregs if nregs is not None else \
+                (args[2] if len(args) > 2 else 32)
+            key = (bus._bus, addr, cmd, kind)
+            value = lookup(key, n)
+            if value is None:
+                value = method(*args)
+                if nregs is None:
+                    # blocks are stored as bytes for both variants
+                    value = bytes(bytearray(value))
+                store(key, policy, n, value)
+            if nregs is None and not as_bytes:
+                return list(bytearray(value))
+            return value
+        cached.__name__ = name
+        cached.__doc__ = method.__doc__
+        return cached
+
+    def _wrap_write(self, bus, name, method):
+        write = self._write
+
+        def invalidating(*args, **kwargs):
+            if kwargs:
+                args = _positional(name, args, kwargs)
+            try:
+                return method(*args)
+            finally:
+                # also after failures, the write may have happened
+                if name == 'transfer':
+                    for addr in set(msg.addr for msg in args[0]):
+                        write(bus._bus, addr, None, 0)
+                elif name == 'write_registers':
+                    count = 2 if len(args) > 2 and args[2] else 1
+                    for cmd, val in args[1]:
+                        write(bus._bus, args[0], cmd, count)
+                elif name in _DEVICE_WRITES:
+                    write(bus._bus, args[0], None, 0)
+                else:
+                    count = _WRITES[name]
+                    if count is None:
+                        count = _block_length(args[2])
+                    write(bus._bus, args[0], args[1], count)
+        invalidating.__name__ = name
+        invalidating.__doc__ = method.__doc__
+        return invalidating
@@ -0,0 +1,100 @@
+"""Per-device timeouts and retries for SMBus.
+
+The I2C_TIMEOUT and I2C_RETRIES ioctls set how long the adapter waits
+for a slave, e.g. one stretching the clock, and how often it retries a
+transfer that lost arbitration.  SMBus.timeout and SMBus.retries set
+them for a whole bus.  A DeviceLimits object is an SMBus layer (see
+SMBus.add_layer) applying different values per slave address before
+each transaction, so a wedged slave with a short timeout cannot hold up
+the healthy devices on its bus for the default timeout of the adapter:
+
+    >>> limits = DeviceLimits(timeout=1.0)
+    >>> limits.set_device(0x36, timeout=0.02)
+    >>> bus.add_layer(limits)
+
+The settings are adapter-wide, like the slave address selected with
+I2C_SLAVE they are only re-issued when the next transaction needs
+different values, so transactions with devices sharing the same limits
+cost no additional ioctls.  On a ThreadSafeSMBus the limits are applied
+while holding its lock, together with the transaction."""
+
+from .smbus import SMBus
+from .smbus import _errno
+from .smbus import _timeout_units
+from .smbus import _transaction_addr
+
+
+class DeviceLimits(object):
+    """DeviceLimits([timeout[, retries]]) -> DeviceLimits
+
+    SMBus layer setting the timeout in seconds and the retries of the
+    adapter per device, see the module documentation.  timeout and
+    retries apply to the devices without limits of their own; None
+    leaves the values of the adapter alone, which is only possible while
+    no device has a limit of its own.
+    """
+
+    def __init__(self, timeout=None, retries=None):
+        self.timeout = None if timeout is None else \
+            _timeout_units(timeout) / 100.0
+        self.retries = None if retries is None else int(retries)
+        # addr -> (timeout, retries)
+        self._devices = {}
+
+    def set_device(self, addr, timeout=None, retries=None):
+        """set_device(addr[, timeout[, retries]])
+
+        Set the limits of the slave at addr, the defaults are used for
+        values that are None.  Without any values the device uses the
+        defaults again.
+        """
+        if timeout is not None and self.timeout is None:
+            raise ValueError("Device timeouts need a default timeout")
+        if retries is not None and self.retries is None:
+            raise ValueError("Device retries need a default of retries")
+        if timeout is None and retries is None:
+            self._devices.pop(addr, None)
+            return
+        self._devices[addr] = (
+            self.timeout if timeout is None else
+            _timeout_units(timeout) / 100.0,
+            self.retries if retries is None else int(retries))
+
+    def limits(self, addr):
+        """limits(addr) -> (timeout, retries)
+
+        Limits applied to transactions with the slave at addr.
+        """
+        return self._devices.get(addr, (self.timeout, self.retries))
+
+    def wrap(self, bus, name, method):
+        status = name.endswith('_status')
+        limits = self.limits
+        # the (reentrant) lock of a ThreadSafeSMBus
+        lock = getattr(bus, '_lock', None)
+        set_timeout = SMBus.timeout.fset
+        set_retries = SMBus.retries.fset
+
+        def apply(args, kwargs):
+            timeout, retries = limits(_transaction_addr(name, args, kwargs))
+            try:
+                if timeout is not None and timeout != bus._timeout:
+                    set_timeout(bus, timeout)
+                if retries is not None and retries != bus._retries:
+                    set_retries(bus, retries)
+            except EnvironmentError as e:
+                if status:
+                    return None, _errno(e)
+                raise
+            return method(*args, **kwargs)
+
+        if lock is None:
+            def limited(*args, **kwargs):
+                return apply(args, kwargs)
+        else:
+            def limited(*args, **kwargs):
+                with lock:
+                    return apply(args, kwargs)
+        limited.__name__ = name
+        limited.__doc__ = method.__doc__
+        return limited
@@ -0,0 +1,236 @@
+"""Transaction metrics for SMBus.
+
+A Metrics object is an SMBus layer (see SMBus.add_layer) recording the
+number, latency histogram, bytes transferred and errno of failures of
+every transaction per (bus, addr, cmd, transaction), as well as how many
+transactions had to select a new slave address with I2C_SLAVE:
+
+    >>> metrics = Metrics()
+    >>> bus.add_layer(metrics)
+    >>> bus.read_byte_data(0x50, 1)
+    >>> metrics.snapshot()
+
+SMBus objects without the layer are not affected at all."""
+
+import bisect
+import threading
+import timeit
+from array import array
+
+from .smbus import SMBus
+from .smbus import _block_length
+from .smbus import _errno
+
+# upper bounds of the latency histogram buckets in seconds
+BUCKETS = (25e-6, 50e-6, 100e-6, 250e-6, 500e-6, 1e-3, 2.5e-3, 5e-3, 10e-3,
+           25e-3, 50e-3, 100e-3, 250e-3, 1.0)
+
+_clock = timeit.default_timer
+
+
+def _transferred(name, args, result):
+    """Number of data bytes moved by the transaction name"""
+    if name in ('read_byte', 'write_byte', 'read_byte_data',
+                'write_byte_data'):
+        return 1
+    if name in ('read_word_data', 'write_word_data'):
+        return 2
+    if name == 'process_call':
+        return 4
+    if name in ('read_block_data', 'read_i2c_block_data',
+                'read_block_data_bytes', 'read_i2c_block_data_bytes'):
+        return len(result)
+    if name in ('read_block_data_into', 'read_i2c_block_data_into',
+                'read_fifo_data_into'):
+        return result
+    if name == 'read_i2c_block_data_stream':
+        return memoryview(result).nbytes
+    if name in ('write_block_data', 'write_i2c_block_data',
+                'write_i2c_block_data_stream'):
+        return _block_length(args[2])
+    if name == 'block_process_call':
+        return _block_length(args[2]) + len(result)
+    if name == 'read_registers':
+        return len(result) * getattr(result, 'itemsize', 1)
+    if name == 'write_registers':
+        return len(args[1]) * (2 if len(args) > 2 and args[2] else 1)
+    if name == 'transfer':
+        return sum(len(msg) for msg in args[0])
+    return 0
+
+
+def _positional(name, args, kwargs):
+    """args and kwargs of a call of the transaction name as positional
+    arguments, parameters not given have the defaults of the SMBus
+    method"""
+    function = getattr(SMBus, name)
+    code = function.__code__
+    names = code.co_varnames[1:code.co_argcount]
+    defaults = function.__defaults__ or ()
+    first_default = len(names) - len(defaults)
+    unknown = set(kwargs) - set(names[len(args):])
+    if unknown or len(args) > len(names):
+        raise TypeError("%s() got unexpected arguments" % (name,))
+    args = list(args)
+    for i in range(len(args), len(names)):
+        if names[i] in kwargs:
+            args.append(kwargs[names[i]])
+        elif i >= first_default:
+            args.append(defaults[i - first_default])
+        else:
+            raise TypeError("%s() missing argument %r" % (name, names[i]))
+    return tuple(args)
+
+
+class _Series(object):
+    __slots__ = ('count', 'latency', 'buckets', 'bytes', 'errors')
+
+    def __init__(self, nbuckets):
+        self.count = 0
+        self.latency = 0.0
+        self.buckets = array('L', [0]) * (nbuckets + 1)
+        self.bytes = 0
+        self.errors = {}
+
+
+class Metrics(object):
+    """Metrics([buckets]) -> Metrics
+
+    SMBus layer collecting transaction statistics, buckets are the upper
+    bounds of the latency histogram in seconds.  One Metrics object may
+    be added to several SMBus objects.
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._readdress = {}
+        self._lock = threading.Lock()
+
+    def _record(self, key, latency, nbytes, err):
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _Series(len(self.buckets))
+            series.count += 1
+            series.latency += latency
+            series.buckets[bisect.bisect_left(self.buckets, latency)] += 1
+            series.bytes += nbytes
+            if err is not None:
+                series.errors[err] = series.errors.get(err, 0) + 1
+
+    def wrap(self, bus, name, method):
+        record = self._record
+        readdress = self._readdress
+        lock = self._lock
+        selects_addr = name != 'transfer'
+        status = name.endswith('_status')
+        base = name[:-len('_status')] if status else name
+        has_cmd = base not in ('write_quick', 'read_byte', 'write_byte',
+                               'read_registers', 'write_registers',
+                               'transfer', 'wait_ack')
+
+        def instrumented(*args, **kwargs):
+            if kwargs:
+                args = _positional(name, args, kwargs)
+                kwargs = {}
+            if selects_addr:
+                addr = args[0]
+                cmd = args[1] if has_cmd else None
+                if addr != bus._addr:
+                    with lock:
+                        readdress[bus._bus] = readdress.get(bus._bus, 0) + 1
+            else:
+                addr = args[0][0].addr if args[0] else None
+                cmd = None
+            key = (bus._bus, addr, cmd, name)
+            start = _clock()
+            try:
+                result = method(*args, **kwargs)
+            except EnvironmentError as e:
+                err = _errno(e)
+                record(key, _clock() - start, 0, err)
+                raise
+            if status and result[1]:
+                # exception-free transactions report errors as (None, errno)
+                record(key, _clock() - start, 0, result[1])
+            else:
+                record(key, _clock() - start,
+                       _transferred(base, args,
+                                    result[0] if status else result), None)
+            return result
+        instrumented.__name__ = name
+        instrumented.__doc__ = method.__doc__
+        return instrumented
+
+    def snapshot(self):
+        """snapshot() -> dict
+
+        Return a consistent copy of the statistics:
+
+        {'transactions': [{'bus', 'addr', 'cmd', 'transaction', 'count',
+                           'latency_sum', 'buckets', 'bytes', 'errors'}],
+         'readdress': {bus: count}}
+
+        buckets is a list of (upper bound, cumulative count) with a last
+        bound of float('inf'), errors maps errno to count.
+        """
+        bounds = self.buckets + (float('inf'),)
+        transactions = []
+        with self._lock:
+            for key, series in sorted(self._series.items(), key=repr):
+                cumulative = 0
+                buckets = []
+                for bound, count in zip(bounds, series.buckets):
+                    cumulative += count
+                    buckets.append((bound, cumulative))
+                transactions.append({
+                    'bus': key[0], 'addr': key[1], 'cmd': key[2],
+                    'transaction': key[3], 'count': series.count,
+                    'latency_sum': series.latency, 'buckets': buckets,
+                    'bytes': series.bytes, 'errors': dict(series.errors),
+                })
+            readdress = dict(self._readdress)
+        return {'transactions': transactions, 'readdress': readdress}
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+            self._readdress.clear()
+
+
+def prometheus_text(snapshot, prefix='smbus'):
+    """prometheus_text(snapshot[, prefix]) -> str
+
+    Render a Metrics snapshot in the Prometheus text exposition format.
+    """
+    lines = [
+        '# TYPE %s_transaction_seconds histogram' % prefix,
+    ]
+    nbytes = []
+    errors = []
+    for t in snapshot['transactions']:
+        labels = 'bus="%s",addr="%s",cmd="%s",transaction="%s"' % (
+            t['bus'], '' if t['addr'] is None else '0x%02x' % t['addr'],
+            '' if t['cmd'] is None else '0x%02x' % t['cmd'], t['transaction'])
+        for bound, count in t['buckets']:
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            lines.append('%s_transaction_seconds_bucket{%s,le="%s"} %d' % (
+                prefix, labels, le, count))
+        lines.append('%s_transaction_seconds_sum{%s} %r' % (
+            prefix, labels, t['latency_sum']))
+        lines.append('%s_transaction_seconds_count{%s} %d' % (
+            prefix, labels, t['count']))
+        nbytes.append('%s_transaction_bytes_total{%s} %d' % (
+            prefix, labels, t['bytes']))
+        for err, count in sorted(t['errors'].items()):
+            errors.append('%s_transaction_errors_total{%s,errno="%d"} %d' % (
+                prefix, labels, err, count))
+    lines.append('# TYPE %s_transaction_bytes_total counter' % prefix)
+    lines.extend(nbytes)
+    lines.append('# TYPE %s_transaction_errors_total counter' % prefix)
+    lines.extend(errors)
+    lines.append('# TYPE %s_readdress_total counter' % prefix)
+    for bus, count in sorted(snapshot['readdress'].items()):
+        lines.append('%s_readdress_total{bus="%s"} %d' % (prefix, bus, count))
+    return '\n'.join(lines) + '\n'
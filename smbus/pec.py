@@ -0,0 +1,256 @@
+"""Software Packet Error Checking for SMBus.
+
+SMBus PEC appends a CRC-8 (polynomial x^8 + x^2 + x + 1) of every byte
+of a transaction, including the address bytes, to the last message.
+Adapters with I2C_FUNC_SMBUS_PEC compute it in the kernel, see
+SMBus.pec.  For adapters without it, a SoftwarePEC object is an SMBus
+layer (see SMBus.add_layer) performing the byte, word, process call and
+SMBus block transactions as I2C_RDWR transfers with the PEC appended to
+writes and verified on reads:
+
+    >>> bus.add_layer(SoftwarePEC())
+    >>> bus.read_word_data(0x0b, 0x09)
+
+Transfers with a mismatching PEC fail with IOError(EBADMSG), like the
+kernel implementation.  SMBus block reads read the largest possible
+block, 32 bytes and the PEC, as the length of the block is not known in
+advance.  The I2C block, stream, FIFO and register list transactions
+have no PEC and are not affected.  The CRC is computed in C with one
+table lookup per byte, crc8() exposes it for other uses."""
+
+import errno
+
+from ._lazy import lazy
+from .smbus import TRANSACTIONS
+from .smbus import _error
+from .smbus import _status_of
+from .smbus import _transaction_addr
+from .smbus import i2c_msg
+
+ffi = lazy(globals(), 'ffi', 'ffi')
+SMBUS = lazy(globals(), 'SMBUS', 'lib')
+
+
+def crc8(data, crc=0):
+    """crc8(data[, crc]) -> int
+
+    CRC-8 of data, a list of integers or a bytes-like object, as used by
+    SMBus PEC, continuing from crc.
+    """
+    if isinstance(data, list):
+        data = bytearray(data)
+    buf = ffi.from_buffer(data)
+    return SMBUS.smbus_cffi_crc8(crc, buf, len(buf))
+
+
+def _messages_crc(messages, skip_last):
+    """CRC-8 of messages as they appear on the bus, without the last
+    skip_last bytes of the last message"""
+    crc = 0
+    last = len(messages) - 1
+    for i, msg in enumerate(messages):
+        rd = 1 if msg.flags & SMBUS.I2C_M_RD else 0
+        crc = crc8(bytearray([(msg.addr << 1 | rd) & 0xFF]), crc)
+        length = len(msg) - (skip_last if i == last else 0)
+        crc = SMBUS.smbus_cffi_crc8(crc, ffi.cast("char *", msg.buf), length)
+    return crc
+
+
+def transfer(bus, messages):
+    """transfer(bus, messages)
+
+    Perform the combined I2C_RDWR transaction of SMBus.transfer on bus
+    with a PEC byte appended to the last message if it is a write, or
+    read and verified after it if it is a read.  bus is an SMBus object
+    without a SoftwarePEC layer.
+    """
+    _transfer(bus.transfer, messages)
+
+
+def _transfer(rdwr, messages):
+    """transfer with PEC, rdwr performs the I2C_RDWR transfers"""
+    if not messages:
+        return rdwr(messages)
+    last = messages[-1]
+    if last.flags & SMBUS.I2C_M_RD:
+        read = i2c_msg.read(last.addr, len(last) + 1)
+        sent = list(messages[:-1]) + [read]
+        rdwr(sent)
+        if _messages_crc(sent, 1) != read.buf[len(last)]:
+            raise _error(errno.EBADMSG)
+        ffi.memmove(last.buf, read.buf, len(last))
+    else:
+        pec = _messages_crc(messages, 0)
+        sent = list(messages[:-1])
+        sent.append(i2c_msg.write(last.addr,
+                                  last.tobytes() + bytearray([pec])))
+        rdwr(sent)
+
+
+def _write(rdwr, addr, data):
+    data = bytearray(data)
+    data.append(crc8(bytearray([addr << 1]) + data))
+    rdwr([i2c_msg.write(addr, data)])
+
+
+def _read(rdwr, addr, data, length):
+    """Read length bytes and the PEC after writing data, or without a
+    write if data is None"""
+    read = i2c_msg.read(addr, length + 1)
+    if data is None:
+        wire = bytearray([addr << 1 | 1])
+        rdwr([read])
+    else:
+        wire = bytearray([addr << 1]) + bytearray(data)
+        wire.append(addr << 1 | 1)
+        rdwr([i2c_msg.write(addr, data), read])
+    reply = bytearray(read.tobytes())
+    if crc8(wire + reply[:length]) != reply[length]:
+        raise _error(errno.EBADMSG)
+    return reply[:length]
+
+
+def _block(vals):
+    vals = bytearray(vals)
+    block_max = SMBUS.I2C_SMBUS_BLOCK_MAX
+    if len(vals) > block_max or len(vals) == 0:
+        raise OverflowError("Third argument must be a list or bytes-like "
+                            "object of at least one, but not more than %d "
+                            "bytes" % block_max)
+    return bytearray([len(vals)]) + vals
+
+
+def _read_block(rdwr, addr, data):
+    """Read an SMBus block after writing data, the PEC follows the
+    block of the length announced by the slave"""
+    block_max = SMBUS.I2C_SMBUS_BLOCK_MAX
+    write = i2c_msg.write(addr, data)
+    read = i2c_msg.read(addr, block_max + 2)
+    rdwr([write, read])
+    block = bytearray(read.tobytes())
+    count = block[0]
+    if count > block_max or count == 0:
+        raise _error(errno.EPROTO)
+    crc = crc8(bytearray([addr << 1]) + bytearray(data) +
+               bytearray([addr << 1 | 1]) + block[:count + 1])
+    if crc != block[count + 1]:
+        raise _error(errno.EBADMSG)
+    return block[1:count + 1]
+
+
+def _read_byte(rdwr, addr):
+    return _read(rdwr, addr, None, 1)[0]
+
+
+def _write_byte(rdwr, addr, val):
+    _write(rdwr, addr, [val & 0xFF])
+
+
+def _read_byte_data(rdwr, addr, cmd):
+    return _read(rdwr, addr, [cmd & 0xFF], 1)[0]
+
+
+def _write_byte_data(rdwr, addr, cmd, val):
+    _write(rdwr, addr, [cmd & 0xFF, val & 0xFF])
+
+
+def _read_word_data(rdwr, addr, cmd):
+    lo, hi = _read(rdwr, addr, [cmd & 0xFF], 2)
+    return hi << 8 | lo
+
+
+def _write_word_data(rdwr, addr, cmd, val):
+    _write(rdwr, addr, [cmd & 0xFF, val & 0xFF, val >> 8 & 0xFF])
+
+
+def _process_call(rdwr, addr, cmd, val):
+    lo, hi = _read(rdwr, addr, [cmd & 0xFF, val & 0xFF, val >> 8 & 0xFF], 2)
+    return hi << 8 | lo
+
+
+def _read_block_data(rdwr, addr, cmd):
+    return list(_read_block(rdwr, addr, [cmd & 0xFF]))
+
+
+def _read_block_data_bytes(rdwr, addr, cmd):
+    return bytes(_read_block(rdwr, addr, [cmd & 0xFF]))
+
+
+def _read_block_data_into(rdwr, addr, cmd, buf):
+    block = _read_block(rdwr, addr, [cmd & 0xFF])
+    buf = ffi.from_buffer(buf, require_writable=True)
+    if len(block) > len(buf):
+        raise OverflowError("Block of %d bytes does not fit into a "
+                            "buffer of %d bytes" % (len(block), len(buf)))
+    buf[0:len(block)] = bytes(block)
+    return len(block)
+
+
+def _write_block_data(rdwr, addr, cmd, vals):
+    _write(rdwr, addr, bytearray([cmd & 0xFF]) + _block(vals))
+
+
+def _block_process_call(rdwr, addr, cmd, vals):
+    return list(_read_block(rdwr, addr, bytearray([cmd & 0xFF]) +
+                            _block(vals)))
+
+
+# transactions performed with software PEC
+IMPLEMENTATIONS = {
+    'read_byte': _read_byte,
+    'write_byte': _write_byte,
+    'read_byte_data': _read_byte_data,
+    'write_byte_data': _write_byte_data,
+    'read_word_data': _read_word_data,
+    'write_word_data': _write_word_data,
+    'process_call': _process_call,
+    'read_block_data': _read_block_data,
+    'read_block_data_bytes': _read_block_data_bytes,
+    'read_block_data_into': _read_block_data_into,
+    'write_block_data': _write_block_data,
+    'block_process_call': _block_process_call,
+    'transfer': _transfer,
+}
+
+
+class SoftwarePEC(object):
+    """SoftwarePEC([addrs]) -> SoftwarePEC
+
+    SMBus layer adding Packet Error Codes in software, see the module
+    documentation.  addrs limits PEC to the slaves at these addresses,
+    all slaves use it by default.
+    """
+
+    def __init__(self, addrs=None):
+        self.addrs = None if addrs is None else frozenset(addrs)
+        # id(bus) -> [transfer method below this layer] while the layer
+        # is applied to the transactions of bus
+        self._below = {}
+
+    def wrap(self, bus, name, method):
+        status = name.endswith('_status')
+        base = name[:-len('_status')] if status else name
+        below = self._below.setdefault(id(bus), [None])
+        if name == 'transfer':
+            below[0] = method
+        if name == TRANSACTIONS[-1]:
+            del self._below[id(bus)]
+        implementation = IMPLEMENTATIONS.get(base)
+        if implementation is None:
+            return method
+
+        def with_pec(*args, **kwargs):
+            return implementation(below[0], *args, **kwargs)
+        if status:
+            with_pec = _status_of(base, with_pec)
+        addrs = self.addrs
+        if addrs is not None:
+            pec = with_pec
+
+            def with_pec(*args, **kwargs):
+                if _transaction_addr(base, args, kwargs) in addrs:
+                    return pec(*args, **kwargs)
+                return method(*args, **kwargs)
+        with_pec.__name__ = name
+        with_pec.__doc__ = method.__doc__
+        return with_pec
@@ -0,0 +1,141 @@
+"""Concurrent polling of several I2C buses.
+
+The ioctls release the GIL, so giving every bus its own worker thread
+lets reads on different physical buses run at the same time instead of
+one after the other in a single Python loop."""
+
+import threading
+import time
+from collections import namedtuple
+
+try:
+    from queue import Queue
+except ImportError:
+    from Queue import Queue
+
+from .smbus import SMBus
+
+Sample = namedtuple('Sample', 'bus addr cmd kind value error timestamp')
+
+# kinds of reads that are batched into one SMBus.read_registers call when
+# several of them target the same device
+_REGISTER_KINDS = {'byte_data': False, 'word_data': True}
+
+
+def _plan(reads):
+    """Split the reads (index, read) of one bus into steps, each step is
+    (method name, args, indices)"""
+    steps = []
+    batches = {}
+    for index, (bus, addr, cmd, kind) in reads:
+        if kind in _REGISTER_KINDS:
+            key = (addr, kind)
+            if key not in batches:
+                batches[key] = ([], [])
+                steps.append(('read_registers',
+                              (addr, batches[key][0], _REGISTER_KINDS[kind]),
+                              batches[key][1]))
+            batches[key][0].append(cmd)
+            batches[key][1].append(index)
+        elif kind == 'byte':
+            steps.append(('read_byte', (addr,), [index]))
+        else:
+            steps.append(('read_' + kind, (addr, cmd), [index]))
+    return steps
+
+
+class _Worker(threading.Thread):
+
+    def __init__(self, smbus, steps, reads, results):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.smbus = smbus
+        self.steps = steps
+        self.reads = reads
+        self.requests = Queue()
+        self.results = results
+
+    def run(self):
+        while self.requests.get():
+            samples = []
+            for name, args, indices in self.steps:
+                try:
+                    value = getattr(self.smbus, name)(*args)
+                    error = None
+                except Exception as e:
+                    value = None
+                    error = e
+                timestamp = time.time()
+                if name == 'read_registers' and error is None:
+                    values = list(value)
+                else:
+                    values = [value] * len(indices)
+                for index, value in zip(indices, values):
+                    sample = Sample(*(self.reads[index] + (value, error,
+                                                           timestamp)))
+                    samples.append((index, sample))
+            self.results.put(samples)
+        self.smbus.close()
+
+
+class Poller(object):
+    """Poller(reads[, smbus_factory]) -> Poller
+
+    Poll a fixed set of reads, (bus, addr, cmd, kind) tuples, on one
+    worker thread per bus.  kind is one of 'byte' (cmd is ignored),
+    'byte_data', 'word_data', 'block_data' or 'i2c_block_data'.  Byte
+    and word data reads of the same device are performed in one
+    SMBus.read_registers call.  smbus_factory(bus) returns the connected
+    SMBus object for a bus number, SMBus by default.
+    """
+
+    def __init__(self, reads, smbus_factory=SMBus):
+        self.reads = [tuple(read) for read in reads]
+        by_bus = {}
+        for index, read in enumerate(self.reads):
+            by_bus.setdefault(read[0], []).append((index, read))
+        self._results = Queue()
+        self._workers = []
+        try:
+            for bus, bus_reads in sorted(by_bus.items()):
+                steps = _plan(bus_reads)
+                worker = _Worker(smbus_factory(bus), steps, self.reads,
+                                 self._results)
+                worker.start()
+                self._workers.append(worker)
+        except BaseException:
+            # stop the workers started so far, they close their buses
+            self.close()
+            raise
+
+    def poll(self):
+        """poll() -> samples
+
+        Perform one cycle of all reads and return a list of Sample tuples
+        in the order of the reads.  Failed reads have value None and the
+        exception as error.
+        """
+        for worker in self._workers:
+            worker.requests.put(True)
+        samples = [None] * len(self.reads)
+        for worker in self._workers:
+            for index, sample in self._results.get():
+                samples[index] = sample
+        return samples
+
+    def close(self):
+        """close()
+
+        Stop the worker threads and close their buses.
+        """
+        for worker in self._workers:
+            worker.requests.put(False)
+        for worker in self._workers:
+            worker.join()
+        self._workers = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
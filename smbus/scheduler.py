@@ -0,0 +1,350 @@
+"""Periodic sampling of registers.
+
+A Scheduler reads a fixed plan of registers, each with its own period,
+on one worker thread per bus.  Deadlines are kept on an absolute
+schedule of a monotonic clock, start + k * period, so the time spent
+sleeping and reading never accumulates as drift.  The final approach to
+a deadline is spun instead of slept to reduce wake-up jitter.  All reads
+due at the same tick are performed in as few I2C_RDWR transfers as
+possible, a register address write followed by a read for each, or with
+SMBus.read_registers per device on adapters without plain I2C support.
+A failed transfer with several devices is retried per device, so a
+missing device does not fail the reads of the others.
+Samples are stored in a RingBuffer preallocated at start, so the
+sampling loop allocates little and triggers few garbage collections.
+Deadlines that passed before a read could be issued are skipped and
+counted as missed:
+
+    >>> plan = [(1, 0x48, 0x00, 'word_data', 0.01),
+    ...         (1, 0x48, 0x01, 'byte_data', 0.1)]
+    >>> with Scheduler(plan) as scheduler:
+    ...     time.sleep(1)
+    ...     samples = scheduler.read()
+    >>> scheduler.stats()['missed']"""
+
+import threading
+import time
+from array import array
+from collections import namedtuple
+
+from ._lazy import lazy
+from .poller import _plan
+from .smbus import SMBus
+from .smbus import _errno
+from .smbus import i2c_msg
+
+SMBUS = lazy(globals(), 'SMBUS', 'lib')
+
+Sample = namedtuple('Sample', 'bus addr cmd kind value errno deadline '
+                              'timestamp')
+
+_clock = getattr(time, 'monotonic', time.time)
+
+# data bytes of a read of each kind
+_LENGTHS = {'byte': 1, 'byte_data': 1, 'word_data': 2}
+
+
+class RingBuffer(object):
+    """RingBuffer(capacity) -> RingBuffer
+
+    Fixed size buffer of (entry, value, errno, deadline, timestamp)
+    records kept in preallocated arrays.  When full the oldest unread
+    records are overwritten and counted in overflows.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.overflows = 0
+        self._entries = array('i', [0]) * capacity
+        self._values = array('l', [0]) * capacity
+        self._errnos = array('i', [0]) * capacity
+        self._deadlines = array('d', [0.0]) * capacity
+        self._timestamps = array('d', [0.0]) * capacity
+        self._head = 0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._count
+
+    def append(self, entry, value, err, deadline, timestamp):
+        with self._lock:
+            pos = self._head
+            self._entries[pos] = entry
+            self._values[pos] = value
+            self._errnos[pos] = err
+            self._deadlines[pos] = deadline
+            self._timestamps[pos] = timestamp
+            self._head = (pos + 1) % self.capacity
+            if self._count == self.capacity:
+                self.overflows += 1
+            else:
+                self._count += 1
+
+    def read(self):
+        """read() -> list of (entry, value, errno, deadline, timestamp)
+
+        Remove and return the unread records, oldest first.
+        """
+        with self._lock:
+            count = self._count
+            first = (self._head - count) % self.capacity
+            records = []
+            for i in range(count):
+                pos = (first + i) % self.capacity
+                records.append((self._entries[pos], self._values[pos],
+                                self._errnos[pos], self._deadlines[pos],
+                                self._timestamps[pos]))
+            self._count = 0
+            return records
+
+
+class _Worker(threading.Thread):
+
+    def __init__(self, scheduler, smbus, entries):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.scheduler = scheduler
+        self.smbus = smbus
+        # plan indices and periods in microseconds of this bus
+        self.entries = entries
+        self.periods = [int(round(scheduler.plan[i][4] * 1e6))
+                        for i in entries]
+        plan = scheduler.plan
+        funcs = getattr(smbus, 'funcs', None)
+        self.use_rdwr = funcs is None or 'I2C_FUNC_I2C' in funcs
+        self.max_msgs = SMBUS.I2C_RDRW_IOCTL_MAX_MSGS
+        # slave address and preallocated messages of every entry
+        self.addrs = []
+        self.messages = []
+        for i in entries:
+            bus, addr, cmd, kind, period = plan[i]
+            self.addrs.append(addr)
+            read = i2c_msg.read(addr, _LENGTHS[kind])
+            if kind == 'byte':
+                self.messages.append((read,))
+            else:
+                self.messages.append((i2c_msg.write(addr, [cmd]), read))
+
+    def batches(self, due):
+        """Split the entries due into batches fitting one transfer"""
+        batches = []
+        batch = []
+        nmsgs = 0
+        for pos in due:
+            n = len(self.messages[pos])
+            if batch and nmsgs + n > self.max_msgs:
+                batches.append(batch)
+                batch = []
+                nmsgs = 0
+            batch.append(pos)
+            nmsgs += n
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def transfer(self, batch, results):
+        """Read the entries of batch in one transfer into results,
+        returns the errno of the transfer"""
+        msgs = []
+        for pos in batch:
+            msgs.extend(self.messages[pos])
+        err = 0
+        try:
+            self.smbus.transfer(msgs)
+        except EnvironmentError as e:
+            err = _errno(e)
+        for pos in batch:
+            read = self.messages[pos][-1]
+            data = read.buf
+            if err:
+                results[pos] = (0, err)
+            elif len(read) == 2:
+                results[pos] = (data[0] | data[1] << 8, 0)
+            else:
+                results[pos] = (data[0], 0)
+        return err
+
+    def read_rdwr(self, due):
+        """(value, errno) of the entries due, positions in self.entries"""
+        results = {}
+        addrs = self.addrs
+        for batch in self.batches(due):
+            if self.transfer(batch, results):
+                devices = []
+                for pos in batch:
+                    if addrs[pos] not in devices:
+                        devices.append(addrs[pos])
+                if len(devices) > 1:
+                    # a missing device must not fail the reads of the
+                    # others, retry every device on its own
+                    for addr in devices:
+                        self.transfer([pos for pos in batch
+                                       if addrs[pos] == addr], results)
+        return [results[pos] for pos in due]
+
+    def read_smbus(self, due):
+        plan = self.scheduler.plan
+        values = {}
+        for name, args, indices in _plan([(pos, plan[self.entries[pos]][:4])
+                                          for pos in due]):
+            try:
+                value = getattr(self.smbus, name)(*args)
+                if name == 'read_registers':
+                    value = list(value)
+                else:
+                    value = [value]
+                for pos, v in zip(indices, value):
+                    values[pos] = (v, 0)
+            except EnvironmentError as e:
+                for pos in indices:
+                    values[pos] = (0, _errno(e))
+        return [values[pos] for pos in due]
+
+    def run(self):
+        scheduler = self.scheduler
+        stop = scheduler._stop
+        ring = scheduler.ring
+        spin = scheduler.spin
+        entries = self.entries
+        periods = self.periods
+        missed = scheduler._missed
+        read = self.read_rdwr if self.use_rdwr else self.read_smbus
+        start = scheduler._start
+        next_due = [0] * len(entries)
+        try:
+            while not stop.is_set():
+                tick = min(next_due)
+                deadline = start + tick * 1e-6
+                remaining = deadline - _clock()
+                if remaining > spin:
+                    if scheduler._wait(remaining - spin):
+                        break
+                while _clock() < deadline:
+                    pass
+                due = [pos for pos, t in enumerate(next_due) if t == tick]
+                results = read(due)
+                timestamp = _clock()
+                now = int((timestamp - start) * 1e6)
+                for pos, (value, err) in zip(due, results):
+                    ring.append(entries[pos], value, err, deadline, timestamp)
+                    period = periods[pos]
+                    following = tick + period
+                    if following <= now:
+                        skipped = (now - following) // period + 1
+                        missed[entries[pos]] += skipped
+                        following += skipped * period
+                    next_due[pos] = following
+                scheduler._lateness(timestamp - deadline)
+        finally:
+            self.smbus.close()
+
+
+class Scheduler(object):
+    """Scheduler(plan[, capacity[, smbus_factory[, spin]]]) -> Scheduler
+
+    Sample the registers of plan, a list of (bus, addr, cmd, kind,
+    period) tuples, every period seconds.  kind is 'byte' (cmd is
+    ignored), 'byte_data' or 'word_data'.  capacity is the size of the
+    ring buffer of samples, smbus_factory(bus) returns the connected
+    SMBus object for a bus number, SMBus by default, and spin is the time
+    before each deadline that is busy-waited instead of slept.  Sampling
+    starts with start() or when entering a with block.
+    """
+
+    def __init__(self, plan, capacity=4096, smbus_factory=SMBus,
+                 spin=0.0002):
+        self.plan = [tuple(entry) for entry in plan]
+        for bus, addr, cmd, kind, period in self.plan:
+            if kind not in _LENGTHS:
+                raise ValueError("Unsupported kind %r" % (kind,))
+            if period <= 0:
+                raise ValueError("Period must be positive")
+        self.ring = RingBuffer(capacity)
+        self.spin = spin
+        self._smbus_factory = smbus_factory
+        self._missed = [0] * len(self.plan)
+        self._ticks = 0
+        self._max_lateness = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._workers = []
+        self._start = None
+
+    def start(self):
+        """start()
+
+        Open the buses and start sampling, the first deadline of every
+        entry is now.
+        """
+        if self._workers:
+            raise RuntimeError("Scheduler is already running")
+        by_bus = {}
+        for index, entry in enumerate(self.plan):
+            by_bus.setdefault(entry[0], []).append(index)
+        self._stop.clear()
+        self._start = _clock()
+        try:
+            for bus, entries in sorted(by_bus.items()):
+                self._workers.append(
+                    _Worker(self, self._smbus_factory(bus), entries))
+        except BaseException:
+            for worker in self._workers:
+                worker.smbus.close()
+            self._workers = []
+            raise
+        for worker in self._workers:
+            worker.start()
+
+    def stop(self):
+        """stop()
+
+        Stop sampling and close the buses.  Samples not read yet stay in
+        the ring buffer.
+        """
+        self._stop.set()
+        for worker in self._workers:
+            worker.join()
+        self._workers = []
+
+    def _wait(self, seconds):
+        """Sleep for seconds, True if the scheduler was stopped"""
+        return self._stop.wait(seconds)
+
+    def _lateness(self, lateness):
+        with self._lock:
+            self._ticks += 1
+            if lateness > self._max_lateness:
+                self._max_lateness = lateness
+
+    def read(self):
+        """read() -> samples
+
+        Remove and return the samples taken since the last call as a list
+        of Sample tuples, oldest first.  value is 0 for failed reads,
+        errno is 0 for successful ones.
+        """
+        plan = self.plan
+        return [Sample(*(plan[entry][:4] + (value, err, deadline,
+                                             timestamp)))
+                for entry, value, err, deadline, timestamp
+                in self.ring.read()]
+
+    def stats(self):
+        """stats() -> dict
+
+        {'ticks': ticks performed, 'missed': missed deadlines per plan
+         entry, 'max_lateness': largest delay of a tick in seconds,
+         'overflows': samples overwritten before they were read}
+        """
+        with self._lock:
+            return {'ticks': self._ticks, 'missed': list(self._missed),
+                    'max_lateness': self._max_lateness,
+                    'overflows': self.ring.overflows}
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
@@ -0,0 +1,499 @@
+"""Simulated I2C bus backend.
+
+SimulatedBus implements the backend interface of smbus.backend in
+Python on top of register-map devices, so SMBus can be exercised,
+benchmarked and regression-tested without any I2C hardware:
+
+    >>> from smbus import SMBus
+    >>> from smbus.sim import SimulatedBus, RegisterDevice
+    >>> sim = SimulatedBus({0x50: RegisterDevice({0x10: 0x42})})
+    >>> bus = SMBus(1, backend=sim)
+    >>> bus.read_byte_data(0x50, 0x10)
+    66
+
+Transactions can be slowed down with a fixed latency and made to fail
+with inject() or a random error_rate.  The number of ioctls the kernel
+would have seen is counted in SimulatedBus.stats."""
+
+import collections
+import errno
+import random
+import time
+
+from ._lazy import lazy
+from .smbus import _errno
+
+ffi = lazy(globals(), 'ffi', 'ffi')
+SMBUS = lazy(globals(), 'SMBUS', 'lib')
+
+_FUNC_FLAGS = (
+    'I2C_FUNC_I2C', 'I2C_FUNC_SMBUS_PEC', 'I2C_FUNC_SMBUS_BLOCK_PROC_CALL',
+    'I2C_FUNC_SMBUS_QUICK', 'I2C_FUNC_SMBUS_BYTE', 'I2C_FUNC_SMBUS_BYTE_DATA',
+    'I2C_FUNC_SMBUS_WORD_DATA', 'I2C_FUNC_SMBUS_PROC_CALL',
+    'I2C_FUNC_SMBUS_BLOCK_DATA', 'I2C_FUNC_SMBUS_I2C_BLOCK',
+)
+
+
+def all_funcs():
+    """Functionality mask of an adapter supporting every transaction"""
+    mask = 0
+    for flag in _FUNC_FLAGS:
+        mask |= getattr(SMBUS, flag)
+    return mask
+
+
+_clock = getattr(time, 'monotonic', time.time)
+
+# errors of a slave not acknowledging, retried by xfer_retry
+_NAK = (errno.ENXIO, errno.EREMOTEIO, errno.EAGAIN, errno.ETIMEDOUT)
+
+
+class RegisterDevice(object):
+    """RegisterDevice([registers[, blocks]]) -> RegisterDevice
+
+    Simulated slave with 256 byte registers selected by the command byte
+    and an auto-incrementing register pointer.  Word registers are two
+    consecutive byte registers in little endian order.  SMBus block
+    transactions use separate blocks, a dict mapping commands to bytes.
+    registers is a dict of initial register values or a bytes-like object.
+    Methods may raise IOError(errno) to make a transaction fail.
+    """
+
+    def __init__(self, registers=None, blocks=None):
+        self.registers = bytearray(256)
+        if isinstance(registers, dict):
+            for reg, val in registers.items():
+                self.registers[reg] = val
+        elif registers is not None:
+            registers = bytearray(registers)
+            self.registers[:len(registers)] = registers
+        self.blocks = dict(blocks or {})
+        self.pointer = 0
+
+    def read(self, cmd, length):
+        regs = self.registers
+        data = bytearray(regs[(cmd + i) & 0xFF] for i in range(length))
+        self.pointer = (cmd + length) & 0xFF
+        return data
+
+    def write(self, cmd, data):
+        data = bytearray(data)
+        regs = self.registers
+        for i, val in enumerate(data):
+            regs[(cmd + i) & 0xFF] = val
+        self.pointer = (cmd + len(data)) & 0xFF
+
+    def quick(self, read_write):
+        pass
+
+    def receive_byte(self):
+        return self.read(self.pointer, 1)[0]
+
+    def send_byte(self, val):
+        self.pointer = val
+
+    def process_call(self, cmd, val):
+        self.write(cmd, [val & 0xFF, val >> 8])
+        lo, hi = self.read(cmd, 2)
+        return hi << 8 | lo
+
+    def block_read(self, cmd):
+        return bytearray(self.blocks.get(cmd, b''))
+
+    def block_write(self, cmd, data):
+        self.blocks[cmd] = bytearray(data)
+
+    def block_process_call(self, cmd, data):
+        self.block_write(cmd, data)
+        return self.block_read(cmd)
+
+    def i2c_write(self, data):
+        """Plain I2C write, the first byte selects the register"""
+        data = bytearray(data)
+        if data:
+            self.write(data[0], data[1:])
+
+    def i2c_read(self, length):
+        """Plain I2C read starting at the register pointer"""
+        return self.read(self.pointer, length)
+
+
+class EepromDevice(RegisterDevice):
+    """EepromDevice([registers[, page_size[, write_time]]]) -> EepromDevice
+
+    Simulated I2C EEPROM.  Writes wrap around within the page of
+    page_size bytes they start in and are followed by an internal write
+    cycle of write_time seconds, during which the device does not
+    acknowledge its address (ENXIO).  busy counts the refused
+    transactions.
+    """
+
+    def __init__(self, registers=None, page_size=16, write_time=0.005):
+        RegisterDevice.__init__(self, registers)
+        self.page_size = page_size
+        self.write_time = write_time
+        self.ready = 0.0
+        self.busy = 0
+
+    def _acknowledge(self):
+        if _clock() < self.ready:
+            self.busy += 1
+            raise IOError(errno.ENXIO)
+
+    def quick(self, read_write):
+        self._acknowledge()
+
+    def read(self, cmd, length):
+        self._acknowledge()
+        return RegisterDevice.read(self, cmd, length)
+
+    def send_byte(self, val):
+        self._acknowledge()
+        RegisterDevice.send_byte(self, val)
+
+    def write(self, cmd, data):
+        self._acknowledge()
+        data = bytearray(data)
+        page = cmd - cmd % self.page_size
+        for i, val in enumerate(data):
+            self.registers[page + (cmd - page + i) % self.page_size] = val
+        self.pointer = page + (cmd - page + len(data)) % self.page_size
+        if data:
+            self.ready = _clock() + self.write_time
+
+
+class _File(object):
+    __slots__ = ('addr', 'pec')
+
+    def __init__(self):
+        self.addr = -1
+        self.pec = False
+
+
+class SimulatedBus(object):
+    """SimulatedBus([devices[, latency[, funcs[, error_rate[, seed]]]]])
+
+    Backend simulating an adapter with devices, a dict mapping slave
+    addresses to device objects such as RegisterDevice.  Every
+    transaction takes latency seconds.  funcs is the functionality mask
+    reported by I2C_FUNCS, every transaction is supported by default.
+    error_rate is the probability of a transaction failing with
+    EREMOTEIO, drawn from a random.Random(seed).  Transactions with
+    addresses without a device fail with ENXIO.  Devices with a stretch
+    attribute hold every transaction for stretch seconds, or fail it with
+    ETIMEDOUT once the I2C_TIMEOUT of the adapter has passed.  Devices
+    with an i2c_stop() method are notified at the end of every I2C_RDWR transfer
+    addressing them.
+    """
+
+    def __init__(self, devices=None, latency=0.0, funcs=None, error_rate=0.0,
+                 seed=None):
+        self.devices = dict(devices or {})
+        self.latency = latency
+        self.funcs_mask = all_funcs() if funcs is None else funcs
+        self.error_rate = error_rate
+        self.stats = collections.Counter()
+        self._random = random.Random(seed)
+        self._faults = {}
+        # adapter settings of I2C_TIMEOUT and I2C_RETRIES, None until set
+        self.timeout = None
+        self.retries = None
+        self._files = {}
+        self._next_fd = 1000
+        self._ioctl_names = {SMBUS.I2C_SLAVE: 'I2C_SLAVE',
+                             SMBUS.I2C_PEC: 'I2C_PEC',
+                             SMBUS.I2C_TIMEOUT: 'I2C_TIMEOUT',
+                             SMBUS.I2C_RETRIES: 'I2C_RETRIES'}
+
+    def inject(self, addr, err=errno.EREMOTEIO, count=1):
+        """inject(addr[, err[, count]])
+
+        Make the next count transactions with addr fail with err, all of
+        them if count is None.
+        """
+        self._faults[addr] = [err, count]
+
+    def clear_faults(self):
+        self._faults.clear()
+
+    def _check(self, addr):
+        """Simulate the addressing phase, returns 0 or -errno"""
+        if self.latency:
+            time.sleep(self.latency)
+        if addr not in self.devices:
+            return -errno.ENXIO
+        stretch = getattr(self.devices[addr], 'stretch', 0.0)
+        if stretch:
+            if self.timeout is not None and stretch > self.timeout:
+                time.sleep(self.timeout)
+                return -errno.ETIMEDOUT
+            time.sleep(stretch)
+        fault = self._faults.get(addr)
+        if fault is not None:
+            err, count = fault
+            if count is not None:
+                if count <= 1:
+                    del self._faults[addr]
+                else:
+                    fault[1] = count - 1
+            return -err
+        if self.error_rate and self._random.random() < self.error_rate:
+            return -errno.EREMOTEIO
+        return 0
+
+    def open(self, bus):
+        fd = self._next_fd
+        self._next_fd += 1
+        self._files[fd] = _File()
+        self.stats['open'] += 1
+        return fd
+
+    def close(self, fd):
+        if self._files.pop(fd, None) is None:
+            raise IOError(errno.EBADF)
+
+    def ioctl(self, fd, request, arg):
+        f = self._files.get(fd)
+        if f is None:
+            return -errno.EBADF
+        name = self._ioctl_names.get(request)
+        if name is None:
+            return -errno.ENOTTY
+        self.stats[name] += 1
+        if request == SMBUS.I2C_SLAVE:
+            if arg < 0 or arg > 0x7F:
+                return -errno.EINVAL
+            f.addr = arg
+        elif request == SMBUS.I2C_PEC:
+            f.pec = bool(arg)
+        elif request == SMBUS.I2C_TIMEOUT:
+            self.timeout = arg / 100.0
+        elif request == SMBUS.I2C_RETRIES:
+            self.retries = arg
+        return 0
+
+    def funcs(self, fd, funcs):
+        if fd not in self._files:
+            return -errno.EBADF
+        self.stats['I2C_FUNCS'] += 1
+        funcs[0] = self.funcs_mask
+        return 0
+
+    def access(self, fd, read_write, cmd, size, data):
+        f = self._files.get(fd)
+        if f is None:
+            return -errno.EBADF
+        self.stats['I2C_SMBUS'] += 1
+        res = self._check(f.addr)
+        if res < 0:
+            return res
+        try:
+            return self._transaction(self.devices[f.addr], read_write,
+                                     cmd & 0xFF, size, data)
+        except EnvironmentError as e:
+            return -_errno(e)
+
+    def _transaction(self, device, read_write, cmd, size, data):
+        read = read_write == SMBUS.I2C_SMBUS_READ
+        if size == SMBUS.I2C_SMBUS_QUICK:
+            device.quick(read_write)
+        elif size == SMBUS.I2C_SMBUS_BYTE:
+            if read:
+                data.byte = device.receive_byte()
+            else:
+                device.send_byte(cmd)
+        elif size == SMBUS.I2C_SMBUS_BYTE_DATA:
+            if read:
+                data.byte = device.read(cmd, 1)[0]
+            else:
+                device.write(cmd, [data.byte])
+        elif size == SMBUS.I2C_SMBUS_WORD_DATA:
+            if read:
+                lo, hi = device.read(cmd, 2)
+                data.word = hi << 8 | lo
+            else:
+                device.write(cmd, [data.word & 0xFF, data.word >> 8])
+        elif size == SMBUS.I2C_SMBUS_PROC_CALL:
+            data.word = device.process_call(cmd, data.word)
+        elif size in (SMBUS.I2C_SMBUS_BLOCK_DATA,
+                      SMBUS.I2C_SMBUS_BLOCK_PROC_CALL):
+            if not read:
+                length = data.block[0]
+                if length == 0 or length > SMBUS.I2C_SMBUS_BLOCK_MAX:
+                    return -errno.EINVAL
+                block = data.block[1:length + 1]
+            if size == SMBUS.I2C_SMBUS_BLOCK_PROC_CALL:
+                block = device.block_process_call(cmd, block)
+            elif read:
+                block = device.block_read(cmd)
+            else:
+                device.block_write(cmd, block)
+                return 0
+            length = len(block)
+            if length == 0 or length > SMBUS.I2C_SMBUS_BLOCK_MAX:
+                return -errno.EPROTO
+            data.block[0] = length
+            data.block[1:length + 1] = list(bytearray(block))
+        elif size in (SMBUS.I2C_SMBUS_I2C_BLOCK_BROKEN,
+                      SMBUS.I2C_SMBUS_I2C_BLOCK_DATA):
+            length = data.block[0]
+            if length == 0 or length > SMBUS.I2C_SMBUS_BLOCK_MAX:
+                return -errno.EINVAL
+            if read:
+                data.block[1:length + 1] = list(device.read(cmd, length))
+            else:
+                device.write(cmd, data.block[1:length + 1])
+        else:
+            return -errno.EINVAL
+        return 0
+
+    def xfer(self, fd, cur, addr, read_write, cmd, size, value):
+        if cur != addr:
+            res = self.ioctl(fd, SMBUS.I2C_SLAVE, addr)
+            if res < 0:
+                return res
+        data = ffi.new("union i2c_smbus_data *")
+        if read_write == SMBUS.I2C_SMBUS_WRITE:
+            if size == SMBUS.I2C_SMBUS_BYTE_DATA:
+                data.byte = value & 0xFF
+            else:
+                data.word = value & 0xFFFF
+        res = self.access(fd, read_write, cmd, size, data)
+        if res < 0:
+            return res
+        if (read_write == SMBUS.I2C_SMBUS_WRITE and
+                size != SMBUS.I2C_SMBUS_PROC_CALL):
+            return 0
+        if size in (SMBUS.I2C_SMBUS_BYTE, SMBUS.I2C_SMBUS_BYTE_DATA):
+            return data.byte
+        return data.word
+
+    def xfer_retry(self, fd, cur, addr, read_write, cmd, size, value, tries,
+                   delay_us, attempts):
+        res = -errno.EINVAL
+        attempt = 0
+        while attempt < tries:
+            attempt += 1
+            res = self.xfer(fd, cur, addr, read_write, cmd, size, value)
+            if res >= 0 or -res not in _NAK:
+                break
+            cur = addr
+            if attempt < tries and delay_us > 0:
+                time.sleep(delay_us * 1e-6)
+        if attempts != ffi.NULL:
+            attempts[0] = attempt
+        return res
+
+    def rdwr(self, fd, msgs, nmsgs):
+        if fd not in self._files:
+            return -errno.EBADF
+        if nmsgs > SMBUS.I2C_RDRW_IOCTL_MAX_MSGS:
+            return -errno.EINVAL
+        self.stats['I2C_RDWR'] += 1
+        for i in range(nmsgs):
+            msg = msgs[i]
+            res = self._check(msg.addr)
+            if res < 0:
+                return res
+            device = self.devices[msg.addr]
+            buf = ffi.cast("__u8 *", msg.buf)
+            try:
+                if msg.flags & SMBUS.I2C_M_RD:
+                    data = bytes(device.i2c_read(msg.len))
+                    ffi.memmove(buf, data, msg.len)
+                else:
+                    device.i2c_write(ffi.buffer(buf, msg.len)[:])
+            except EnvironmentError as e:
+                return -_errno(e)
+        # devices may act on the STOP ending the transfer
+        for addr in sorted(set(msgs[i].addr for i in range(nmsgs))):
+            stop = getattr(self.devices[addr], 'i2c_stop', None)
+            if stop is not None:
+                try:
+                    stop()
+                except EnvironmentError as e:
+                    return -_errno(e)
+        return nmsgs
+
+    def read_block_into(self, fd, cmd, size, buf, length):
+        data = ffi.new("union i2c_smbus_data *")
+        data.block[0] = min(length, SMBUS.I2C_SMBUS_BLOCK_MAX)
+        res = self.access(fd, SMBUS.I2C_SMBUS_READ, cmd, size, data)
+        if res < 0:
+            return res
+        count = data.block[0]
+        ffi.memmove(buf, data.block + 1, min(count, length))
+        return count
+
+    def read_registers(self, fd, size, cmds, vals, n):
+        word = size == SMBUS.I2C_SMBUS_WORD_DATA
+        vals = ffi.cast("__u16 *" if word else "__u8 *", vals)
+        data = ffi.new("union i2c_smbus_data *")
+        for i in range(n):
+            res = self.access(fd, SMBUS.I2C_SMBUS_READ, cmds[i], size, data)
+            if res < 0:
+                return res
+            vals[i] = data.word if word else data.byte
+        return n
+
+    def write_registers(self, fd, size, cmds, vals, n):
+        word = size == SMBUS.I2C_SMBUS_WORD_DATA
+        data = ffi.new("union i2c_smbus_data *")
+        for i in range(n):
+            if word:
+                data.word = vals[i]
+            else:
+                data.byte = vals[i] & 0xFF
+            res = self.access(fd, SMBUS.I2C_SMBUS_WRITE, cmds[i], size, data)
+            if res < 0:
+                return res
+        return n
+
+    def read_i2c_block_stream(self, fd, cmd, buf, length, chunk):
+        data = ffi.new("union i2c_smbus_data *")
+        for off in range(0, length, chunk):
+            n = min(chunk, length - off)
+            data.block[0] = n
+            res = self.access(fd, SMBUS.I2C_SMBUS_READ, cmd + off,
+                              SMBUS.I2C_SMBUS_I2C_BLOCK_DATA, data)
+            if res < 0:
+                return res
+            ffi.memmove(buf + off, data.block + 1, n)
+        return length
+
+    def read_fifo(self, fd, cmd, buf, length):
+        data = ffi.new("union i2c_smbus_data *")
+        block_max = SMBUS.I2C_SMBUS_BLOCK_MAX
+        for off in range(0, length, block_max):
+            n = min(block_max, length - off)
+            data.block[0] = n
+            res = self.access(fd, SMBUS.I2C_SMBUS_READ, cmd,
+                              SMBUS.I2C_SMBUS_I2C_BLOCK_DATA, data)
+            if res < 0:
+                return res
+            ffi.memmove(buf + off, data.block + 1, n)
+        return length
+
+    def write_i2c_block_stream(self, fd, cmd, buf, length, chunk, tries,
+                               delay_us, written):
+        data = ffi.new("union i2c_smbus_data *")
+        off = 0
+        res = 0
+        while off < length:
+            n = min(chunk - (cmd + off) % chunk, length - off)
+            res = -errno.EINVAL
+            for attempt in range(1, tries + 1):
+                data.block[0] = n
+                ffi.memmove(data.block + 1, buf + off, n)
+                res = self.access(fd, SMBUS.I2C_SMBUS_WRITE, cmd + off,
+                                  SMBUS.I2C_SMBUS_I2C_BLOCK_BROKEN, data)
+                if res >= 0 or -res not in _NAK:
+                    break
+                if attempt < tries and delay_us > 0:
+                    time.sleep(delay_us * 1e-6)
+            if res < 0:
+                break
+            off += n
+        if written != ffi.NULL:
+            written[0] = off
+        return res if res < 0 else length
@@ -26,32 +26,103 @@ modules.
 Because the I2C device interface is opened R/W, users of this
 module usually must have root permissions."""
 
+import errno
+import math
 import os
+import time
+from array import array
+from types import MethodType
 
 from .util import validate
-from .util import int2byte
-from fcntl import ioctl
+from .util import Block
 
-from ._smbus_cffi import ffi
-from ._smbus_cffi import lib as SMBUS
+from .backend import KERNEL
+from .backend import MAXPATH  # noqa: F401
+from ._lazy import lazy
 
-MAXPATH = 16
+ffi = lazy(globals(), 'ffi', 'ffi')
+SMBUS = lazy(globals(), 'SMBUS', 'lib')
+
+
+# errors of a slave not acknowledging its address, retried by the status
+# transactions, wait_ack and write_i2c_block_data_stream
+_NAK = (errno.ENXIO, errno.EREMOTEIO, errno.EAGAIN, errno.ETIMEDOUT)
+
+
+def _error(err):
+    """IOError with the errno err and its message"""
+    return IOError(err, os.strerror(err))
+
+
+def _errno(e):
+    """errno of the exception e, EIO if it has none"""
+    err = getattr(e, 'errno', None)
+    if err is None and e.args and isinstance(e.args[0], int):
+        err = e.args[0]
+    return err if err is not None else errno.EIO
+
+
+def _transaction_addr(name, args, kwargs):
+    """Slave address of the transaction name called with args and
+    kwargs, that of the first message for transfer"""
+    if args:
+        addr = args[0]
+    else:
+        addr = kwargs.get('addr', kwargs.get('messages'))
+    if name == 'transfer':
+        addr = addr[0].addr if addr else None
+    return addr
+
+
+def _block_length(vals):
+    """Number of bytes in vals, a list or a bytes-like object"""
+    if isinstance(vals, list):
+        return len(vals)
+    return memoryview(vals).nbytes
+
+
+# names of the SMBus methods that perform bus transactions
+TRANSACTIONS = (
+    'write_quick', 'read_byte', 'write_byte', 'read_byte_data',
+    'write_byte_data', 'read_word_data', 'write_word_data', 'process_call',
+    'read_block_data', 'read_block_data_bytes', 'read_block_data_into',
+    'write_block_data', 'block_process_call', 'read_i2c_block_data',
+    'read_i2c_block_data_bytes', 'read_i2c_block_data_into',
+    'write_i2c_block_data', 'read_i2c_block_data_stream',
+    'write_i2c_block_data_stream', 'read_fifo_data_into', 'read_registers',
+    'write_registers', 'transfer', 'write_quick_status', 'read_byte_status',
+    'write_byte_status', 'read_byte_data_status', 'write_byte_data_status',
+    'read_word_data_status', 'write_word_data_status', 'wait_ack',
+)
 
 
 class SMBus(object):
-    """SMBus([bus]) -> SMBus
+    """SMBus([bus[, backend]]) -> SMBus
     Return a new SMBus object that is (optionally) connected to the
-    specified I2C device interface.
+    specified I2C device interface.  backend performs the transactions,
+    see smbus.backend, by default the ioctls of the Linux kernel.
     """
 
+    _backend = KERNEL
     _fd = -1
+    _bus = -1
     _addr = -1
     _pec = 0
+    _timeout = None
+    _retries = None
+    _funcs = None
+    _funcs_policy = None
+    _layers = ()
     # compat mode, enables some features that are not compatible with the
     # original smbusmodule.c
     _compat = False
 
-    def __init__(self, bus=-1):
+    def __init__(self, bus=-1, backend=None):
+        # scratch union reused by the block transactions; methods never
+        # run concurrently on one object, see ThreadSafeSMBus
+        self._data = ffi.new("union i2c_smbus_data *")
+        if backend is not None:
+            self._backend = backend
         if bus >= 0:
             self.open(bus)
 
@@ -60,10 +131,14 @@ class SMBus(object):
 
         Disconnects the object from the bus.
         """
-        os.close(self._fd)
+        self._backend.close(self._fd)
         self._fd = -1
+        self._bus = -1
         self._addr = -1
         self._pec = 0
+        self._timeout = None
+        self._retries = None
+        self._funcs = None
 
     def dealloc(self):
         self.close()
@@ -74,18 +149,27 @@ class SMBus(object):
         Connects the object to the specified SMBus.
         """
         bus = int(bus)
-        path = "/dev/i2c-%d" % (bus,)
-        if len(path) >= MAXPATH:
-                raise OverflowError("Bus number is invalid.")
-        try:
-            self._fd = os.open(path, os.O_RDWR, 0)
-        except OSError as e:
-            raise IOError(e.errno)
+        self._fd = self._backend.open(bus)
+        self._bus = bus
+        funcs = ffi.new("unsigned long *")
+        res = self._backend.funcs(self._fd, funcs)
+        if res < 0:
+            self.close()
+            raise _error(-res)
+        self._funcs = Funcs(funcs[0])
+        self._update_methods()
+
+    @property
+    def bus(self):
+        """Number of the connected bus, -1 if not connected"""
+        return self._bus
 
     def _set_addr(self, addr):
         """private helper method"""
         if self._addr != addr:
-            ioctl(self._fd, SMBUS.I2C_SLAVE, addr)
+            res = self._backend.ioctl(self._fd, SMBUS.I2C_SLAVE, addr)
+            if res < 0:
+                raise _error(-res)
             self._addr = addr
 
     @validate(addr=int)
@@ -94,9 +178,13 @@ class SMBus(object):
 
         Perform SMBus Quick transaction.
         """
-        self._set_addr(addr)
-        if SMBUS.i2c_smbus_write_quick(self._fd, SMBUS.I2C_SMBUS_WRITE) != 0:
-            raise IOError(ffi.errno)
+        res = self._backend.xfer(self._fd, self._addr, addr,
+                                 SMBUS.I2C_SMBUS_WRITE, 0,
+                                 SMBUS.I2C_SMBUS_QUICK, 0)
+        if res < 0:
+            self._addr = -1
+            raise _error(-res)
+        self._addr = addr
 
     @validate(addr=int)
     def read_byte(self, addr):
@@ -104,11 +192,14 @@ class SMBus(object):
 
         Perform SMBus Read Byte transaction.
         """
-        self._set_addr(addr)
-        result = SMBUS.i2c_smbus_read_byte(self._fd)
-        if result == -1:
-            raise IOError(ffi.errno)
-        return result
+        res = self._backend.xfer(self._fd, self._addr, addr,
+                                 SMBUS.I2C_SMBUS_READ, 0,
+                                 SMBUS.I2C_SMBUS_BYTE, 0)
+        if res < 0:
+            self._addr = -1
+            raise _error(-res)
+        self._addr = addr
+        return res
 
     @validate(addr=int, val=int)
     def write_byte(self, addr, val):
@@ -116,9 +207,13 @@ class SMBus(object):
 
         Perform SMBus Write Byte transaction.
         """
-        self._set_addr(addr)
-        if SMBUS.i2c_smbus_write_byte(self._fd, ffi.cast("__u8", val)) == -1:
-            raise IOError(ffi.errno)
+        res = self._backend.xfer(self._fd, self._addr, addr,
+                                 SMBUS.I2C_SMBUS_WRITE, val,
+                                 SMBUS.I2C_SMBUS_BYTE, 0)
+        if res < 0:
+            self._addr = -1
+            raise _error(-res)
+        self._addr = addr
 
     @validate(addr=int, cmd=int)
     def read_byte_data(self, addr, cmd):
@@ -126,10 +221,13 @@ class SMBus(object):
 
         Perform SMBus Read Byte Data transaction.
         """
-        self._set_addr(addr)
-        res = SMBUS.i2c_smbus_read_byte_data(self._fd, ffi.cast("__u8", cmd))
-        if res == -1:
-            raise IOError(ffi.errno)
+        res = self._backend.xfer(self._fd, self._addr, addr,
+                                 SMBUS.I2C_SMBUS_READ, cmd,
+                                 SMBUS.I2C_SMBUS_BYTE_DATA, 0)
+        if res < 0:
+            self._addr = -1
+            raise _error(-res)
+        self._addr = addr
         return res
 
     @validate(addr=int, cmd=int, val=int)
@@ -138,11 +236,13 @@ class SMBus(object):
 
         Perform SMBus Write Byte Data transaction.
         """
-        self._set_addr(addr)
-        if SMBUS.i2c_smbus_write_byte_data(self._fd,
-                                           ffi.cast("__u8", cmd),
-                                           ffi.cast("__u8", val)) == -1:
-            raise IOError(ffi.errno)
+        res = self._backend.xfer(self._fd, self._addr, addr,
+                                 SMBUS.I2C_SMBUS_WRITE, cmd,
+                                 SMBUS.I2C_SMBUS_BYTE_DATA, val)
+        if res < 0:
+            self._addr = -1
+            raise _error(-res)
+        self._addr = addr
 
     @validate(addr=int, cmd=int)
     def read_word_data(self, addr, cmd):
@@ -150,11 +250,14 @@ class SMBus(object):
 
         Perform SMBus Read Word Data transaction.
         """
-        self._set_addr(addr)
-        result = SMBUS.i2c_smbus_read_word_data(self._fd, ffi.cast("__u8", cmd))
-        if result == -1:
-            raise IOError(ffi.errno)
-        return result
+        res = self._backend.xfer(self._fd, self._addr, addr,
+                                 SMBUS.I2C_SMBUS_READ, cmd,
+                                 SMBUS.I2C_SMBUS_WORD_DATA, 0)
+        if res < 0:
+            self._addr = -1
+            raise _error(-res)
+        self._addr = addr
+        return res
 
     @validate(addr=int, cmd=int, val=int)
     def write_word_data(self, addr, cmd, val):
@@ -162,11 +265,13 @@ class SMBus(object):
 
         Perform SMBus Write Word Data transaction.
         """
-        self._set_addr(addr)
-        if SMBUS.i2c_smbus_write_word_data(self._fd,
-                                           ffi.cast("__u8", cmd),
-                                           ffi.cast("__u16", val)) == -1:
-            raise IOError(ffi.errno)
+        res = self._backend.xfer(self._fd, self._addr, addr,
+                                 SMBUS.I2C_SMBUS_WRITE, cmd,
+                                 SMBUS.I2C_SMBUS_WORD_DATA, val)
+        if res < 0:
+            self._addr = -1
+            raise _error(-res)
+        self._addr = addr
 
     @validate(addr=int, cmd=int, val=int)
     def process_call(self, addr, cmd, val):
@@ -179,14 +284,36 @@ class SMBus(object):
 
         Set _compat = False on the SMBus instance to get a return value.
         """
-        self._set_addr(addr)
-        ret = SMBUS.i2c_smbus_process_call(self._fd,
-                                           ffi.cast("__u8", cmd),
-                                           ffi.cast("__u16", val))
-        if ret == -1:
-            raise IOError(ffi.errno)
+        res = self._backend.xfer(self._fd, self._addr, addr,
+                                 SMBUS.I2C_SMBUS_WRITE, cmd,
+                                 SMBUS.I2C_SMBUS_PROC_CALL, val)
+        if res < 0:
+            self._addr = -1
+            raise _error(-res)
+        self._addr = addr
         if self._compat:
-            return ret
+            return res
+
+    @validate(addr=int, tries=int)
+    def wait_ack(self, addr, tries=100, delay=0.001):
+        """wait_ack(addr, tries=100, delay=0.001) -> attempts
+
+        Poll the slave at addr with SMBus Quick transactions until it
+        acknowledges, e.g. an EEPROM finishing a write cycle, up to tries
+        times with delay seconds between attempts.  The loop runs in C.
+        Returns the number of attempts, raises IOError with the errno of
+        the last attempt if the slave never acknowledged.
+        """
+        attempts = ffi.new("int *")
+        res = self._backend.xfer_retry(self._fd, self._addr, addr,
+                                       SMBUS.I2C_SMBUS_WRITE, 0,
+                                       SMBUS.I2C_SMBUS_QUICK, 0, tries,
+                                       int(delay * 1e6), attempts)
+        if res < 0:
+            self._addr = -1
+            raise _error(-res)
+        self._addr = addr
+        return attempts[0]
 
     @validate(addr=int, cmd=int)
     def read_block_data(self, addr, cmd):
@@ -197,45 +324,76 @@ class SMBus(object):
         # XXX untested, the raspberry pi i2c driver does not support this
         # command
         self._set_addr(addr)
-        data = ffi.new("union i2c_smbus_data *")
-        if SMBUS.i2c_smbus_access(self._fd,
-                                  int2byte(SMBUS.I2C_SMBUS_READ),
-                                  ffi.cast("__u8", cmd),
-                                  SMBUS.I2C_SMBUS_BLOCK_DATA,
-                                  data):
-            raise IOError(ffi.errno)
+        data = self._data
+        res = self._backend.access(self._fd, SMBUS.I2C_SMBUS_READ, cmd,
+                                   SMBUS.I2C_SMBUS_BLOCK_DATA, data)
+        if res < 0:
+            raise _error(-res)
         return smbus_data_to_list(data)
 
-    @validate(addr=int, cmd=int, vals=list)
+    @validate(addr=int, cmd=int)
+    def read_block_data_bytes(self, addr, cmd):
+        """read_block_data_bytes(addr, cmd) -> bytes
+
+        Perform SMBus Read Block Data transaction, returning the block as
+        bytes instead of a list.
+        """
+        self._set_addr(addr)
+        data = self._data
+        res = self._backend.access(self._fd, SMBUS.I2C_SMBUS_READ, cmd,
+                                   SMBUS.I2C_SMBUS_BLOCK_DATA, data)
+        if res < 0:
+            raise _error(-res)
+        return smbus_data_to_bytes(data)
+
+    @validate(addr=int, cmd=int)
+    def read_block_data_into(self, addr, cmd, buf):
+        """read_block_data_into(addr, cmd, buf) -> count
+
+        Perform SMBus Read Block Data transaction into buf, a writable
+        bytes-like object, without allocating a result list.
+        """
+        self._set_addr(addr)
+        buf = ffi.from_buffer(buf, require_writable=True)
+        res = self._backend.read_block_into(self._fd, cmd,
+                                            SMBUS.I2C_SMBUS_BLOCK_DATA,
+                                            buf, len(buf))
+        if res < 0:
+            raise _error(-res)
+        if res > len(buf):
+            raise OverflowError("Block of %d bytes does not fit into a "
+                                "buffer of %d bytes" % (res, len(buf)))
+        return res
+
+    @validate(addr=int, cmd=int, vals=Block)
     def write_block_data(self, addr, cmd, vals):
         """write_block_data(addr, cmd, vals)
 
-        Perform SMBus Write Block Data transaction.
+        Perform SMBus Write Block Data transaction.  vals is a list of
+        integers or a bytes-like object.
         """
         self._set_addr(addr)
-        data = ffi.new("union i2c_smbus_data *")
+        data = self._data
         list_to_smbus_data(data, vals)
-        if SMBUS.i2c_smbus_access(self._fd,
-                                  int2byte(SMBUS.I2C_SMBUS_WRITE),
-                                  ffi.cast("__u8", cmd),
-                                  SMBUS.I2C_SMBUS_BLOCK_DATA,
-                                  data):
-            raise IOError(ffi.errno)
-
-    @validate(addr=int, cmd=int, vals=list)
+        res = self._backend.access(self._fd, SMBUS.I2C_SMBUS_WRITE, cmd,
+                                   SMBUS.I2C_SMBUS_BLOCK_DATA, data)
+        if res < 0:
+            raise _error(-res)
+
+    @validate(addr=int, cmd=int, vals=Block)
     def block_process_call(self, addr, cmd, vals):
         """block_process_call(addr, cmd, vals) -> results
 
-        Perform SMBus Block Process Call transaction.
+        Perform SMBus Block Process Call transaction.  vals is a list of
+        integers or a bytes-like object.
         """
         self._set_addr(addr)
-        data = ffi.new("union i2c_smbus_data *")
+        data = self._data
         list_to_smbus_data(data, vals)
-        if SMBUS.i2c_smbus_access(self._fd, SMBUS.I2C_SMBUS_WRITE,
-                                  ffi.cast("__u8", cmd),
-                                  SMBUS.I2C_SMBUS_BLOCK_PROC_CALL,
-                                  data):
-            raise IOError(ffi.errno)
+        res = self._backend.access(self._fd, SMBUS.I2C_SMBUS_WRITE, cmd,
+                                   SMBUS.I2C_SMBUS_BLOCK_PROC_CALL, data)
+        if res < 0:
+            raise _error(-res)
         return smbus_data_to_list(data)
 
     @validate(addr=int, cmd=int, len=int)
@@ -245,34 +403,339 @@ class SMBus(object):
         Perform I2C Block Read transaction.
         """
         self._set_addr(addr)
-        data = ffi.new("union i2c_smbus_data *")
+        data = self._data
         data.block[0] = len
         if len == 32:
             arg = SMBUS.I2C_SMBUS_I2C_BLOCK_BROKEN
         else:
             arg = SMBUS.I2C_SMBUS_I2C_BLOCK_DATA
-        if SMBUS.i2c_smbus_access(self._fd,
-                                  int2byte(SMBUS.I2C_SMBUS_READ),
-                                  ffi.cast("__u8", cmd),
-                                  arg, data):
-            raise IOError(ffi.errno)
+        res = self._backend.access(self._fd, SMBUS.I2C_SMBUS_READ, cmd,
+                                   arg, data)
+        if res < 0:
+            raise _error(-res)
         return smbus_data_to_list(data)
 
-    @validate(addr=int, cmd=int, vals=list)
+    @validate(addr=int, cmd=int, len=int)
+    def read_i2c_block_data_bytes(self, addr, cmd, len=32):
+        """read_i2c_block_data_bytes(addr, cmd, len=32) -> bytes
+
+        Perform I2C Block Read transaction, returning the block as bytes
+        instead of a list.
+        """
+        self._set_addr(addr)
+        data = self._data
+        data.block[0] = len
+        if len == 32:
+            arg = SMBUS.I2C_SMBUS_I2C_BLOCK_BROKEN
+        else:
+            arg = SMBUS.I2C_SMBUS_I2C_BLOCK_DATA
+        res = self._backend.access(self._fd, SMBUS.I2C_SMBUS_READ, cmd,
+                                   arg, data)
+        if res < 0:
+            raise _error(-res)
+        return smbus_data_to_bytes(data)
+
+    @validate(addr=int, cmd=int)
+    def read_i2c_block_data_into(self, addr, cmd, buf):
+        """read_i2c_block_data_into(addr, cmd, buf) -> count
+
+        Perform I2C Block Read transaction filling buf, a writable
+        bytes-like object of at most 32 bytes, without allocating a
+        result list.
+        """
+        self._set_addr(addr)
+        buf = ffi.from_buffer(buf, require_writable=True)
+        length = len(buf)
+        block_max = SMBUS.I2C_SMBUS_BLOCK_MAX
+        if length > block_max or length == 0:
+            raise OverflowError("Buffer must hold at least one, but not "
+                                "more than %d bytes" % block_max)
+        if length == 32:
+            arg = SMBUS.I2C_SMBUS_I2C_BLOCK_BROKEN
+        else:
+            arg = SMBUS.I2C_SMBUS_I2C_BLOCK_DATA
+        res = self._backend.read_block_into(self._fd, cmd, arg, buf, length)
+        if res < 0:
+            raise _error(-res)
+        return res
+
+    @validate(addr=int, cmd=int, vals=Block)
     def write_i2c_block_data(self, addr, cmd, vals):
         """write_i2c_block_data(addr, cmd, vals)
 
-        Perform I2C Block Write transaction.
+        Perform I2C Block Write transaction.  vals is a list of integers
+        or a bytes-like object.
         """
         self._set_addr(addr)
-        data = ffi.new("union i2c_smbus_data *")
+        data = self._data
         list_to_smbus_data(data, vals)
-        if SMBUS.i2c_smbus_access(self._fd,
-                                  int2byte(SMBUS.I2C_SMBUS_WRITE),
-                                  ffi.cast("__u8", cmd),
-                                  SMBUS.I2C_SMBUS_I2C_BLOCK_BROKEN,
-                                  data):
-            raise IOError(ffi.errno)
+        res = self._backend.access(self._fd, SMBUS.I2C_SMBUS_WRITE, cmd,
+                                   SMBUS.I2C_SMBUS_I2C_BLOCK_BROKEN, data)
+        if res < 0:
+            raise _error(-res)
+
+    @validate(addr=int, cmd=int, chunk=int)
+    def read_i2c_block_data_stream(self, addr, cmd, buf, chunk=32):
+        """read_i2c_block_data_stream(addr, cmd, buf, chunk=32) -> buf
+
+        Read registers cmd, cmd + 1, ... with I2C Block Read transactions
+        of at most chunk bytes each.  buf is the number of bytes to read,
+        returned in a new bytearray, or a writable bytes-like object to
+        fill.  The loop runs in C.
+        """
+        if isinstance(buf, int):
+            buf = bytearray(buf)
+        data = ffi.from_buffer(buf, require_writable=True)
+        length = len(data)
+        _check_stream(cmd, length, chunk)
+        if length:
+            self._set_addr(addr)
+            res = self._backend.read_i2c_block_stream(self._fd, cmd, data,
+                                                      length, chunk)
+            if res < 0:
+                raise _error(-res)
+        return buf
+
+    @validate(addr=int, cmd=int, vals=Block, chunk=int, tries=int)
+    def write_i2c_block_data_stream(self, addr, cmd, vals, chunk=32,
+                                    tries=100, delay=0.001):
+        """write_i2c_block_data_stream(addr, cmd, vals, chunk=32, tries=100, delay=0.001)
+
+        Write vals, a list of integers or a bytes-like object of any
+        length, to registers cmd, cmd + 1, ... with I2C Block Write
+        transactions of at most chunk bytes each.  Chunks never cross a
+        multiple of chunk, e.g. the page boundaries of an EEPROM with a
+        page size of chunk.  A chunk the slave does not acknowledge, like
+        an EEPROM busy writing the previous page, is tried up to tries
+        times delay seconds apart.  The loop runs in C.  The IOError of a
+        failed write has the number of bytes written in its written
+        attribute.
+        """
+        if isinstance(vals, list):
+            vals = bytearray(vals)
+        data = ffi.from_buffer(vals)
+        length = len(data)
+        _check_stream(cmd, length, chunk)
+        if length:
+            self._set_addr(addr)
+            written = ffi.new("int *")
+            res = self._backend.write_i2c_block_stream(self._fd, cmd, data,
+                                                       length, chunk, tries,
+                                                       int(delay * 1e6),
+                                                       written)
+            if res < 0:
+                e = _error(-res)
+                e.written = written[0]
+                raise e
+
+    @validate(addr=int, cmd=int)
+    def read_fifo_data_into(self, addr, cmd, buf):
+        """read_fifo_data_into(addr, cmd, buf) -> count
+
+        Fill buf, a writable bytes-like object of any length, from the
+        FIFO data register cmd with I2C Block Read transactions of at
+        most 32 bytes, all of them reading cmd.  The loop runs in C.
+        """
+        data = ffi.from_buffer(buf, require_writable=True)
+        length = len(data)
+        if length:
+            self._set_addr(addr)
+            res = self._backend.read_fifo(self._fd, cmd, data, length)
+            if res < 0:
+                raise _error(-res)
+        return length
+
+    @validate(addr=int, count_cmd=int, data_cmd=int, frame_size=int)
+    def read_fifo(self, addr, count_cmd, data_cmd, frame_size=1,
+                  count_size=1, count_order='little', count_frames=False,
+                  max_frames=32, nbuffers=2, dtype=None, interval=0.001):
+        """read_fifo(addr, count_cmd, data_cmd, frame_size=1, ...) -> iterator
+
+        Drain the FIFO of a device, reading its fill level from count_cmd
+        and then at most max_frames whole frames of frame_size bytes from
+        data_cmd, and yield them as memoryview chunks, or NumPy arrays
+        with dtype.  Sleeps interval seconds while no frame is available.
+        """
+        if dtype is not None:
+            import numpy
+            dtype = numpy.dtype(dtype)
+            frame_size = dtype.itemsize
+        if frame_size <= 0 or max_frames <= 0 or nbuffers <= 0:
+            raise ValueError("frame_size, max_frames and nbuffers must be "
+                             "positive")
+        size = frame_size * max_frames
+        buffers = [bytearray(size) for _ in range(nbuffers)]
+        views = [memoryview(buf) for buf in buffers]
+        count_buf = bytearray(count_size)
+        little = count_order == 'little'
+        turn = 0
+        while True:
+            if count_size == 1:
+                level = self.read_byte_data(addr, count_cmd)
+            else:
+                self.read_i2c_block_data_into(addr, count_cmd, count_buf)
+                level = 0
+                for byte in (reversed(count_buf) if little else count_buf):
+                    level = level << 8 | byte
+            frames = level if count_frames else level // frame_size
+            if frames <= 0:
+                time.sleep(interval)
+                continue
+            n = min(frames, max_frames) * frame_size
+            view = views[turn]
+            self.read_fifo_data_into(addr, data_cmd, view[:n])
+            if dtype is not None:
+                yield numpy.frombuffer(buffers[turn], dtype,
+                                       n // frame_size)
+            else:
+                yield view[:n]
+            turn = (turn + 1) % nbuffers
+
+    @validate(addr=int, cmds=list)
+    def read_registers(self, addr, cmds, word=False):
+        """read_registers(addr, cmds, word=False) -> results
+
+        Perform a SMBus Read Byte Data transaction for each register in
+        cmds, or Read Word Data if word is True.  The loop runs in C, the
+        results are returned as a bytearray or an array('H') of words.
+        """
+        self._set_addr(addr)
+        n = len(cmds)
+        if word:
+            size = SMBUS.I2C_SMBUS_WORD_DATA
+            vals = array('H', [0]) * n
+        else:
+            size = SMBUS.I2C_SMBUS_BYTE_DATA
+            vals = bytearray(n)
+        res = self._backend.read_registers(self._fd, size,
+                                           ffi.new("__u8[]", cmds),
+                                           ffi.from_buffer(vals), n)
+        if res < 0:
+            raise _error(-res)
+        return vals
+
+    @validate(addr=int, pairs=list)
+    def write_registers(self, addr, pairs, word=False):
+        """write_registers(addr, pairs, word=False)
+
+        Perform a SMBus Write Byte Data transaction, or Write Word Data if
+        word is True, for each (cmd, val) pair.  The loop runs in C.
+        """
+        self._set_addr(addr)
+        n = len(pairs)
+        if word:
+            size = SMBUS.I2C_SMBUS_WORD_DATA
+        else:
+            size = SMBUS.I2C_SMBUS_BYTE_DATA
+        res = self._backend.write_registers(
+            self._fd, size, ffi.new("__u8[]", [c for c, _ in pairs]),
+            ffi.new("__u16[]", [v for _, v in pairs]), n)
+        if res < 0:
+            raise _error(-res)
+
+    def transfer(self, messages):
+        """transfer(messages)
+
+        Perform a combined I2C_RDWR transaction.  All messages, see
+        i2c_msg.read and i2c_msg.write, are sent in one ioctl with a
+        single STOP; read messages are filled in place.
+        """
+        nmsgs = len(messages)
+        msgs_max = SMBUS.I2C_RDRW_IOCTL_MAX_MSGS
+        if nmsgs > msgs_max or nmsgs == 0:
+            raise OverflowError("Argument must be a list of at least one, "
+                                "but not more than %d messages" % msgs_max)
+        msgs = ffi.new("struct i2c_msg[]", nmsgs)
+        for i, msg in enumerate(messages):
+            msgs[i].addr = msg.addr
+            msgs[i].flags = msg.flags
+            msgs[i].len = len(msg)
+            msgs[i].buf = ffi.cast("char *", msg.buf)
+        res = self._backend.rdwr(self._fd, msgs, nmsgs)
+        if res < 0:
+            raise _error(-res)
+
+    @property
+    def funcs(self):
+        """Functionality of the adapter as a Funcs object, queried once
+        when the bus is opened"""
+        return self._funcs
+
+    @property
+    def funcs_policy(self):
+        return self._funcs_policy
+
+    @funcs_policy.setter
+    def funcs_policy(self, policy):
+        """How to handle transactions the adapter does not support.
+
+        None (the default) passes all transactions to the adapter.
+        'check' rejects unsupported transactions with IOError(EOPNOTSUPP)
+        without issuing an ioctl.  'emulate' additionally replaces them by
+        equivalent supported transactions where possible, e.g. SMBus block
+        reads by a combined I2C_RDWR transfer.  Supported transactions
+        are not affected by either policy.
+        """
+        if policy not in (None, 'check', 'emulate'):
+            raise ValueError("Unknown functionality policy %r" % (policy,))
+        self._funcs_policy = policy
+        self._update_methods()
+
+    def _funcs_replacement(self, name):
+        """Method replacing the transaction name according to the
+        functionality policy, None if the transaction is supported"""
+        funcs = self._funcs
+        policy = self._funcs_policy
+        if policy is None or funcs is None:
+            return None
+        flag = REQUIRED_FUNCS.get(name)
+        if flag is None or flag in funcs:
+            return None
+        if name.endswith('_status'):
+            base = name[:-len('_status')]
+            if policy == 'emulate':
+                for needed, emulation in EMULATIONS.get(base, ()):
+                    if needed in funcs:
+                        return _status_of(base, MethodType(emulation, self))
+        elif policy == 'emulate':
+            for needed, emulation in EMULATIONS.get(name, ()):
+                if needed in funcs:
+                    return MethodType(emulation, self)
+        return _unsupported(name)
+
+    def add_layer(self, layer):
+        """add_layer(layer)
+
+        Wrap the transaction methods of this object with layer, an object
+        with a method wrap(bus, name, method) returning the callable to
+        use for the transaction name in place of method, or method itself
+        to leave it alone.  Layers added later wrap the earlier ones.
+        Objects without layers call the transaction methods directly.
+        """
+        self._layers = self._layers + (layer,)
+        self._update_methods()
+
+    def remove_layer(self, layer):
+        """remove_layer(layer)
+
+        Remove a layer added with add_layer.
+        """
+        self._layers = tuple(l for l in self._layers if l is not layer)
+        self._update_methods()
+
+    def _update_methods(self):
+        """Install the functionality policy replacements and the layers
+        as instance attributes shadowing the transaction methods"""
+        for name in TRANSACTIONS:
+            self.__dict__.pop(name, None)
+            original = method = getattr(self, name)
+            replacement = self._funcs_replacement(name)
+            if replacement is not None:
+                method = replacement
+            for layer in self._layers:
+                method = layer.wrap(self, name, method)
+            if method is not original:
+                setattr(self, name, method)
 
     @property
     def pec(self):
@@ -283,21 +746,516 @@ class SMBus(object):
         """True if Packet Error Codes (PEC) are enabled"""
         pec = bool(value)
         if pec != self._pec:
-            if ioctl(self._fd, SMBUS.I2C_PEC, pec):
-                raise IOError(ffi.errno)
+            res = self._backend.ioctl(self._fd, SMBUS.I2C_PEC, pec)
+            if res < 0:
+                raise _error(-res)
             self._pec = pec
 
+    @property
+    def timeout(self):
+        return self._timeout
+
+    @timeout.setter
+    def timeout(self, value):
+        """Timeout of the adapter in seconds, rounded up to the 10 ms units
+        of I2C_TIMEOUT, None if not set through this object.  The
+        timeout applies to all users of the adapter and outlasts close().
+        The ioctl is only issued when the value changes.
+        """
+        units = _timeout_units(value)
+        if units / 100.0 != self._timeout:
+            res = self._backend.ioctl(self._fd, SMBUS.I2C_TIMEOUT, units)
+            if res < 0:
+                raise _error(-res)
+            self._timeout = units / 100.0
+
+    @property
+    def retries(self):
+        return self._retries
+
+    @retries.setter
+    def retries(self, value):
+        """Number of times the adapter retries a transfer that lost
+        arbitration, None if not set through this object.  Like timeout,
+        it applies to all users of the adapter and the I2C_RETRIES ioctl is
+        only issued when the value changes.
+        """
+        retries = int(value)
+        if retries < 0:
+            raise ValueError("Retries must not be negative")
+        if retries != self._retries:
+            res = self._backend.ioctl(self._fd, SMBUS.I2C_RETRIES, retries)
+            if res < 0:
+                raise _error(-res)
+            self._retries = retries
+
+
+_STATUS_DOC = """%(name)s_status(%(params)s, tries=1, delay=0.0) -> (%(result)s, errno)
+
+        Perform SMBus %(title)s transaction like %(name)s, returning
+        (%(result)s, 0) on success and (None, errno) instead of raising
+        IOError.  A slave that does not acknowledge is tried up to tries
+        times, delay seconds apart, in C.
+        """
+
+
+def _xfer_status(bus, addr, read_write, cmd, size, data, tries, delay):
+    """Perform a transaction with xfer_retry, (result, errno)"""
+    res = bus._backend.xfer_retry(bus._fd, bus._addr, addr,
+                                  getattr(SMBUS, read_write), cmd,
+                                  getattr(SMBUS, size), data, tries,
+                                  int(delay * 1e6), ffi.NULL)
+    if res < 0:
+        bus._addr = -1
+        return None, -res
+    bus._addr = addr
+    return (res if read_write == 'I2C_SMBUS_READ' else None), 0
+
+
+def _status_method(status, name, params, read_write, size):
+    """Name, document and validate status, the _status variant of the
+    transaction name"""
+    status.__name__ = name + '_status'
+    if hasattr(status, '__qualname__'):
+        status.__qualname__ = 'SMBus.' + status.__name__
+    status.__doc__ = _STATUS_DOC % {
+        'name': name, 'params': ', '.join(params),
+        'result': 'result' if read_write == 'I2C_SMBUS_READ' else 'None',
+        'title': 'Quick' if size == 'I2C_SMBUS_QUICK' else
+                 name.replace('_', ' ').title(),
+    }
+    schema = dict((param, int) for param in params + ('tries',))
+    return validate(**schema)(status)
+
+
+def _status_addr(name, read_write, size):
+    def status(self, addr, tries=1, delay=0.0):
+        return _xfer_status(self, addr, read_write, 0, size, 0, tries, delay)
+    return _status_method(status, name, ('addr',), read_write, size)
+
+
+def _status_addr_val(name, read_write, size):
+    # Write Byte sends its value in the command field
+    def status(self, addr, val, tries=1, delay=0.0):
+        return _xfer_status(self, addr, read_write, val, size, 0, tries,
+                            delay)
+    return _status_method(status, name, ('addr', 'val'), read_write, size)
+
+
+def _status_addr_cmd(name, read_write, size):
+    def status(self, addr, cmd, tries=1, delay=0.0):
+        return _xfer_status(self, addr, read_write, cmd, size, 0, tries,
+                            delay)
+    return _status_method(status, name, ('addr', 'cmd'), read_write, size)
+
+
+def _status_addr_cmd_val(name, read_write, size):
+    def status(self, addr, cmd, val, tries=1, delay=0.0):
+        return _xfer_status(self, addr, read_write, cmd, size, val, tries,
+                            delay)
+    return _status_method(status, name, ('addr', 'cmd', 'val'), read_write,
+                          size)
+
+
+SMBus.write_quick_status = _status_addr(
+    'write_quick', 'I2C_SMBUS_WRITE', 'I2C_SMBUS_QUICK')
+SMBus.read_byte_status = _status_addr(
+    'read_byte', 'I2C_SMBUS_READ', 'I2C_SMBUS_BYTE')
+SMBus.write_byte_status = _status_addr_val(
+    'write_byte', 'I2C_SMBUS_WRITE', 'I2C_SMBUS_BYTE')
+SMBus.read_byte_data_status = _status_addr_cmd(
+    'read_byte_data', 'I2C_SMBUS_READ', 'I2C_SMBUS_BYTE_DATA')
+SMBus.write_byte_data_status = _status_addr_cmd_val(
+    'write_byte_data', 'I2C_SMBUS_WRITE', 'I2C_SMBUS_BYTE_DATA')
+SMBus.read_word_data_status = _status_addr_cmd(
+    'read_word_data', 'I2C_SMBUS_READ', 'I2C_SMBUS_WORD_DATA')
+SMBus.write_word_data_status = _status_addr_cmd_val(
+    'write_word_data', 'I2C_SMBUS_WRITE', 'I2C_SMBUS_WORD_DATA')
+
+
+class Funcs(object):
+    """Funcs(mask)
+
+    Functionality mask of an adapter as reported by the I2C_FUNCS ioctl.
+    Flags can be tested by name, e.g. funcs.smbus_read_block_data, or as
+    'I2C_FUNC_SMBUS_PEC' in funcs.
+    """
+
+    __slots__ = ('mask',)
+
+    def __init__(self, mask):
+        self.mask = mask
+
+    def __contains__(self, flag):
+        if not isinstance(flag, int):
+            flag = getattr(SMBUS, flag)
+        return self.mask & flag == flag
+
+    def __getattr__(self, name):
+        try:
+            return 'I2C_FUNC_' + name.upper() in self
+        except AttributeError:
+            raise AttributeError(name)
+
+    def __int__(self):
+        return self.mask
+
+    def __eq__(self, other):
+        return isinstance(other, Funcs) and self.mask == other.mask
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.mask)
+
+    def __repr__(self):
+        return "Funcs(0x%08x)" % (self.mask,)
+
+
+def _timeout_units(timeout):
+    """timeout in seconds as the 10 ms units of I2C_TIMEOUT, rounded up"""
+    units = int(math.ceil(timeout * 100 - 1e-9))
+    if units <= 0:
+        raise ValueError("Timeout must be at least 10 ms")
+    return units
+
+
+def _check_stream(cmd, length, chunk):
+    block_max = SMBUS.I2C_SMBUS_BLOCK_MAX
+    if chunk > block_max or chunk <= 0:
+        raise OverflowError("Chunk size must be at least one, but not "
+                            "more than %d bytes" % block_max)
+    if cmd < 0 or cmd + length > 256:
+        raise OverflowError("Registers %d to %d are out of range"
+                            % (cmd, cmd + length - 1))
+
+
+# functionality flag needed by each SMBus method
+REQUIRED_FUNCS = {
+    'write_quick': 'I2C_FUNC_SMBUS_QUICK',
+    'read_byte': 'I2C_FUNC_SMBUS_READ_BYTE',
+    'write_byte': 'I2C_FUNC_SMBUS_WRITE_BYTE',
+    'read_byte_data': 'I2C_FUNC_SMBUS_READ_BYTE_DATA',
+    'write_byte_data': 'I2C_FUNC_SMBUS_WRITE_BYTE_DATA',
+    'read_word_data': 'I2C_FUNC_SMBUS_READ_WORD_DATA',
+    'write_word_data': 'I2C_FUNC_SMBUS_WRITE_WORD_DATA',
+    'process_call': 'I2C_FUNC_SMBUS_PROC_CALL',
+    'read_block_data': 'I2C_FUNC_SMBUS_READ_BLOCK_DATA',
+    'read_block_data_bytes': 'I2C_FUNC_SMBUS_READ_BLOCK_DATA',
+    'read_block_data_into': 'I2C_FUNC_SMBUS_READ_BLOCK_DATA',
+    'write_block_data': 'I2C_FUNC_SMBUS_WRITE_BLOCK_DATA',
+    'block_process_call': 'I2C_FUNC_SMBUS_BLOCK_PROC_CALL',
+    'read_i2c_block_data': 'I2C_FUNC_SMBUS_READ_I2C_BLOCK',
+    'read_i2c_block_data_bytes': 'I2C_FUNC_SMBUS_READ_I2C_BLOCK',
+    'read_i2c_block_data_into': 'I2C_FUNC_SMBUS_READ_I2C_BLOCK',
+    'write_i2c_block_data': 'I2C_FUNC_SMBUS_WRITE_I2C_BLOCK',
+    'read_i2c_block_data_stream': 'I2C_FUNC_SMBUS_READ_I2C_BLOCK',
+    'write_i2c_block_data_stream': 'I2C_FUNC_SMBUS_WRITE_I2C_BLOCK',
+    'read_fifo_data_into': 'I2C_FUNC_SMBUS_READ_I2C_BLOCK',
+    'transfer': 'I2C_FUNC_I2C',
+}
+for _name in list(REQUIRED_FUNCS):
+    if _name + '_status' in TRANSACTIONS:
+        REQUIRED_FUNCS[_name + '_status'] = REQUIRED_FUNCS[_name]
+REQUIRED_FUNCS['wait_ack'] = 'I2C_FUNC_SMBUS_QUICK'
+del _name
+
+
+def _unsupported(name):
+    def unsupported(*args, **kwargs):
+        raise _error(errno.EOPNOTSUPP)
+    if name.endswith('_status'):
+        def unsupported(*args, **kwargs):
+            return None, errno.EOPNOTSUPP
+    unsupported.__name__ = name
+    return unsupported
+
+
+def _status_of(name, method):
+    """Exception-free version of method, the replacement of the
+    transaction name, for the transaction name + '_status'"""
+    nargs = getattr(SMBus, name).__code__.co_argcount - 1
+
+    def status(*args, **kwargs):
+        tries = kwargs.pop('tries', args[nargs] if len(args) > nargs else 1)
+        delay = kwargs.pop('delay',
+                           args[nargs + 1] if len(args) > nargs + 1 else 0.0)
+        args = args[:nargs]
+        err = errno.EINVAL
+        for attempt in range(tries):
+            if attempt and delay:
+                time.sleep(delay)
+            try:
+                return method(*args, **kwargs), 0
+            except EnvironmentError as e:
+                err = _errno(e)
+                if err not in _NAK:
+                    break
+        return None, err
+    status.__name__ = name + '_status'
+    return status
+
+
+def _read_rdwr(bus, addr, cmd, length):
+    read = i2c_msg.read(addr, length)
+    bus.transfer([i2c_msg.write(addr, [cmd]), read])
+    return read.tolist()
+
+
+def _counted_block(block):
+    count = block[0]
+    if count > len(block) - 1 or count == 0:
+        raise _error(errno.EPROTO)
+    return block[1:count + 1]
+
+
+def _emulate_read_byte(self, addr):
+    read = i2c_msg.read(addr, 1)
+    self.transfer([read])
+    return read.tolist()[0]
+
+
+def _emulate_write_byte(self, addr, val):
+    self.transfer([i2c_msg.write(addr, [val & 0xFF])])
+
+
+def _emulate_read_byte_data(self, addr, cmd):
+    return _read_rdwr(self, addr, cmd, 1)[0]
+
+
+def _emulate_write_byte_data(self, addr, cmd, val):
+    self.transfer([i2c_msg.write(addr, [cmd & 0xFF, val & 0xFF])])
+
+
+def _emulate_read_word_data(self, addr, cmd):
+    lo, hi = _read_rdwr(self, addr, cmd, 2)
+    return hi << 8 | lo
+
+
+def _emulate_write_word_data(self, addr, cmd, val):
+    self.transfer([i2c_msg.write(addr, [cmd & 0xFF, val & 0xFF,
+                                        val >> 8 & 0xFF])])
+
+
+def _emulate_read_block_data(self, addr, cmd):
+    return _counted_block(_read_rdwr(self, addr, cmd,
+                                     SMBUS.I2C_SMBUS_BLOCK_MAX + 1))
+
+
+def _emulate_read_block_data_i2c(self, addr, cmd):
+    return _counted_block(self.read_i2c_block_data(addr, cmd, 32))
+
+
+def _emulate_read_block_data_bytes(self, addr, cmd):
+    return bytes(bytearray(self.read_block_data(addr, cmd)))
+
+
+def _emulate_read_block_data_into(self, addr, cmd, buf):
+    block = self.read_block_data(addr, cmd)
+    buf = ffi.from_buffer(buf, require_writable=True)
+    if len(block) > len(buf):
+        raise OverflowError("Block of %d bytes does not fit into a "
+                            "buffer of %d bytes" % (len(block), len(buf)))
+    buf[0:len(block)] = bytes(bytearray(block))
+    return len(block)
+
+
+def _emulate_write_block_data(self, addr, cmd, vals):
+    vals = bytearray(vals)
+    self.transfer([i2c_msg.write(addr, bytearray([cmd, len(vals)]) + vals)])
+
+
+def _emulate_write_block_data_i2c(self, addr, cmd, vals):
+    vals = bytearray(vals)
+    self.write_i2c_block_data(addr, cmd, bytearray([len(vals)]) + vals)
+
+
+def _emulate_read_i2c_block_data(self, addr, cmd, len=32):
+    return _read_rdwr(self, addr, cmd, len)
+
+
+def _emulate_read_i2c_block_data_bytes(self, addr, cmd, len=32):
+    return bytes(bytearray(_read_rdwr(self, addr, cmd, len)))
+
+
+def _emulate_read_i2c_block_data_into(self, addr, cmd, buf):
+    buf = ffi.from_buffer(buf, require_writable=True)
+    block = _read_rdwr(self, addr, cmd, len(buf))
+    buf[0:len(block)] = bytes(bytearray(block))
+    return len(block)
+
+
+def _emulate_write_i2c_block_data(self, addr, cmd, vals):
+    self.transfer([i2c_msg.write(addr, bytearray([cmd]) + bytearray(vals))])
+
+
+def _emulate_read_i2c_block_data_stream(self, addr, cmd, buf, chunk=32):
+    if isinstance(buf, int):
+        buf = bytearray(buf)
+    length = memoryview(buf).nbytes
+    _check_stream(cmd, length, chunk)
+    if length:
+        read = i2c_msg.read(addr, length)
+        self.transfer([i2c_msg.write(addr, [cmd]), read])
+        ffi.memmove(ffi.from_buffer(buf, require_writable=True), read.buf,
+                    length)
+    return buf
+
+
+def _emulate_write_i2c_block_data_stream(self, addr, cmd, vals, chunk=32,
+                                         tries=100, delay=0.001):
+    vals = bytearray(vals)
+    off = 0
+    _check_stream(cmd, len(vals), chunk)
+    while off < len(vals):
+        n = min(chunk - (cmd + off) % chunk, len(vals) - off)
+        write = i2c_msg.write(addr, bytearray([cmd + off]) +
+                              vals[off:off + n])
+        err = errno.EINVAL
+        for attempt in range(tries):
+            if attempt and delay:
+                time.sleep(delay)
+            try:
+                self.transfer([write])
+                err = 0
+                break
+            except EnvironmentError as e:
+                err = _errno(e)
+                if err not in _NAK:
+                    break
+        if err:
+            e = _error(err)
+            e.written = off
+            raise e
+        off += n
+
+
+def _emulate_read_fifo_data_into(self, addr, cmd, buf):
+    buf = ffi.from_buffer(buf, require_writable=True)
+    length = len(buf)
+    if length:
+        read = i2c_msg.read(addr, length)
+        self.transfer([i2c_msg.write(addr, [cmd]), read])
+        ffi.memmove(buf, read.buf, length)
+    return length
+
+
+# emulations of SMBus methods by (functionality flag, function) in order
+# of preference
+EMULATIONS = {
+    'read_byte': [('I2C_FUNC_I2C', _emulate_read_byte)],
+    'write_byte': [('I2C_FUNC_I2C', _emulate_write_byte)],
+    'read_byte_data': [('I2C_FUNC_I2C', _emulate_read_byte_data)],
+    'write_byte_data': [('I2C_FUNC_I2C', _emulate_write_byte_data)],
+    'read_word_data': [('I2C_FUNC_I2C', _emulate_read_word_data)],
+    'write_word_data': [('I2C_FUNC_I2C', _emulate_write_word_data)],
+    'read_block_data': [
+        ('I2C_FUNC_I2C', _emulate_read_block_data),
+        ('I2C_FUNC_SMBUS_READ_I2C_BLOCK', _emulate_read_block_data_i2c)],
+    'read_block_data_bytes': [
+        ('I2C_FUNC_I2C', _emulate_read_block_data_bytes),
+        ('I2C_FUNC_SMBUS_READ_I2C_BLOCK', _emulate_read_block_data_bytes)],
+    'read_block_data_into': [
+        ('I2C_FUNC_I2C', _emulate_read_block_data_into),
+        ('I2C_FUNC_SMBUS_READ_I2C_BLOCK', _emulate_read_block_data_into)],
+    'write_block_data': [
+        ('I2C_FUNC_I2C', _emulate_write_block_data),
+        ('I2C_FUNC_SMBUS_WRITE_I2C_BLOCK', _emulate_write_block_data_i2c)],
+    'read_i2c_block_data': [('I2C_FUNC_I2C', _emulate_read_i2c_block_data)],
+    'read_i2c_block_data_bytes': [
+        ('I2C_FUNC_I2C', _emulate_read_i2c_block_data_bytes)],
+    'read_i2c_block_data_into': [
+        ('I2C_FUNC_I2C', _emulate_read_i2c_block_data_into)],
+    'write_i2c_block_data': [('I2C_FUNC_I2C', _emulate_write_i2c_block_data)],
+    'read_i2c_block_data_stream': [
+        ('I2C_FUNC_I2C', _emulate_read_i2c_block_data_stream)],
+    'write_i2c_block_data_stream': [
+        ('I2C_FUNC_I2C', _emulate_write_i2c_block_data_stream)],
+    'read_fifo_data_into': [('I2C_FUNC_I2C', _emulate_read_fifo_data_into)],
+}
+
+
+class i2c_msg(object):
+    """i2c_msg(addr, flags, buf)
+
+    A single message of a combined I2C_RDWR transaction, usually created
+    with i2c_msg.read or i2c_msg.write and passed to SMBus.transfer.
+    """
+
+    __slots__ = ('addr', 'flags', 'buf')
+
+    def __init__(self, addr, flags, buf):
+        self.addr = addr
+        self.flags = flags
+        self.buf = buf
+
+    @classmethod
+    def read(cls, addr, length):
+        """read(addr, length) -> i2c_msg
+
+        Message reading length bytes from the device at addr.
+        """
+        return cls(addr, SMBUS.I2C_M_RD, ffi.new("__u8[]", length))
+
+    @classmethod
+    def write(cls, addr, vals):
+        """write(addr, vals) -> i2c_msg
+
+        Message writing vals, a list of integers or a bytes-like object,
+        to the device at addr.
+        """
+        if isinstance(vals, list):
+            buf = ffi.new("__u8[]", vals)
+        else:
+            vals = memoryview(vals)
+            buf = ffi.new("__u8[]", vals.nbytes)
+            ffi.memmove(buf, vals, vals.nbytes)
+        return cls(addr, 0, buf)
+
+    def __len__(self):
+        return len(self.buf)
+
+    def __iter__(self):
+        return iter(self.tolist())
+
+    def tolist(self):
+        return ffi.unpack(self.buf, len(self.buf))
+
+    def tobytes(self):
+        return ffi.buffer(self.buf)[:]
+
+    __bytes__ = tobytes
+
+    def __repr__(self):
+        return "i2c_msg(addr=0x%02x, flags=0x%04x, len=%d)" % (
+            self.addr, self.flags, len(self))
+
 
 def smbus_data_to_list(data):
-    block = data.block
-    return [block[i + 1] for i in range(block[0])]
+    return ffi.unpack(data.block + 1, data.block[0])
+
+
+def smbus_data_to_bytes(data):
+    """The block of the i2c_smbus_data union data as bytes"""
+    return ffi.buffer(data.block + 1, data.block[0])[:]
 
 
 def list_to_smbus_data(data, vals):
+    """Store vals, a list of integers or a bytes-like object, as the block
+    of the i2c_smbus_data union data."""
     block_max = SMBUS.I2C_SMBUS_BLOCK_MAX
-    if len(vals) > block_max or len(vals) == 0:
-        raise OverflowError("Third argument must be a list of at least one, "
-                            "but not more than %d integers" % block_max)
-    data.block[0] = len(vals)
-    for i, val in enumerate(vals):
-        data.block[i + 1] = val
+    if isinstance(vals, list):
+        length = len(vals)
+    else:
+        vals = memoryview(vals)
+        length = vals.nbytes
+    if length > block_max or length == 0:
+        raise OverflowError("Third argument must be a list or bytes-like "
+                            "object of at least one, but not more than %d "
+                            "bytes" % block_max)
+    data.block[0] = length
+    if isinstance(vals, list):
+        data.block[1:length + 1] = vals
+    else:
+        ffi.memmove(data.block + 1, vals, length)
@@ -0,0 +1,157 @@
+"""Thread-safe SMBus objects.
+
+A plain SMBus caches the selected slave address, so two threads using
+the same object can switch the address between each other's I2C_SLAVE
+ioctl and transaction.  ThreadSafeSMBus holds a per-bus lock for the
+whole transaction, and shared_bus hands out one such object per bus
+number to all threads of the process."""
+
+import threading
+
+from .smbus import SMBus
+from .smbus import TRANSACTIONS
+
+_bus_locks = {}
+_shared = {}
+_registry_lock = threading.RLock()
+
+
+def bus_lock(bus):
+    """bus_lock(bus) -> lock
+
+    Return the process wide lock serializing transactions on bus.
+    """
+    with _registry_lock:
+        lock = _bus_locks.get(bus)
+        if lock is None:
+            lock = _bus_locks[bus] = threading.RLock()
+        return lock
+
+
+def _locked(name):
+    method = getattr(SMBus, name)
+
+    def locked(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    locked.__name__ = name
+    locked.__doc__ = method.__doc__
+    return locked
+
+
+class ThreadSafeSMBus(SMBus):
+    """ThreadSafeSMBus([bus[, lock[, backend]]]) -> ThreadSafeSMBus
+
+    SMBus object whose transactions, including selecting the slave
+    address, are serialized by lock.  By default the lock is shared by
+    all ThreadSafeSMBus objects connected to the same bus number.  lock
+    must be reentrant, layers like DeviceLimits hold it around the
+    locked transaction.
+    """
+
+    _lock = None
+    _own_lock = False
+
+    def __init__(self, bus=-1, lock=None, backend=None):
+        if lock is not None:
+            self._lock = lock
+            self._own_lock = True
+        else:
+            self._lock = threading.RLock()
+        SMBus.__init__(self, bus, backend)
+
+    def open(self, bus):
+        if not self._own_lock:
+            self._lock = bus_lock(int(bus))
+        with self._lock:
+            SMBus.open(self, bus)
+
+    open.__doc__ = SMBus.open.__doc__
+
+    def close(self):
+        with self._lock:
+            SMBus.close(self)
+
+    close.__doc__ = SMBus.close.__doc__
+
+    @property
+    def pec(self):
+        return self._pec
+
+    @pec.setter
+    def pec(self, value):
+        """True if Packet Error Codes (PEC) are enabled"""
+        with self._lock:
+            SMBus.pec.fset(self, value)
+
+    @property
+    def timeout(self):
+        return self._timeout
+
+    @timeout.setter
+    def timeout(self, value):
+        """Timeout of the adapter in seconds"""
+        with self._lock:
+            SMBus.timeout.fset(self, value)
+
+    @property
+    def retries(self):
+        return self._retries
+
+    @retries.setter
+    def retries(self, value):
+        """Number of retries of the adapter after lost arbitration"""
+        with self._lock:
+            SMBus.retries.fset(self, value)
+
+
+for _name in TRANSACTIONS:
+    setattr(ThreadSafeSMBus, _name, _locked(_name))
+del _name
+
+
+class _SharedSMBus(ThreadSafeSMBus):
+    """ThreadSafeSMBus handed out by shared_bus, closing it releases one
+    reference.  Once the last reference is released close does nothing."""
+
+    _refs = 0
+
+    def close(self):
+        with _registry_lock:
+            if self._refs:
+                release_shared_bus(self._bus)
+
+
+def shared_bus(bus):
+    """shared_bus(bus) -> ThreadSafeSMBus
+
+    Return the process wide ThreadSafeSMBus connected to bus, opening it
+    on first use.  Every call must be paired with a call to close() on
+    the returned object (or release_shared_bus(bus)), the file
+    descriptor is closed when the last reference is released.
+    """
+    bus = int(bus)
+    with _registry_lock:
+        handle = _shared.get(bus)
+        if handle is None:
+            handle = _SharedSMBus()
+            ThreadSafeSMBus.open(handle, bus)
+            _shared[bus] = handle
+        handle._refs += 1
+        return handle
+
+
+def release_shared_bus(bus):
+    """release_shared_bus(bus)
+
+    Release a reference obtained with shared_bus(bus).
+    """
+    bus = int(bus)
+    with _registry_lock:
+        handle = _shared.get(bus)
+        if handle is None:
+            raise ValueError("No shared reference to bus %d" % (bus,))
+        handle._refs -= 1
+        if handle._refs == 0:
+            del _shared[bus]
+            ThreadSafeSMBus.close(handle)
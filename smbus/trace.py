@@ -0,0 +1,317 @@
+"""Recording and replaying SMBus transactions.
+
+TraceRecorder is an SMBus layer (see SMBus.add_layer) capturing every
+transaction with its arguments, result, errno, start time and duration
+in a compact binary format, either streamed to a file or kept in a ring
+buffer of the most recent transactions for always-on capture:
+
+    >>> recorder = TraceRecorder(ring=10000)
+    >>> bus.add_layer(recorder)
+    ...
+    >>> recorder.dump('incident.smbt')
+
+replay() runs a trace against another SMBus object, typically one
+connected to a smbus.sim.SimulatedBus, at the original pace, scaled, or
+as fast as possible, and reports the transactions whose outcome
+differs.
+
+File format: the header is b'SMBT', a version byte and the start time
+as a little endian double (time.time()).  Each record is the offset of
+the transaction start from the start time (double), its duration
+(float), the errno (short, 0 on success) and the name of the
+transaction (length byte and ASCII), followed by the encoded arguments
+and the result.  Values are encoded as a tag byte and a payload.
+Transactions whose values cannot be encoded are counted in
+TraceRecorder.dropped instead of being recorded."""
+
+import collections
+import struct
+import time
+import timeit
+from array import array
+
+from .metrics import _positional
+from .smbus import _errno
+from .smbus import i2c_msg
+
+MAGIC = b'SMBT'
+VERSION = 2
+
+_HEADER = struct.Struct('<4sBd')
+_RECORD = struct.Struct('<dfhB')
+_INT = struct.Struct('<q')
+_FLOAT = struct.Struct('<d')
+_LEN = struct.Struct('<H')
+_MSG = struct.Struct('<HHH')
+_PAIR = struct.Struct('<BH')
+
+_clock = timeit.default_timer
+
+TraceRecord = collections.namedtuple(
+    'TraceRecord', 'time duration transaction args result errno')
+
+# arguments only recorded by their size
+_BUFFER_ARGS = {'read_block_data_into': 2, 'read_i2c_block_data_into': 2,
+                'read_fifo_data_into': 2}
+
+
+def _encode(value, out):
+    if value is None:
+        out += b'N'
+    elif isinstance(value, int):
+        out += b'i'
+        out += _INT.pack(value)
+    elif isinstance(value, float):
+        out += b'd'
+        out += _FLOAT.pack(value)
+    elif isinstance(value, array):
+        data = value.tobytes()
+        out += b'w'
+        out += _LEN.pack(len(value))
+        out += data
+    elif isinstance(value, (list, tuple)):
+        if value and isinstance(value[0], i2c_msg):
+            out += b'm'
+            out += _LEN.pack(len(value))
+            for msg in value:
+                out += _MSG.pack(msg.addr, msg.flags, len(msg))
+                out += msg.tobytes()
+        elif value and isinstance(value[0], tuple):
+            out += b'p'
+            out += _LEN.pack(len(value))
+            for cmd, val in value:
+                out += _PAIR.pack(cmd, val)
+        else:
+            out += b'l'
+            out += _LEN.pack(len(value))
+            out += bytearray(value)
+    else:
+        data = memoryview(value).tobytes()
+        out += b'b'
+        out += _LEN.pack(len(data))
+        out += data
+
+
+def _decode(data, pos):
+    """Decode the value at data[pos:], returns (value, new position)"""
+    tag = data[pos:pos + 1]
+    pos += 1
+    if tag == b'N':
+        return None, pos
+    if tag == b'i':
+        return _INT.unpack_from(data, pos)[0], pos + _INT.size
+    if tag == b'd':
+        return _FLOAT.unpack_from(data, pos)[0], pos + _FLOAT.size
+    if tag == b'z':
+        n = _LEN.unpack_from(data, pos)[0]
+        return bytearray(n), pos + _LEN.size
+    n = _LEN.unpack_from(data, pos)[0]
+    pos += _LEN.size
+    if tag == b'l':
+        return list(bytearray(data[pos:pos + n])), pos + n
+    if tag == b'b':
+        return bytearray(data[pos:pos + n]), pos + n
+    if tag == b'w':
+        return array('H', bytes(data[pos:pos + 2 * n])), pos + 2 * n
+    if tag == b'p':
+        pairs = [_PAIR.unpack_from(data, pos + i * _PAIR.size)
+                 for i in range(n)]
+        return pairs, pos + n * _PAIR.size
+    if tag == b'm':
+        msgs = []
+        for i in range(n):
+            addr, flags, length = _MSG.unpack_from(data, pos)
+            pos += _MSG.size
+            msgs.append(i2c_msg.write(addr, data[pos:pos + length]))
+            msgs[-1].flags = flags
+            pos += length
+        return msgs, pos
+    raise ValueError("Corrupt trace, unknown tag %r" % (tag,))
+
+
+def _encode_record(start, duration, name, args, result, err):
+    out = bytearray(_RECORD.pack(start, duration, err, len(name)))
+    out += name.encode('ascii')
+    out += struct.pack('B', len(args))
+    buffer_arg = _BUFFER_ARGS.get(name)
+    for i, arg in enumerate(args):
+        if i == buffer_arg:
+            out += b'z'
+            out += _LEN.pack(memoryview(arg).nbytes)
+        else:
+            _encode(arg, out)
+    _encode(result, out)
+    return bytes(out)
+
+
+def _decode_record(data, pos):
+    start, duration, err, length = _RECORD.unpack_from(data, pos)
+    pos += _RECORD.size
+    name = bytes(data[pos:pos + length]).decode('ascii')
+    pos += length
+    nargs = bytearray(data[pos:pos + 1])[0]
+    pos += 1
+    args = []
+    for i in range(nargs):
+        arg, pos = _decode(data, pos)
+        args.append(arg)
+    result, pos = _decode(data, pos)
+    return TraceRecord(start, duration, name, tuple(args),
+                       result, err), pos
+
+
+class TraceRecorder(object):
+    """TraceRecorder([path[, ring]]) -> TraceRecorder
+
+    SMBus layer recording all transactions.  With path the records are
+    appended to that file, with ring only the last ring records are kept
+    in memory (see dump), otherwise all records are kept in memory.
+    """
+
+    def __init__(self, path=None, ring=None):
+        self.start_time = time.time()
+        self._start = _clock()
+        self._file = None
+        self._records = collections.deque(maxlen=ring)
+        # transactions whose arguments or result could not be encoded
+        self.dropped = 0
+        if path is not None:
+            self._file = open(path, 'wb')
+            self._file.write(self._header())
+
+    def _header(self):
+        return _HEADER.pack(MAGIC, VERSION, self.start_time)
+
+    def wrap(self, bus, name, method):
+        start_clock = self._start
+        record = self._record
+        status = name.endswith('_status')
+
+        def recorded(*args, **kwargs):
+            start = _clock()
+            try:
+                result = method(*args, **kwargs)
+            except EnvironmentError as e:
+                record(start - start_clock, _clock() - start, name, args,
+                       kwargs, None, _errno(e))
+                raise
+            if status:
+                # exception-free transactions return (result, errno)
+                record(start - start_clock, _clock() - start, name, args,
+                       kwargs, result[0], result[1])
+            else:
+                record(start - start_clock, _clock() - start, name, args,
+                       kwargs, result, 0)
+            return result
+        recorded.__name__ = name
+        recorded.__doc__ = method.__doc__
+        return recorded
+
+    def _record(self, start, duration, name, args, kwargs, result, err):
+        """Append the record of a transaction that has been performed,
+        values that cannot be encoded never affect the transaction"""
+        try:
+            if kwargs:
+                args = _positional(name, args, kwargs)
+            data = _encode_record(start, duration, name, args, result, err)
+        except (TypeError, ValueError, OverflowError, struct.error):
+            self.dropped += 1
+            return
+        self._append(data)
+
+    def _append(self, record):
+        if self._file is not None:
+            self._file.write(record)
+        else:
+            self._records.append(record)
+
+    def records(self):
+        """records() -> iterator of TraceRecord
+
+        The records kept in memory.
+        """
+        for data in list(self._records):
+            yield _decode_record(data, 0)[0]
+
+    def dump(self, path):
+        """dump(path)
+
+        Write the records kept in memory to a trace file.
+        """
+        with open(path, 'wb') as f:
+            f.write(self._header())
+            for data in list(self._records):
+                f.write(data)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def read_trace(path):
+    """read_trace(path) -> (start time, list of TraceRecord)"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic, version, start_time = _HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError("%s is not a smbus trace file" % (path,))
+    if version != VERSION:
+        raise ValueError("%s has unsupported trace version %d"
+                         % (path, version))
+    pos = _HEADER.size
+    records = []
+    while pos < len(data):
+        record, pos = _decode_record(data, pos)
+        records.append(record)
+    return start_time, records
+
+
+def replay(records, bus, speed=1.0):
+    """replay(records, bus[, speed]) -> dict
+
+    Perform the transactions of records, a list of TraceRecord or the
+    path of a trace file, on bus.  With speed the original timing is
+    reproduced, scaled by speed (2.0 replays twice as fast); with speed
+    None the transactions run back to back.  Returns a summary with the
+    number of transactions, the elapsed time and a list of mismatches,
+    (index, record, result, errno) for each transaction whose result or
+    errno differs from the recorded one.
+    """
+    if not isinstance(records, list):
+        records = read_trace(records)[1]
+    mismatches = []
+    start = _clock()
+    for index, record in enumerate(records):
+        if speed:
+            delay = record.time / speed - (_clock() - start)
+            if delay > 0:
+                time.sleep(delay)
+        args = record.args
+        if record.transaction == 'transfer':
+            args = ([_replay_msg(msg) for msg in args[0]],) + args[1:]
+            expected = [msg.tobytes() for msg in record.args[0]]
+        else:
+            expected = record.result
+        result = None
+        err = 0
+        try:
+            result = getattr(bus, record.transaction)(*args)
+        except EnvironmentError as e:
+            err = _errno(e)
+        if record.transaction.endswith('_status'):
+            result, err = result
+        if err == 0 and record.transaction == 'transfer':
+            result = [msg.tobytes() for msg in args[0]]
+        if err != record.errno or (err == 0 and result != expected):
+            mismatches.append((index, record, result, err))
+    return {'transactions': len(records), 'elapsed': _clock() - start,
+            'mismatches': mismatches}
+
+
+def _replay_msg(msg):
+    if msg.flags & 1:  # I2C_M_RD
+        read = i2c_msg.read(msg.addr, len(msg))
+        read.flags = msg.flags
+        return read
+    return msg
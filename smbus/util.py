@@ -18,46 +18,79 @@ def get_validator(tp, name):
     return f
 
 
-validators = {}
+class Block(object):
+    """Schema type for validate: a list of integers or any object
+    supporting the buffer protocol (bytes, bytearray, memoryview, ...)"""
+
+
+def validate_block(x):
+    if isinstance(x, list):
+        return
+    try:
+        memoryview(x)
+    except TypeError:
+        raise TypeError("Expected list or bytes-like object")
+
+
+validators = {Block: validate_block}
+type_names = {}
 for tp, name in [(int, 'integer'), (float, 'float'),
                  (str, 'string'), (dict, 'dict'), (list, 'list')]:
     validators[tp] = get_validator(tp, name)
+    type_names[tp] = name
+
+
+_compiled = {}
 
 
 def validate(**schema):
+    """Decorator checking the types of the arguments named in schema.
+
+    The checking wrapper is generated as Python source with the same
+    signature as the decorated function, so each call costs one
+    isinstance check per argument and no generic argument handling."""
     def wrapper(fn):
         code = fn.__code__
         nargs = code.co_argcount
-        varnames = code.co_varnames
+        argnames = code.co_varnames[:nargs]
         if PY3K:
-            defaults = fn.__defaults__ if fn.__defaults__ else []
-            kwdefaults = fn.__kwdefaults__ if fn.__kwdefaults__ else {}
+            defaults = fn.__defaults__ if fn.__defaults__ else ()
         else:
-            defaults = fn.func_defaults if fn.func_defaults else []
-            kwdefaults = {}
-
-        def validator(*args):
-            largs = len(args)
-
-            if largs != nargs and largs + len(defaults) + len(kwdefaults) != nargs:
-                raise TypeError("%s() takes exactly %d arguments (%d given)" %
-                                (fn.__name__, nargs, len(args) + len(kwdefaults)))
-            for i, value in enumerate(args):
-                name = varnames[i]
-                if name not in schema:
-                    continue
-                typ = schema[name]
-                validators[typ](value)
-            if largs < nargs:
-                for i in range(largs, nargs):
-                    value = defaults[largs - i]
-                    name = varnames[i]
-                    if name not in schema:
-                        continue
-                    typ = schema[name]
-                    validators[typ](value)
-            return fn(*args, **kwdefaults)
+            defaults = fn.func_defaults if fn.func_defaults else ()
+        first_default = nargs - len(defaults)
+
+        namespace = {'__fn': fn}
+        params = []
+        checks = []
+        for i, name in enumerate(argnames):
+            if i >= first_default:
+                namespace['default_%s' % name] = defaults[i - first_default]
+                params.append('%s=default_%s' % (name, name))
+            else:
+                params.append(name)
+            if name not in schema:
+                continue
+            typ = schema[name]
+            if typ in type_names:
+                namespace['type_%s' % name] = typ
+                checks.append("    if not isinstance(%s, type_%s):\n"
+                              "        raise TypeError(%r)"
+                              % (name, name, "Expected %s" % type_names[typ]))
+            else:
+                namespace['check_%s' % name] = validators[typ]
+                checks.append("    check_%s(%s)" % (name, name))
+        source = "def validator(%s):\n%s\n    return __fn(%s)\n" % (
+            ", ".join(params), "\n".join(checks), ", ".join(argnames))
+        # methods with the same signature and schema share the code
+        code = _compiled.get(source)
+        if code is None:
+            code = _compiled[source] = compile(source, "<validate>", "exec")
+        exec(code, namespace)
+        validator = namespace['validator']
         validator.__name__ = fn.__name__
+        if hasattr(fn, '__qualname__'):
+            validator.__qualname__ = fn.__qualname__
         validator.__doc__ = fn.__doc__
+        validator.__module__ = fn.__module__
         return validator
     return wrapper
@@ -9,9 +9,39 @@ ffi.cdef("""
 typedef unsigned char __u8;
 typedef int32_t __s32;
 typedef unsigned short int __u16;
+typedef uint32_t __u32;
 
 #define I2C_SLAVE ...
 #define I2C_PEC ...
+#define I2C_TIMEOUT ...
+#define I2C_RETRIES ...
+#define I2C_RDWR ...
+#define I2C_FUNCS ...
+
+/* To determine what functionality is present */
+#define I2C_FUNC_I2C                    ...
+#define I2C_FUNC_10BIT_ADDR             ...
+#define I2C_FUNC_PROTOCOL_MANGLING      ...
+#define I2C_FUNC_SMBUS_PEC              ...
+#define I2C_FUNC_SMBUS_BLOCK_PROC_CALL  ...
+#define I2C_FUNC_SMBUS_QUICK            ...
+#define I2C_FUNC_SMBUS_READ_BYTE        ...
+#define I2C_FUNC_SMBUS_WRITE_BYTE       ...
+#define I2C_FUNC_SMBUS_READ_BYTE_DATA   ...
+#define I2C_FUNC_SMBUS_WRITE_BYTE_DATA  ...
+#define I2C_FUNC_SMBUS_READ_WORD_DATA   ...
+#define I2C_FUNC_SMBUS_WRITE_WORD_DATA  ...
+#define I2C_FUNC_SMBUS_PROC_CALL        ...
+#define I2C_FUNC_SMBUS_READ_BLOCK_DATA  ...
+#define I2C_FUNC_SMBUS_WRITE_BLOCK_DATA ...
+#define I2C_FUNC_SMBUS_READ_I2C_BLOCK   ...
+#define I2C_FUNC_SMBUS_WRITE_I2C_BLOCK  ...
+
+#define I2C_FUNC_SMBUS_BYTE             ...
+#define I2C_FUNC_SMBUS_BYTE_DATA        ...
+#define I2C_FUNC_SMBUS_WORD_DATA        ...
+#define I2C_FUNC_SMBUS_BLOCK_DATA       ...
+#define I2C_FUNC_SMBUS_I2C_BLOCK        ...
 
 /* smbus_access read or write markers */
 #define I2C_SMBUS_READ  ...
@@ -55,6 +85,43 @@ static inline __s32 i2c_smbus_write_word_data(int file, __u8 command, __u16 valu
 
 static inline __s32 i2c_smbus_process_call(int file, __u8 command, __u16 value);
 
+/*
+ * I2C Message - used for pure i2c transaction, also from /dev interface
+ */
+#define I2C_M_TEN           ...
+#define I2C_M_RD            ...
+#define I2C_M_NOSTART       ...
+#define I2C_M_REV_DIR_ADDR  ...
+#define I2C_M_IGNORE_NAK    ...
+#define I2C_M_NO_RD_ACK     ...
+
+struct i2c_msg {
+        __u16 addr;
+        unsigned short flags;
+        short len;
+        char *buf;
+};
+
+#define I2C_RDRW_IOCTL_MAX_MSGS     ...
+
+/*
+ * Helpers used by the SMBus class, all return -errno on failure.  The
+ * simulated backend in smbus/sim.py implements the same functions.
+ */
+static int smbus_cffi_ioctl(int file, unsigned long request, unsigned long arg);
+static int smbus_cffi_funcs(int file, unsigned long *funcs);
+static int smbus_cffi_access(int file, int read_write, int command, int size, union i2c_smbus_data *data);
+static int smbus_cffi_xfer(int file, int cur, int addr, int read_write, int command, int size, int value);
+static int smbus_cffi_xfer_retry(int file, int cur, int addr, int read_write, int command, int size, int value, int tries, int delay_us, int *attempts);
+static int smbus_cffi_rdwr(int file, struct i2c_msg *msgs, __u32 nmsgs);
+static int smbus_cffi_read_block_into(int file, int command, int size, char *buf, int len);
+static int smbus_cffi_read_registers(int file, int size, const __u8 *cmds, void *vals, int n);
+static int smbus_cffi_write_registers(int file, int size, const __u8 *cmds, const __u16 *vals, int n);
+static int smbus_cffi_read_i2c_block_stream(int file, int command, char *buf, int len, int chunk);
+static int smbus_cffi_write_i2c_block_stream(int file, int command, const char *buf, int len, int chunk, int tries, int delay_us, int *written);
+static int smbus_cffi_read_fifo(int file, int command, char *buf, int len);
+static int smbus_cffi_crc8(int crc, const char *buf, int len);
+
 //static inline __s32 i2c_smbus_read_block_data(int file, __u8 command, __u8 *values)
 //static inline __s32 i2c_smbus_write_block_data(int file, __u8 command, __u8 length, const __u8 *values)
 """)
@@ -62,8 +129,299 @@ static inline __s32 i2c_smbus_process_call(int file, __u8 command, __u16 value);
 include_dir = os.path.join(os.path.dirname(__file__), 'include')
 
 ffi.set_source(module_name, """
+#include <errno.h>
+#include <string.h>
 #include <sys/types.h>
+#include <unistd.h>
 #include <linux/i2c-dev.h>
+
+/* ioctl taking an unsigned long argument (I2C_SLAVE, I2C_PEC, ...),
+   returns 0 or -errno */
+static int smbus_cffi_ioctl(int file, unsigned long request, unsigned long arg)
+{
+        if (ioctl(file, request, arg) < 0)
+                return -errno;
+        return 0;
+}
+
+/* Query the functionality mask of the adapter, returns 0 or -errno */
+static int smbus_cffi_funcs(int file, unsigned long *funcs)
+{
+        if (ioctl(file, I2C_FUNCS, funcs) < 0)
+                return -errno;
+        return 0;
+}
+
+/* i2c_smbus_access returning 0 or -errno */
+static int smbus_cffi_access(int file, int read_write, int command, int size,
+                             union i2c_smbus_data *data)
+{
+        if (i2c_smbus_access(file, read_write, command, size, data))
+                return -errno;
+        return 0;
+}
+
+/* Single value SMBus transaction (quick, byte, byte data, word data or
+   process call) with the slave at addr.  The I2C_SLAVE ioctl is only
+   issued if addr differs from cur, the address currently selected on
+   file.  Returns the byte or word result (0 for writes) or -errno. */
+static int smbus_cffi_xfer(int file, int cur, int addr, int read_write,
+                           int command, int size, int value)
+{
+        union i2c_smbus_data data;
+        union i2c_smbus_data *p = &data;
+
+        if (cur != addr && ioctl(file, I2C_SLAVE, addr) < 0)
+                return -errno;
+        if (read_write == I2C_SMBUS_WRITE) {
+                if (size == I2C_SMBUS_QUICK || size == I2C_SMBUS_BYTE)
+                        p = NULL;
+                else if (size == I2C_SMBUS_BYTE_DATA)
+                        data.byte = (__u8)value;
+                else
+                        data.word = (__u16)value;
+        } else if (size == I2C_SMBUS_QUICK) {
+                p = NULL;
+        }
+        if (i2c_smbus_access(file, read_write, command, size, p))
+                return -errno;
+        if (read_write == I2C_SMBUS_WRITE && size != I2C_SMBUS_PROC_CALL)
+                return 0;
+        if (size == I2C_SMBUS_BYTE || size == I2C_SMBUS_BYTE_DATA)
+                return 0x0FF & data.byte;
+        return 0x0FFFF & data.word;
+}
+
+/* smbus_cffi_xfer repeated while the slave does not acknowledge (ENXIO,
+   EREMOTEIO, EAGAIN or ETIMEDOUT), at most tries times with delay_us
+   microseconds between attempts, e.g. to poll an EEPROM busy with a write
+   cycle.  The number of attempts made is stored in attempts unless it is
+   NULL.  Returns the result of the last attempt. */
+static int smbus_cffi_xfer_retry(int file, int cur, int addr, int read_write,
+                                 int command, int size, int value, int tries,
+                                 int delay_us, int *attempts)
+{
+        int res = -EINVAL;
+        int i;
+
+        for (i = 1; i <= tries; i++) {
+                res = smbus_cffi_xfer(file, cur, addr, read_write, command,
+                                      size, value);
+                if (res >= 0 || (res != -ENXIO && res != -EREMOTEIO &&
+                                 res != -EAGAIN && res != -ETIMEDOUT))
+                        break;
+                /* a NAK comes from the transfer, the address is selected */
+                cur = addr;
+                if (i < tries && delay_us > 0)
+                        usleep(delay_us);
+        }
+        if (attempts)
+                *attempts = i > tries ? tries : i;
+        return res;
+}
+
+/* Combined read/write transfer, all messages are sent with a single STOP.
+   Returns the number of messages transferred or -errno. */
+static int smbus_cffi_rdwr(int file, struct i2c_msg *msgs, __u32 nmsgs)
+{
+        struct i2c_rdwr_ioctl_data args;
+        int res;
+
+        args.msgs = msgs;
+        args.nmsgs = nmsgs;
+        res = ioctl(file, I2C_RDWR, &args);
+        return res < 0 ? -errno : res;
+}
+
+/* Block read (size is I2C_SMBUS_BLOCK_DATA or one of the I2C block
+   transaction types) copying at most len bytes into buf.  Returns the
+   length of the block as reported by the transaction or -errno. */
+static int smbus_cffi_read_block_into(int file, int command, int size,
+                                      char *buf, int len)
+{
+        union i2c_smbus_data data;
+        int n;
+
+        data.block[0] = len > I2C_SMBUS_BLOCK_MAX ? I2C_SMBUS_BLOCK_MAX : len;
+        if (i2c_smbus_access(file, I2C_SMBUS_READ, command, size, &data))
+                return -errno;
+        n = data.block[0];
+        memcpy(buf, data.block + 1, n > len ? len : n);
+        return n;
+}
+
+/* Read n byte or word registers (size is I2C_SMBUS_BYTE_DATA or
+   I2C_SMBUS_WORD_DATA) into vals, an array of __u8 or __u16 respectively.
+   Returns n or -errno of the first failing transaction. */
+static int smbus_cffi_read_registers(int file, int size, const __u8 *cmds,
+                                     void *vals, int n)
+{
+        union i2c_smbus_data data;
+        int i;
+
+        for (i = 0; i < n; i++) {
+                if (i2c_smbus_access(file, I2C_SMBUS_READ, cmds[i], size, &data))
+                        return -errno;
+                if (size == I2C_SMBUS_WORD_DATA)
+                        ((__u16 *)vals)[i] = data.word;
+                else
+                        ((__u8 *)vals)[i] = data.byte;
+        }
+        return n;
+}
+
+/* Write n byte or word registers, see smbus_cffi_read_registers */
+static int smbus_cffi_write_registers(int file, int size, const __u8 *cmds,
+                                      const __u16 *vals, int n)
+{
+        union i2c_smbus_data data;
+        int i;
+
+        for (i = 0; i < n; i++) {
+                if (size == I2C_SMBUS_WORD_DATA)
+                        data.word = vals[i];
+                else
+                        data.byte = (__u8)vals[i];
+                if (i2c_smbus_access(file, I2C_SMBUS_WRITE, cmds[i], size, &data))
+                        return -errno;
+        }
+        return n;
+}
+
+/* Read len bytes starting at register command with I2C block reads of at
+   most chunk bytes, each starting at the register following the previous
+   chunk.  Returns len or -errno of the first failing transaction. */
+static int smbus_cffi_read_i2c_block_stream(int file, int command, char *buf,
+                                            int len, int chunk)
+{
+        union i2c_smbus_data data;
+        int off, n, size;
+
+        for (off = 0; off < len; off += n) {
+                n = len - off > chunk ? chunk : len - off;
+                size = n == I2C_SMBUS_BLOCK_MAX ? I2C_SMBUS_I2C_BLOCK_BROKEN
+                                                : I2C_SMBUS_I2C_BLOCK_DATA;
+                data.block[0] = n;
+                if (i2c_smbus_access(file, I2C_SMBUS_READ, command + off, size,
+                                     &data))
+                        return -errno;
+                memcpy(buf + off, data.block + 1, n);
+        }
+        return len;
+}
+
+/* Write len bytes starting at register command with I2C block writes of
+   at most chunk bytes.  Chunks do not cross multiples of chunk, so the
+   writes stay within the pages of EEPROMs with a page size of chunk.  A
+   chunk the slave does not acknowledge (ENXIO, EREMOTEIO, EAGAIN or
+   ETIMEDOUT, e.g. an EEPROM busy with the write cycle of the previous
+   page) is tried up to tries times with delay_us microseconds between
+   attempts.  The number of bytes written is stored in written unless it
+   is NULL.  Returns len or -errno of the first failing transaction. */
+static int smbus_cffi_write_i2c_block_stream(int file, int command,
+                                             const char *buf, int len,
+                                             int chunk, int tries,
+                                             int delay_us, int *written)
+{
+        union i2c_smbus_data data;
+        int off, n, i, res = 0;
+
+        for (off = 0; off < len; off += n) {
+                n = chunk - (command + off) % chunk;
+                if (n > len - off)
+                        n = len - off;
+                res = -EINVAL;
+                for (i = 1; i <= tries; i++) {
+                        data.block[0] = n;
+                        memcpy(data.block + 1, buf + off, n);
+                        res = smbus_cffi_access(file, I2C_SMBUS_WRITE,
+                                                command + off,
+                                                I2C_SMBUS_I2C_BLOCK_BROKEN,
+                                                &data);
+                        if (res == 0 || (res != -ENXIO && res != -EREMOTEIO &&
+                                         res != -EAGAIN && res != -ETIMEDOUT))
+                                break;
+                        if (i < tries && delay_us > 0)
+                                usleep(delay_us);
+                }
+                if (res < 0)
+                        break;
+        }
+        if (written)
+                *written = off;
+        return res < 0 ? res : len;
+}
+
+/* Read len bytes from the FIFO data register command with I2C block reads
+   of at most I2C_SMBUS_BLOCK_MAX bytes, all of the same register.
+   Returns len or -errno of the first failing transaction. */
+static int smbus_cffi_read_fifo(int file, int command, char *buf, int len)
+{
+        union i2c_smbus_data data;
+        int off, n, size;
+
+        for (off = 0; off < len; off += n) {
+                n = len - off > I2C_SMBUS_BLOCK_MAX ? I2C_SMBUS_BLOCK_MAX
+                                                    : len - off;
+                size = n == I2C_SMBUS_BLOCK_MAX ? I2C_SMBUS_I2C_BLOCK_BROKEN
+                                                : I2C_SMBUS_I2C_BLOCK_DATA;
+                data.block[0] = n;
+                if (i2c_smbus_access(file, I2C_SMBUS_READ, command, size,
+                                     &data))
+                        return -errno;
+                memcpy(buf + off, data.block + 1, n);
+        }
+        return len;
+}
+
+/* CRC-8 with polynomial x^8 + x^2 + x + 1 as used for SMBus Packet Error
+   Codes, one table lookup per byte */
+static const __u8 smbus_cffi_crc8_table[256] = {
+        0x00, 0x07, 0x0e, 0x09, 0x1c, 0x1b, 0x12, 0x15,
+        0x38, 0x3f, 0x36, 0x31, 0x24, 0x23, 0x2a, 0x2d,
+        0x70, 0x77, 0x7e, 0x79, 0x6c, 0x6b, 0x62, 0x65,
+        0x48, 0x4f, 0x46, 0x41, 0x54, 0x53, 0x5a, 0x5d,
+        0xe0, 0xe7, 0xee, 0xe9, 0xfc, 0xfb, 0xf2, 0xf5,
+        0xd8, 0xdf, 0xd6, 0xd1, 0xc4, 0xc3, 0xca, 0xcd,
+        0x90, 0x97, 0x9e, 0x99, 0x8c, 0x8b, 0x82, 0x85,
+        0xa8, 0xaf, 0xa6, 0xa1, 0xb4, 0xb3, 0xba, 0xbd,
+        0xc7, 0xc0, 0xc9, 0xce, 0xdb, 0xdc, 0xd5, 0xd2,
+        0xff, 0xf8, 0xf1, 0xf6, 0xe3, 0xe4, 0xed, 0xea,
+        0xb7, 0xb0, 0xb9, 0xbe, 0xab, 0xac, 0xa5, 0xa2,
+        0x8f, 0x88, 0x81, 0x86, 0x93, 0x94, 0x9d, 0x9a,
+        0x27, 0x20, 0x29, 0x2e, 0x3b, 0x3c, 0x35, 0x32,
+        0x1f, 0x18, 0x11, 0x16, 0x03, 0x04, 0x0d, 0x0a,
+        0x57, 0x50, 0x59, 0x5e, 0x4b, 0x4c, 0x45, 0x42,
+        0x6f, 0x68, 0x61, 0x66, 0x73, 0x74, 0x7d, 0x7a,
+        0x89, 0x8e, 0x87, 0x80, 0x95, 0x92, 0x9b, 0x9c,
+        0xb1, 0xb6, 0xbf, 0xb8, 0xad, 0xaa, 0xa3, 0xa4,
+        0xf9, 0xfe, 0xf7, 0xf0, 0xe5, 0xe2, 0xeb, 0xec,
+        0xc1, 0xc6, 0xcf, 0xc8, 0xdd, 0xda, 0xd3, 0xd4,
+        0x69, 0x6e, 0x67, 0x60, 0x75, 0x72, 0x7b, 0x7c,
+        0x51, 0x56, 0x5f, 0x58, 0x4d, 0x4a, 0x43, 0x44,
+        0x19, 0x1e, 0x17, 0x10, 0x05, 0x02, 0x0b, 0x0c,
+        0x21, 0x26, 0x2f, 0x28, 0x3d, 0x3a, 0x33, 0x34,
+        0x4e, 0x49, 0x40, 0x47, 0x52, 0x55, 0x5c, 0x5b,
+        0x76, 0x71, 0x78, 0x7f, 0x6a, 0x6d, 0x64, 0x63,
+        0x3e, 0x39, 0x30, 0x37, 0x22, 0x25, 0x2c, 0x2b,
+        0x06, 0x01, 0x08, 0x0f, 0x1a, 0x1d, 0x14, 0x13,
+        0xae, 0xa9, 0xa0, 0xa7, 0xb2, 0xb5, 0xbc, 0xbb,
+        0x96, 0x91, 0x98, 0x9f, 0x8a, 0x8d, 0x84, 0x83,
+        0xde, 0xd9, 0xd0, 0xd7, 0xc2, 0xc5, 0xcc, 0xcb,
+        0xe6, 0xe1, 0xe8, 0xef, 0xfa, 0xfd, 0xf4, 0xf3
+};
+
+/* Continue the CRC-8 crc over len bytes of buf, returns the new CRC */
+static int smbus_cffi_crc8(int crc, const char *buf, int len)
+{
+        const __u8 *p = (const __u8 *)buf;
+        const __u8 *end = p + len;
+        __u8 c = (__u8)crc;
+
+        while (p < end)
+                c = smbus_cffi_crc8_table[c ^ *p++];
+        return c;
+}
 """, include_dirs=[include_dir])
 
 if __name__ == '__main__':
@@ -1,7 +1,59 @@
+import glob
 import os
+import sys
+
+import pytest
+from smbus import SMBus
+from smbus.sim import SimulatedBus, RegisterDevice
+
+BASE_DIR = os.path.join(os.path.dirname(__file__), '..')
+
+# smbus.aio needs asyncio.get_running_loop, its tests async def
+collect_ignore = ['test_aio.py'] if sys.version_info < (3, 7) else []
+
+
+def extension_is_stale():
+    """True if the compiled extension is missing or older than its
+    sources"""
+    target = os.path.join(BASE_DIR, 'smbus')
+    built = glob.glob(os.path.join(target, '_smbus_cffi*.so'))
+    if not built:
+        return True
+    sources = [os.path.join(BASE_DIR, 'smbus_cffi_build.py')]
+    sources += glob.glob(os.path.join(BASE_DIR, 'include', '*', '*.h'))
+    newest = max(os.path.getmtime(path) for path in sources)
+    return min(os.path.getmtime(path) for path in built) < newest
 
 
 def pytest_configure(config):
-    from smbus_cffi_build import ffi
-    target = os.path.join(os.path.dirname(__file__), '..', 'smbus')
-    ffi.compile(tmpdir=target)
+    if extension_is_stale():
+        from smbus_cffi_build import ffi
+        ffi.compile(tmpdir=os.path.join(BASE_DIR, 'smbus'))
+
+
+@pytest.fixture
+def devices():
+    """Function returning the slaves of a new simulated bus by address,
+    test modules override it with their own"""
+    return lambda: {0x50: RegisterDevice({1: 0x11, 2: 0x22})}
+
+
+@pytest.fixture
+def make_sim(devices):
+    """Function returning a new SimulatedBus with the slaves of devices"""
+    def make_sim(**kwargs):
+        return SimulatedBus(devices(), **kwargs)
+    return make_sim
+
+
+@pytest.fixture
+def sim(make_sim):
+    return make_sim()
+
+
+@pytest.fixture
+def bus(sim):
+    bus = SMBus(1, backend=sim)
+    yield bus
+    if bus.bus != -1:
+        bus.close()
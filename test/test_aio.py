@@ -0,0 +1,106 @@
+import asyncio
+import threading
+
+import pytest
+from smbus.aio import AsyncSMBus
+
+
+class FakeSMBus(object):
+    def __init__(self):
+        self.calls = []
+        self.threads = set()
+        self.closed = False
+
+    def read_byte_data(self, addr, cmd):
+        self.threads.add(threading.current_thread())
+        self.calls.append((addr, cmd))
+        return cmd + 1
+
+    def write_byte_data(self, addr, cmd, val):
+        raise IOError(121)
+
+    def close(self):
+        self.closed = True
+
+
+def run(coro):
+    return asyncio.new_event_loop().run_until_complete(coro)
+
+
+def test_transactions():
+    fake = FakeSMBus()
+    bus = AsyncSMBus(smbus=fake)
+
+    async def main():
+        assert await bus.read_byte_data(0x50, 1) == 2
+        with pytest.raises(IOError):
+            await bus.write_byte_data(0x50, 1, 2)
+        await bus.close()
+    run(main())
+    assert fake.calls == [(0x50, 1)]
+    assert threading.current_thread() not in fake.threads
+    assert fake.closed
+
+
+def test_queued_transactions_are_batched():
+    fake = FakeSMBus()
+    bus = AsyncSMBus(smbus=fake)
+    drains = []
+    drain = bus._drain
+
+    def counting_drain(loop):
+        drains.append(1)
+        return drain(loop)
+    bus._drain = counting_drain
+
+    async def main():
+        results = await asyncio.gather(
+            *[bus.read_byte_data(0x50, i) for i in range(20)])
+        assert results == list(range(1, 21))
+    run(main())
+    assert fake.calls == [(0x50, i) for i in range(20)]
+    assert len(fake.threads) == 1
+    assert len(drains) < 20
+
+
+def test_run():
+    fake = FakeSMBus()
+    bus = AsyncSMBus(smbus=fake)
+
+    def two_reads(smbus, addr):
+        return smbus.read_byte_data(addr, 1), smbus.read_byte_data(addr, 2)
+
+    async def main():
+        return await bus.run(two_reads, 0x50)
+    assert run(main()) == (2, 3)
+
+
+def test_results_delivered_per_transaction():
+    fake = FakeSMBus()
+    bus = AsyncSMBus(smbus=fake)
+    release = threading.Event()
+
+    def blocked(smbus):
+        return release.wait(5)
+
+    async def main():
+        first = bus.read_byte_data(0x50, 1)
+        second = bus.run(blocked)
+        # the first result arrives while the second is still running
+        assert await asyncio.wait_for(first, 1) == 2
+        assert not second.done()
+        release.set()
+        assert await second
+    run(main())
+
+
+def test_closed():
+    fake = FakeSMBus()
+    bus = AsyncSMBus(smbus=fake)
+
+    async def main():
+        await bus.close()
+        with pytest.raises(ValueError):
+            bus.read_byte_data(0x50, 1)
+    run(main())
+    assert fake.closed
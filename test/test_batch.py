@@ -0,0 +1,69 @@
+import errno
+
+import pytest
+from smbus import i2c_msg
+from smbus.batch import Batch
+from smbus.sim import RegisterDevice
+
+ADDRS = list(range(0x40, 0x50))
+
+
+@pytest.fixture
+def devices():
+    return lambda: dict((addr, RegisterDevice({0: addr, 1: 0x11}))
+                        for addr in ADDRS)
+
+
+def test_round_robin(bus, sim):
+    batch = Batch()
+    for addr in ADDRS:
+        assert batch.read_byte_data(addr, 0) == len(batch) - 1
+    for addr in ADDRS:
+        batch.write_byte_data(addr, 1, addr + 1)
+    for addr in ADDRS:
+        batch.add('read_byte_data', addr, cmd=1)
+    results = batch.run(bus)
+    n = len(ADDRS)
+    assert results[:n] == ADDRS
+    assert results[n:2 * n] == [None] * n
+    assert results[2 * n:] == [addr + 1 for addr in ADDRS]
+    assert sim.stats['I2C_SLAVE'] == n
+    assert batch.switches == n
+    assert batch.switches_saved == 2 * n
+
+
+def test_current_address_first(bus, sim):
+    bus.read_byte_data(0x45, 0)
+    batch = Batch()
+    batch.read_byte_data(0x41, 0)
+    batch.read_byte_data(0x45, 0)
+    batch.read_byte_data(0x41, 1)
+    assert batch.order(0x45) == [1, 0, 2]
+    assert batch.order() == [0, 2, 1]
+    before = sim.stats['I2C_SLAVE']
+    assert batch.run(bus) == [0x41, 0x45, 0x11]
+    assert sim.stats['I2C_SLAVE'] - before == 1
+    assert (batch.switches, batch.switches_saved) == (1, 2)
+
+
+def test_errors_and_transfer(bus, sim):
+    batch = Batch()
+    read = i2c_msg.read(0x42, 1)
+    batch.read_byte_data(0x41, 0)
+    batch.transfer([i2c_msg.write(0x42, [0]), read])
+    batch.read_byte_data(0x60, 0)
+    batch.read_byte_data(0x42, 1)
+    results = batch.run(bus)
+    assert results[0] == 0x41
+    assert results[1] is None
+    assert read.tolist() == [0x42]
+    assert isinstance(results[2], IOError)
+    assert results[2].args[0] == errno.ENXIO
+    assert results[3] == 0x11
+    with pytest.raises(ValueError):
+        batch.add('close')
+    with pytest.raises(AttributeError):
+        batch.close
+    batch.clear()
+    assert len(batch) == 0
+    assert batch.run(bus) == []
@@ -0,0 +1,127 @@
+import errno
+
+import pytest
+import smbus.breaker
+from smbus import i2c_msg
+from smbus.breaker import CircuitBreaker, CLOSED, OPEN
+from smbus.sim import RegisterDevice
+
+DEAD = 0x51
+
+
+class Clock(object):
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(smbus.breaker, '_clock', clock)
+    return clock
+
+
+@pytest.fixture
+def devices():
+    return lambda: {0x50: RegisterDevice({1: 0x11}),
+                    DEAD: RegisterDevice({1: 0x22})}
+
+
+@pytest.fixture
+def breaker():
+    return CircuitBreaker(threshold=3, reset_timeout=5.0)
+
+
+@pytest.fixture
+def bus(bus, breaker):
+    bus.add_layer(breaker)
+    return bus
+
+
+def test_opens_and_fails_fast(bus, sim, breaker, clock):
+    sim.inject(DEAD, errno.ENXIO, count=None)
+    for i in range(3):
+        assert breaker.state(1, DEAD) == CLOSED
+        with pytest.raises(IOError) as e:
+            bus.read_byte_data(DEAD, 1)
+        assert e.value.errno == errno.ENXIO
+    assert breaker.state(1, DEAD) == OPEN
+    before = sim.stats['I2C_SMBUS']
+    with pytest.raises(IOError) as e:
+        bus.read_byte_data(DEAD, 1)
+    assert e.value.errno == errno.EHOSTDOWN
+    assert bus.read_word_data_status(DEAD, 1) == (None, errno.EHOSTDOWN)
+    with pytest.raises(IOError):
+        bus.transfer([i2c_msg.write(DEAD, [1])])
+    assert sim.stats['I2C_SMBUS'] == before
+    assert sim.stats['I2C_RDWR'] == 0
+    # other devices are not affected
+    assert bus.read_byte_data(0x50, 1) == 0x11
+    state = breaker.states()[(1, DEAD)]
+    assert state['state'] == OPEN
+    assert state['errno'] == errno.ENXIO
+    assert state['rejected'] == 3
+    assert state['retry'] == 105.0
+
+
+def test_probe_closes(bus, sim, breaker, clock):
+    sim.inject(DEAD, errno.ETIMEDOUT, count=None)
+    for i in range(3):
+        assert bus.read_byte_data_status(DEAD, 1) == (None, errno.ETIMEDOUT)
+    assert breaker.state(1, DEAD) == OPEN
+    clock.now += 5
+    before = sim.stats['I2C_SMBUS']
+    # failing probe, the breaker stays open for another reset_timeout
+    with pytest.raises(IOError) as e:
+        bus.read_byte_data(DEAD, 1)
+    assert e.value.errno == errno.EHOSTDOWN
+    assert sim.stats['I2C_SMBUS'] - before == 1
+    assert breaker.states()[(1, DEAD)]['probes'] == 1
+    clock.now += 1
+    with pytest.raises(IOError):
+        bus.read_byte_data(DEAD, 1)
+    assert sim.stats['I2C_SMBUS'] - before == 1
+    sim.clear_faults()
+    clock.now += 5
+    assert bus.read_byte_data(DEAD, 1) == 0x22
+    assert breaker.state(1, DEAD) == CLOSED
+    assert breaker.states()[(1, DEAD)]['failures'] == 0
+    # a device failing right after its probe opens again at once
+    sim.inject(DEAD, errno.ENXIO, count=3)
+    for i in range(3):
+        with pytest.raises(IOError):
+            bus.read_byte_data(DEAD, 1)
+    assert breaker.state(1, DEAD) == OPEN
+    clock.now += 5
+    sim.inject(DEAD, errno.ENXIO, count=1)
+    breaker.probe(bus, DEAD)
+    assert breaker.state(1, DEAD) == OPEN
+    assert breaker.probe(bus, DEAD)
+    sim.inject(DEAD, errno.ENXIO, count=1)
+    with pytest.raises(IOError):
+        bus.read_byte_data(DEAD, 1)
+    assert breaker.state(1, DEAD) == OPEN
+
+
+def test_other_errors(bus, sim, breaker):
+    sim.inject(DEAD, errno.EINVAL, count=None)
+    for i in range(5):
+        with pytest.raises(IOError):
+            bus.write_byte_data(DEAD, 1, 0)
+    assert breaker.state(1, DEAD) == CLOSED
+    assert breaker.states()[(1, DEAD)]['errno'] == errno.EINVAL
+
+
+def test_reset(bus, sim, breaker):
+    sim.inject(DEAD, errno.ENXIO, count=3)
+    for i in range(3):
+        with pytest.raises(IOError):
+            bus.read_byte(DEAD)
+    assert breaker.state(1, DEAD) == OPEN
+    breaker.reset(bus=1)
+    assert breaker.states() == {}
+    assert bus.read_byte_data(DEAD, 1) == 0x22
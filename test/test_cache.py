@@ -0,0 +1,159 @@
+import errno
+
+import pytest
+from smbus import SMBus, i2c_msg
+from smbus.cache import RegisterCache, NEVER, UNTIL_WRITE
+from smbus.sim import RegisterDevice
+
+
+@pytest.fixture
+def devices():
+    return lambda: {0x50: RegisterDevice(bytearray(range(256))),
+                    0x51: RegisterDevice()}
+
+
+def add_cache(bus, **kwargs):
+    cache = RegisterCache(**kwargs)
+    bus.add_layer(cache)
+    return cache
+
+
+def test_not_cached_by_default(bus, sim):
+    cache = add_cache(bus)
+    assert bus.read_byte_data(0x50, 1) == 1
+    sim.devices[0x50].registers[1] = 0x99
+    assert bus.read_byte_data(0x50, 1) == 0x99
+    assert cache.stats()['size'] == 0
+
+
+def test_until_write(bus, sim):
+    cache = add_cache(bus, default=UNTIL_WRITE)
+    cache.set_policy(0x50, 7, NEVER)
+    assert bus.read_byte_data(0x50, 1) == 1
+    assert bus.read_word_data(0x50, 2) == 0x0302
+    assert bus.read_i2c_block_data(0x50, 4, 3) == [4, 5, 6]
+    assert bus.read_byte_data(0x50, 7) == 7
+    regs = sim.devices[0x50].registers
+    regs[1] = regs[2] = regs[5] = regs[7] = 0x99
+    ioctls = sim.stats['I2C_SMBUS']
+    assert bus.read_byte_data(0x50, 1) == 1
+    assert bus.read_word_data(addr=0x50, cmd=2) == 0x0302
+    block = bus.read_i2c_block_data(0x50, 4, 3)
+    assert block == [4, 5, 6]
+    block.append(1)
+    assert bus.read_i2c_block_data(0x50, 4, 3) == [4, 5, 6]
+    assert sim.stats['I2C_SMBUS'] == ioctls
+    assert bus.read_byte_data(0x50, 7) == 0x99
+    # a different length is a different read
+    assert bus.read_i2c_block_data(0x50, 4, 2) == [4, 0x99]
+    assert cache.stats()['hits'] == 4
+
+    # the word write to 2 covers register 3, the block at 4 is untouched
+    bus.write_word_data(0x50, 2, 0x1111)
+    assert bus.read_word_data(0x50, 2) == 0x1111
+    assert bus.read_byte_data(0x50, 1) == 1
+    bus.write_i2c_block_data(0x50, 0, [0, 0x42])
+    assert bus.read_byte_data(0x50, 1) == 0x42
+    bus.write_registers(0x50, [(5, 0x55)])
+    assert bus.read_i2c_block_data(0x50, 4, 2) == [4, 0x55]
+
+
+def test_block_variants(bus, sim):
+    cache = add_cache(bus, default=UNTIL_WRITE)
+    assert bus.read_i2c_block_data_bytes(0x50, 4, 2) == b'\x04\x05'
+    assert bus.read_i2c_block_data(0x50, 4, 2) == [4, 5]
+    assert bus.read_i2c_block_data_bytes(0x50, 4, 2) == b'\x04\x05'
+    assert cache.stats()['hits'] == 2
+
+
+def test_kinds_do_not_collide(bus, sim):
+    cache = add_cache(bus, default=UNTIL_WRITE)
+    assert bus.read_word_data(0x50, 0) == 0x0100
+    assert bus.read_i2c_block_data(0x50, 0, 2) == [0, 1]
+    assert bus.read_byte_data(0x50, 0) == 0
+    assert cache.stats()['hits'] == 0
+    assert bus.read_word_data(0x50, 0) == 0x0100
+    assert bus.read_byte_data(0x50, 0) == 0
+    assert bus.read_i2c_block_data_bytes(0x50, 0, 2) == b'\x00\x01'
+    assert cache.stats() == {'hits': 3, 'misses': 3, 'evictions': 0,
+                             'size': 3}
+    bus.write_byte_data(0x50, 1, 0x11)
+    assert cache.stats()['size'] == 1
+    assert bus.read_word_data(0x50, 0) == 0x1100
+
+
+def test_device_invalidation(bus, sim):
+    cache = add_cache(bus, default=UNTIL_WRITE)
+    bus.read_byte_data(0x50, 1)
+    bus.read_byte_data(0x51, 1)
+    bus.transfer([i2c_msg.write(0x50, [1, 0x77])])
+    assert bus.read_byte_data(0x50, 1) == 0x77
+    assert cache.stats()['hits'] == 0
+    bus.read_byte_data(0x51, 1)
+    assert cache.stats()['hits'] == 1
+    bus.write_byte(0x51, 1)
+    bus.read_byte_data(0x51, 1)
+    assert cache.stats()['hits'] == 1
+
+    bus.read_byte_data(0x50, 1)
+    cache.invalidate(0x50, 1)
+    bus.read_byte_data(0x50, 1)
+    cache.clear()
+    bus.read_byte_data(0x50, 1)
+    assert cache.stats()['hits'] == 2
+
+
+def test_failed_write_invalidates(bus, sim):
+    cache = add_cache(bus, default=UNTIL_WRITE)
+    bus.read_byte_data(0x50, 1)
+    sim.inject(0x50, errno.EREMOTEIO)
+    with pytest.raises(IOError):
+        bus.write_byte_data(0x50, 1, 0)
+    assert cache.stats()['size'] == 0
+
+
+def test_ttl(bus, sim, monkeypatch):
+    import smbus.cache
+    now = [0.0]
+    monkeypatch.setattr(smbus.cache, '_clock', lambda: now[0])
+    cache = add_cache(bus)
+    cache.set_policy(0x50, None, 0.5)
+    bus.read_byte_data(0x50, 1)
+    sim.devices[0x50].registers[1] = 0x99
+    now[0] = 0.4
+    assert bus.read_byte_data(0x50, 1) == 1
+    now[0] = 0.6
+    assert bus.read_byte_data(0x50, 1) == 0x99
+    with pytest.raises(ValueError):
+        cache.set_policy(0x50, 1, 0)
+
+
+def test_lru(bus, sim):
+    cache = add_cache(bus, size=2, default=UNTIL_WRITE)
+    bus.read_byte_data(0x50, 1)
+    bus.read_byte_data(0x50, 2)
+    bus.read_byte_data(0x50, 1)
+    bus.read_byte_data(0x50, 3)
+    assert cache.stats() == {'hits': 1, 'misses': 3, 'evictions': 1,
+                             'size': 2}
+    bus.read_byte_data(0x50, 1)
+    bus.read_byte_data(0x50, 2)
+    assert cache.stats()['hits'] == 2
+    assert cache.stats()['evictions'] == 2
+    with pytest.raises(ValueError):
+        RegisterCache(size=0)
+
+
+def test_keyed_by_bus(sim):
+    cache = RegisterCache(default=UNTIL_WRITE)
+    bus1 = SMBus(1, backend=sim)
+    bus2 = SMBus(2, backend=sim)
+    bus1.add_layer(cache)
+    bus2.add_layer(cache)
+    bus1.read_byte_data(0x50, 1)
+    bus2.read_byte_data(0x50, 1)
+    assert cache.stats()['size'] == 2
+    bus1.write_byte_data(0x50, 1, 0)
+    assert cache.stats()['size'] == 1
+    cache.invalidate(bus=2)
+    assert cache.stats()['size'] == 0
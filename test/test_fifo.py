@@ -0,0 +1,127 @@
+import itertools
+
+import pytest
+from smbus import SMBus
+from smbus.sim import SimulatedBus, RegisterDevice
+from smbus.smbus import SMBUS
+
+ADDR = 0x68
+COUNT = 0x72
+DATA = 0x74
+
+
+class FifoDevice(RegisterDevice):
+    """Device with a FIFO of consecutive byte values, its big endian fill
+    level at COUNT and its data register at DATA"""
+
+    def __init__(self, produce):
+        RegisterDevice.__init__(self)
+        self.produce = produce
+        self.counter = itertools.count()
+        self.fifo = bytearray()
+        self.reads = []
+
+    def read(self, cmd, length):
+        if cmd == COUNT:
+            self.fifo += bytearray(next(self.counter) & 0xFF
+                                   for _ in range(self.produce))
+            return bytearray([len(self.fifo) >> 8, len(self.fifo) & 0xFF])
+        if cmd == DATA:
+            self.reads.append(length)
+            data, self.fifo = self.fifo[:length], self.fifo[length:]
+            return data
+        return RegisterDevice.read(self, cmd, length)
+
+    def i2c_read(self, length):
+        return self.read(self.pointer, length)
+
+    def i2c_write(self, data):
+        self.pointer = bytearray(data)[0]
+
+
+def stream(bus, n, **kwargs):
+    chunks = []
+    for chunk in bus.read_fifo(ADDR, COUNT, DATA, 6, count_size=2,
+                               count_order='big', **kwargs):
+        chunks.append(chunk)
+        if len(chunks) == n:
+            break
+    return chunks
+
+
+def test_read_fifo_data_into():
+    device = FifoDevice(0)
+    device.fifo = bytearray(range(100))
+    bus = SMBus(1, backend=SimulatedBus({ADDR: device}))
+    buf = bytearray(70)
+    assert bus.read_fifo_data_into(ADDR, DATA, buf) == 70
+    assert buf == bytearray(range(70))
+    assert device.reads == [32, 32, 6]
+    assert bus.read_fifo_data_into(ADDR, DATA, bytearray()) == 0
+
+
+def test_read_fifo():
+    device = FifoDevice(20)
+    bus = SMBus(1, backend=SimulatedBus({ADDR: device}))
+    chunks = stream(bus, 3, nbuffers=3)
+    # whole frames only
+    assert [len(c) for c in chunks] == [18, 18, 24]
+    device = FifoDevice(40)
+    bus = SMBus(1, backend=SimulatedBus({ADDR: device}))
+    chunks = stream(bus, 4, max_frames=5, nbuffers=4)
+    # at most max_frames at a time
+    assert [len(c) for c in chunks] == [30, 30, 30, 30]
+    data = b''.join(c.tobytes() for c in chunks)
+    assert data == bytes(bytearray(range(120)))
+    assert all(isinstance(c, memoryview) for c in chunks)
+
+
+def test_read_fifo_reuses_buffers():
+    device = FifoDevice(12)
+    bus = SMBus(1, backend=SimulatedBus({ADDR: device}))
+    chunks = stream(bus, 3, max_frames=2, nbuffers=2)
+    assert chunks[0].obj is chunks[2].obj
+    assert chunks[0].obj is not chunks[1].obj
+
+
+def test_read_fifo_waits(monkeypatch):
+    import smbus.smbus
+    sleeps = []
+    device = FifoDevice(0)
+    monkeypatch.setattr(smbus.smbus.time, 'sleep',
+                        lambda t: (sleeps.append(t),
+                                   device.fifo.extend(b'\x01' * 3)))
+    bus = SMBus(1, backend=SimulatedBus({ADDR: device}))
+    chunk, = stream(bus, 1, interval=0.5)
+    assert chunk.tobytes() == b'\x01' * 6
+    assert sleeps == [0.5, 0.5]
+
+
+def test_read_fifo_single_byte_count_in_frames():
+    device = FifoDevice(0)
+    device.registers[0x10] = 2
+    device.fifo = bytearray(range(20))
+    bus = SMBus(1, backend=SimulatedBus({ADDR: device}))
+    fifo = bus.read_fifo(ADDR, 0x10, DATA, 4, count_frames=True)
+    assert next(fifo).tobytes() == bytes(bytearray(range(8)))
+
+
+def test_read_fifo_emulated():
+    device = FifoDevice(12)
+    sim = SimulatedBus({ADDR: device}, funcs=SMBUS.I2C_FUNC_I2C)
+    bus = SMBus(1, backend=sim)
+    bus.funcs_policy = 'emulate'
+    chunk, = stream(bus, 1)
+    assert chunk.tobytes() == bytes(bytearray(range(12)))
+    assert sim.stats['I2C_SMBUS'] == 0
+
+
+def test_read_fifo_numpy():
+    numpy = pytest.importorskip('numpy')
+    device = FifoDevice(12)
+    bus = SMBus(1, backend=SimulatedBus({ADDR: device}))
+    dtype = numpy.dtype([('x', '<i2'), ('y', '<i2'), ('z', '<i2')])
+    chunk, = stream(bus, 1, dtype=dtype)
+    assert chunk.dtype == dtype
+    assert chunk.shape == (2,)
+    assert chunk['x'][0] == 0x0100
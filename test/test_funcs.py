@@ -0,0 +1,71 @@
+import errno
+import os
+
+import pytest
+from smbus import SMBus, Funcs, ffi
+from smbus.smbus import SMBUS
+
+
+def test_funcs_flags():
+    funcs = Funcs(SMBUS.I2C_FUNC_I2C | SMBUS.I2C_FUNC_SMBUS_BYTE_DATA)
+    assert funcs.i2c
+    assert funcs.smbus_read_byte_data
+    assert funcs.smbus_write_byte_data
+    assert not funcs.smbus_pec
+    assert 'I2C_FUNC_SMBUS_BYTE_DATA' in funcs
+    assert SMBUS.I2C_FUNC_SMBUS_BLOCK_DATA not in funcs
+    assert int(funcs) == funcs.mask
+    with pytest.raises(AttributeError):
+        funcs.no_such_flag
+
+
+@pytest.fixture
+def bus():
+    bus = SMBus()
+    bus._fd = os.open(os.devnull, os.O_RDWR)
+    bus._funcs = Funcs(SMBUS.I2C_FUNC_SMBUS_BYTE_DATA |
+                       SMBUS.I2C_FUNC_SMBUS_READ_I2C_BLOCK)
+    yield bus
+    bus.close()
+
+
+def test_policy_check(bus):
+    bus.funcs_policy = 'check'
+    with pytest.raises(IOError) as excinfo:
+        bus.read_block_data(0x50, 1)
+    assert excinfo.value.args[0] == errno.EOPNOTSUPP
+    with pytest.raises(IOError) as excinfo:
+        bus.read_word_data(0x50, 1)
+    assert excinfo.value.args[0] == errno.EOPNOTSUPP
+    # supported transactions still reach the (not an i2c) device
+    with pytest.raises(IOError) as excinfo:
+        bus.read_byte_data(0x50, 1)
+    assert excinfo.value.args[0] == errno.ENOTTY
+    assert 'read_byte_data' not in bus.__dict__
+
+
+def test_policy_emulate(bus):
+    bus.funcs_policy = 'emulate'
+    assert bus.read_block_data.__func__.__name__ == '_emulate_read_block_data_i2c'
+    calls = []
+
+    def read_i2c_block_data(addr, cmd, len=32):
+        calls.append((addr, cmd, len))
+        return [3, 1, 2, 3] + [0xff] * 28
+    bus.read_i2c_block_data = read_i2c_block_data
+    assert bus.read_block_data(0x50, 7) == [1, 2, 3]
+    buf = bytearray(4)
+    assert bus.read_block_data_into(0x50, 7, buf) == 3
+    assert buf == bytearray(b'\x01\x02\x03\x00')
+    assert calls == [(0x50, 7, 32)] * 2
+    # nothing to emulate a word read with
+    with pytest.raises(IOError):
+        bus.read_word_data(0x50, 1)
+
+
+def test_policy_reset(bus):
+    bus.funcs_policy = 'check'
+    bus.funcs_policy = None
+    assert 'read_block_data' not in bus.__dict__
+    with pytest.raises(ValueError):
+        bus.funcs_policy = 'ignore'
@@ -0,0 +1,39 @@
+import pytest
+from smbus import SMBus, i2c_msg
+
+
+def test_read_msg():
+    msg = i2c_msg.read(0x50, 4)
+    assert msg.addr == 0x50
+    assert msg.flags == 1
+    assert len(msg) == 4
+    assert msg.tolist() == [0, 0, 0, 0]
+
+
+def test_write_msg_from_list():
+    msg = i2c_msg.write(0x50, [1, 2, 3])
+    assert msg.flags == 0
+    assert len(msg) == 3
+    assert list(msg) == [1, 2, 3]
+    assert msg.tobytes() == b'\x01\x02\x03'
+
+
+def test_write_msg_from_buffer():
+    msg = i2c_msg.write(0x50, bytearray(b'\x10\x20'))
+    assert list(msg) == [0x10, 0x20]
+    msg = i2c_msg.write(0x50, memoryview(b'\xff'))
+    assert list(msg) == [0xff]
+
+
+def test_transfer_message_count():
+    bus = SMBus()
+    with pytest.raises(OverflowError):
+        bus.transfer([])
+    with pytest.raises(OverflowError):
+        bus.transfer([i2c_msg.read(0x50, 1)] * 43)
+
+
+def test_transfer_not_connected():
+    bus = SMBus()
+    with pytest.raises(IOError):
+        bus.transfer([i2c_msg.write(0x50, [0]), i2c_msg.read(0x50, 2)])
@@ -0,0 +1,116 @@
+import errno
+import threading
+import time
+
+import pytest
+from smbus import ThreadSafeSMBus
+from smbus.limits import DeviceLimits
+from smbus.sim import RegisterDevice
+
+
+class StretchingDevice(RegisterDevice):
+    """Slave holding the clock low for stretch seconds"""
+
+    def __init__(self, stretch, registers=None):
+        RegisterDevice.__init__(self, registers)
+        self.stretch = stretch
+
+
+@pytest.fixture
+def devices():
+    return lambda: {0x50: RegisterDevice({1: 0x11}),
+                    0x51: RegisterDevice({1: 0x22}),
+                    0x36: StretchingDevice(0.5, {1: 0x33})}
+
+
+def test_bus_timeout(bus, sim):
+    assert bus.timeout is None and bus.retries is None
+    bus.timeout = 0.015
+    assert bus.timeout == 0.02
+    assert sim.timeout == 0.02
+    bus.timeout = 0.02
+    bus.timeout = 0.011
+    assert sim.stats['I2C_TIMEOUT'] == 1
+    bus.retries = 3
+    bus.retries = 3
+    assert sim.retries == 3
+    assert sim.stats['I2C_RETRIES'] == 1
+    with pytest.raises(ValueError):
+        bus.timeout = 0
+    with pytest.raises(ValueError):
+        bus.retries = -1
+    bus.close()
+    assert bus.timeout is None and bus.retries is None
+    bus = ThreadSafeSMBus(1, backend=sim)
+    bus.timeout = 1
+    assert bus.timeout == 1.0
+
+
+def test_device_limits(bus, sim):
+    limits = DeviceLimits(timeout=1.0, retries=2)
+    limits.set_device(0x36, timeout=0.02)
+    assert limits.limits(0x36) == (0.02, 2)
+    assert limits.limits(0x50) == (1.0, 2)
+    bus.add_layer(limits)
+    for i in range(3):
+        assert bus.read_byte_data(0x50, 1) == 0x11
+        assert bus.read_byte_data(0x51, 1) == 0x22
+    # devices with the same limits need no further ioctls
+    assert sim.stats['I2C_TIMEOUT'] == 1
+    assert sim.stats['I2C_RETRIES'] == 1
+    start = time.time()
+    with pytest.raises(IOError) as e:
+        bus.read_byte_data(0x36, 1)
+    assert e.value.args[0] == errno.ETIMEDOUT
+    assert time.time() - start < 0.4
+    assert sim.timeout == 0.02
+    assert bus.read_byte_data_status(0x36, 1) == (None, errno.ETIMEDOUT)
+    assert bus.read_byte_data(addr=0x50, cmd=1) == 0x11
+    assert sim.timeout == 1.0
+    assert sim.stats['I2C_TIMEOUT'] == 3
+    assert sim.stats['I2C_RETRIES'] == 1
+    limits.set_device(0x36)
+    assert limits.limits(0x36) == (1.0, 2)
+
+
+def test_device_limits_need_defaults():
+    limits = DeviceLimits()
+    with pytest.raises(ValueError):
+        limits.set_device(0x36, timeout=0.02)
+    with pytest.raises(ValueError):
+        limits.set_device(0x36, retries=1)
+    assert limits.limits(0x36) == (None, None)
+
+
+class CountingLock(object):
+    """Reentrant lock counting how often it was taken while free"""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.depth = 0
+        self.taken = 0
+
+    def __enter__(self):
+        self.lock.acquire()
+        self.depth += 1
+        if self.depth == 1:
+            self.taken += 1
+
+    def __exit__(self, *exc):
+        self.depth -= 1
+        self.lock.release()
+
+
+def test_device_limits_thread_safe(sim):
+    lock = CountingLock()
+    bus = ThreadSafeSMBus(1, lock=lock, backend=sim)
+    limits = DeviceLimits(timeout=1.0)
+    limits.set_device(0x36, timeout=0.02)
+    bus.add_layer(limits)
+    lock.taken = 0
+    assert bus.read_byte_data(0x50, 1) == 0x11
+    assert bus.read_byte_data_status(0x36, 1) == (None, errno.ETIMEDOUT)
+    assert sim.stats['I2C_TIMEOUT'] == 2
+    # the timeouts are set in the same locked section as the transaction
+    assert lock.taken == 2
+    assert lock.depth == 0
@@ -0,0 +1,102 @@
+import errno
+
+import pytest
+from smbus import SMBus, i2c_msg
+from smbus.metrics import Metrics, _positional, prometheus_text
+from smbus.sim import RegisterDevice
+
+
+@pytest.fixture
+def devices():
+    return lambda: {0x50: RegisterDevice(), 0x51: RegisterDevice()}
+
+
+def by_key(snapshot):
+    return dict(((t['addr'], t['cmd'], t['transaction']), t)
+                for t in snapshot['transactions'])
+
+
+def test_metrics(bus, sim):
+    metrics = Metrics()
+    bus.add_layer(metrics)
+    bus.read_byte_data(0x50, 1)
+    bus.read_byte_data(0x50, 1)
+    bus.read_word_data(0x51, 2)
+    bus.write_i2c_block_data(0x51, 3, b'abcd')
+    bus.read_registers(addr=0x50, cmds=[1, 2, 3])
+    bus.transfer([i2c_msg.write(0x51, [1]), i2c_msg.read(0x51, 2)])
+    sim.inject(0x50, errno.EREMOTEIO)
+    with pytest.raises(IOError):
+        bus.read_byte_data(0x50, 1)
+
+    snapshot = metrics.snapshot()
+    series = by_key(snapshot)
+    rbd = series[(0x50, 1, 'read_byte_data')]
+    assert rbd['bus'] == 1
+    assert rbd['count'] == 3
+    assert rbd['bytes'] == 2
+    assert rbd['errors'] == {errno.EREMOTEIO: 1}
+    assert rbd['buckets'][-1] == (float('inf'), 3)
+    assert series[(0x51, 3, 'write_i2c_block_data')]['bytes'] == 4
+    assert series[(0x50, None, 'read_registers')]['bytes'] == 3
+    assert series[(0x51, None, 'transfer')]['bytes'] == 3
+    # 0x50, 0x51, 0x50 and again after the failed transaction
+    assert snapshot['readdress'] == {1: 3}
+
+    text = prometheus_text(snapshot)
+    assert ('smbus_transaction_seconds_count{bus="1",addr="0x50",cmd="0x01",'
+            'transaction="read_byte_data"} 3') in text
+    assert 'errno="%d"} 1' % errno.EREMOTEIO in text
+
+
+def test_disabled_layer_is_free(bus, sim):
+    metrics = Metrics()
+    bus.add_layer(metrics)
+    assert 'read_byte_data' in bus.__dict__
+    bus.remove_layer(metrics)
+    assert 'read_byte_data' not in bus.__dict__
+    bus.read_byte_data(0x50, 1)
+    assert metrics.snapshot()['transactions'] == []
+
+
+def test_reset(bus, sim):
+    metrics = Metrics()
+    bus.add_layer(metrics)
+    bus.write_quick(0x50)
+    metrics.reset()
+    assert metrics.snapshot() == {'transactions': [], 'readdress': {}}
+
+
+def test_layer_wraps_funcs_policy(make_sim):
+    sim = make_sim(funcs=0)
+    bus = SMBus(1, backend=sim)
+    metrics = Metrics()
+    bus.add_layer(metrics)
+    bus.funcs_policy = 'check'
+    with pytest.raises(IOError):
+        bus.read_byte_data(0x50, 1)
+    series = by_key(metrics.snapshot())
+    assert series[(0x50, 1, 'read_byte_data')]['errors'] == {
+        errno.EOPNOTSUPP: 1}
+    assert sim.stats['I2C_SMBUS'] == 0
+
+
+def test_positional():
+    assert _positional('wait_ack', (0x50,), {'delay': 0.1}) == \
+        (0x50, 100, 0.1)
+    assert _positional('read_i2c_block_data', (0x50,), {'cmd': 1}) == \
+        (0x50, 1, 32)
+    with pytest.raises(TypeError):
+        _positional('read_byte_data', (0x50,), {})
+    with pytest.raises(TypeError):
+        _positional('read_byte_data', (0x50, 1), {'delay': 0.1})
+
+
+def test_skipped_default_keeps_keywords(bus, sim, monkeypatch):
+    import smbus.sim
+    sleeps = []
+    monkeypatch.setattr(smbus.sim.time, 'sleep', sleeps.append)
+    bus.add_layer(Metrics())
+    sim.inject(0x50, errno.ENXIO, count=2)
+    assert bus.wait_ack(0x50, delay=0.1) == 3
+    assert sleeps == [pytest.approx(0.1)] * 2
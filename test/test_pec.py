@@ -0,0 +1,204 @@
+import errno
+import random
+import threading
+
+import pytest
+from smbus import SMBus, ThreadSafeSMBus, i2c_msg
+from smbus.metrics import Metrics
+from smbus.pec import SoftwarePEC, crc8, transfer
+from smbus.sim import RegisterDevice
+
+ADDR = 0x0b
+
+
+def reference_crc8(data, crc=0):
+    for byte in bytearray(data):
+        crc ^= byte
+        for i in range(8):
+            crc = (crc << 1 ^ 0x07 if crc & 0x80 else crc << 1) & 0xFF
+    return crc
+
+
+class PecDevice(RegisterDevice):
+    """Slave appending a PEC to plain I2C reads and checking the PEC of
+    writes at the STOP, commands in blocks are SMBus blocks"""
+
+    def __init__(self, addr, registers=None, blocks=None):
+        RegisterDevice.__init__(self, registers, blocks)
+        self.addr = addr
+        self.wire = bytearray()
+        self.pending = None
+        self.corrupt = False
+        self.bad_pec = 0
+
+    def i2c_write(self, data):
+        data = bytearray(data)
+        self.wire += bytearray([self.addr << 1]) + data
+        self.pending = data
+
+    def i2c_read(self, length):
+        pending, self.pending = self.pending, None
+        self.wire.append(self.addr << 1 | 1)
+        if pending and pending[0] in self.blocks:
+            if len(pending) > 1:
+                self.block_write(pending[0], pending[2:2 + pending[1]])
+            block = self.block_read(pending[0])
+            reply = bytearray([len(block)]) + block
+        else:
+            if pending:
+                # a process call reads back the registers it wrote
+                RegisterDevice.i2c_write(self, pending)
+                self.pointer = pending[0]
+            reply = RegisterDevice.i2c_read(self, length - 1)
+        reply.append(reference_crc8(self.wire + reply) ^
+                     (0xFF if self.corrupt else 0))
+        return (reply + bytearray([0xFF]) * length)[:length]
+
+    def i2c_stop(self):
+        pending, self.pending = self.pending, None
+        wire, self.wire = self.wire, bytearray()
+        if pending is None:
+            return
+        if reference_crc8(wire[:-1]) != wire[-1]:
+            self.bad_pec += 1
+            raise IOError(errno.EREMOTEIO)
+        data = pending[:-1]
+        if data and data[0] in self.blocks:
+            self.block_write(data[0], data[2:2 + data[1]])
+        else:
+            RegisterDevice.i2c_write(self, data)
+
+
+@pytest.fixture
+def device():
+    return PecDevice(ADDR, {1: 0x11, 2: 0x22}, {0x20: b'battery'})
+
+
+@pytest.fixture
+def devices(device):
+    return lambda: {ADDR: device, 0x50: RegisterDevice({1: 0x55})}
+
+
+@pytest.fixture
+def bus(bus):
+    bus.add_layer(SoftwarePEC())
+    return bus
+
+
+def test_crc8():
+    assert crc8(b'123456789') == 0xF4
+    assert crc8([0x31, 0x32, 0x33]) == crc8(b'123')
+    assert crc8(b'6789', crc8(b'12345')) == 0xF4
+    assert crc8(b'') == 0
+    rng = random.Random(3)
+    for n in (1, 7, 34, 1000):
+        data = bytearray(rng.randrange(256) for i in range(n))
+        assert crc8(data) == reference_crc8(data)
+        assert crc8(memoryview(data)) == reference_crc8(data)
+
+
+def test_transactions(bus, device, sim):
+    assert bus.read_byte_data(ADDR, 1) == 0x11
+    assert bus.read_word_data(ADDR, 1) == 0x2211
+    bus.write_byte_data(ADDR, 3, 0x33)
+    bus.write_word_data(ADDR, 4, 0x5544)
+    assert device.registers[3:6] == bytearray([0x33, 0x44, 0x55])
+    bus.write_byte(ADDR, 4)
+    assert bus.read_byte(ADDR) == 0x44
+    assert bus.process_call(ADDR, 8, 0x1234) == 0x1234
+    assert bus.read_block_data(ADDR, 0x20) == list(bytearray(b'battery'))
+    assert bus.read_block_data_bytes(ADDR, 0x20) == b'battery'
+    buf = bytearray(10)
+    assert bus.read_block_data_into(ADDR, 0x20, buf) == 7
+    assert buf[:7] == b'battery'
+    bus.write_block_data(ADDR, 0x20, b'charger')
+    assert device.blocks[0x20] == b'charger'
+    assert bus.block_process_call(ADDR, 0x20, [1, 2, 3]) == [1, 2, 3]
+    assert device.bad_pec == 0
+    assert sim.stats['I2C_SMBUS'] == 0
+
+
+def test_write_pec(bus, sim):
+    writes = []
+    device = sim.devices[ADDR]
+    original = device.i2c_write
+    device.i2c_write = lambda data: (writes.append(bytes(data)),
+                                     original(data))
+    bus.write_byte_data(ADDR, 3, 0x33)
+    assert writes == [b'\x03\x33' + bytearray(
+        [reference_crc8(bytearray([ADDR << 1, 3, 0x33]))])]
+
+
+def test_bad_pec(bus, device):
+    device.corrupt = True
+    with pytest.raises(IOError) as e:
+        bus.read_word_data(ADDR, 1)
+    assert e.value.errno == errno.EBADMSG
+    with pytest.raises(IOError) as e:
+        bus.read_block_data(ADDR, 0x20)
+    assert e.value.errno == errno.EBADMSG
+    assert bus.read_byte_data_status(ADDR, 1) == (None, errno.EBADMSG)
+    device.corrupt = False
+    assert bus.read_byte_data_status(ADDR, 1) == (0x11, 0)
+
+
+def test_raw_transfer(bus, device, sim):
+    read = i2c_msg.read(ADDR, 2)
+    bus.transfer([i2c_msg.write(ADDR, [1]), read])
+    assert read.tolist() == [0x11, 0x22]
+    bus.transfer([i2c_msg.write(ADDR, [6, 0x66])])
+    assert device.registers[6] == 0x66
+    plain = SMBus(1, backend=sim)
+    transfer(plain, [i2c_msg.write(ADDR, [7, 0x77])])
+    assert device.registers[7] == 0x77
+    assert device.bad_pec == 0
+    with pytest.raises(IOError) as e:
+        plain.transfer([i2c_msg.write(ADDR, [7, 0x00])])
+    assert e.value.errno == errno.EREMOTEIO
+    assert device.bad_pec == 1
+
+
+def test_addrs(sim, device):
+    bus = SMBus(1, backend=sim)
+    bus.add_layer(SoftwarePEC(addrs=[ADDR]))
+    assert bus.read_byte_data(ADDR, 2) == 0x22
+    assert bus.read_byte_data(0x50, 1) == 0x55
+    assert bus.read_byte_data_status(addr=0x50, cmd=1) == (0x55, 0)
+    assert sim.stats['I2C_SMBUS'] == 2
+    assert sim.stats['I2C_RDWR'] == 1
+
+
+class RecordingLock(object):
+    """Reentrant lock counting how often it was taken"""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.taken = 0
+
+    def __enter__(self):
+        self.lock.acquire()
+        self.taken += 1
+
+    def __exit__(self, *exc):
+        self.lock.release()
+
+
+def test_layers_below(sim, device):
+    lock = RecordingLock()
+    bus = ThreadSafeSMBus(1, lock=lock, backend=sim)
+    metrics = Metrics()
+    bus.add_layer(metrics)
+    bus.add_layer(SoftwarePEC())
+    lock.taken = 0
+    assert bus.read_word_data(ADDR, 1) == 0x2211
+    bus.write_byte_data(ADDR, 3, 0x33)
+    assert bus.read_block_data(ADDR, 0x20) == list(bytearray(b'battery'))
+    bus.transfer([i2c_msg.write(ADDR, [6, 0x66])])
+    assert device.registers[6] == 0x66
+    assert device.bad_pec == 0
+    # the transfers go through the lock and the layers added before
+    assert lock.taken == 4
+    counts = [t['count'] for t in metrics.snapshot()['transactions']
+              if t['transaction'] == 'transfer']
+    assert counts == [4]
+
@@ -0,0 +1,68 @@
+import threading
+
+import pytest
+from smbus.poller import Poller
+
+
+class FakeSMBus(object):
+    instances = {}
+
+    def __init__(self, bus):
+        self.bus = bus
+        self.calls = []
+        self.threads = set()
+        self.closed = False
+        FakeSMBus.instances[bus] = self
+
+    def _record(self, *call):
+        self.calls.append(call)
+        self.threads.add(threading.current_thread())
+
+    def read_registers(self, addr, cmds, word=False):
+        self._record('read_registers', addr, list(cmds), word)
+        return [self.bus * 100 + addr + cmd for cmd in cmds]
+
+    def read_byte(self, addr):
+        self._record('read_byte', addr)
+        raise IOError(121)
+
+    def read_i2c_block_data(self, addr, cmd):
+        self._record('read_i2c_block_data', addr, cmd)
+        return [cmd] * 4
+
+    def close(self):
+        self.closed = True
+
+
+def test_poll():
+    reads = [(0, 0x10, 1, 'byte_data'), (1, 0x20, 2, 'word_data'),
+             (0, 0x10, 2, 'byte_data'), (1, 0x21, 0, 'byte'),
+             (0, 0x11, 5, 'i2c_block_data')]
+    with Poller(reads, FakeSMBus) as poller:
+        for i in range(2):
+            samples = poller.poll()
+            assert [s[:4] for s in samples] == reads
+            assert [s.value for s in samples] == [
+                0x11, 100 + 0x22, 0x12, None, [5] * 4]
+            assert isinstance(samples[3].error, IOError)
+            assert samples[0].timestamp == samples[2].timestamp
+    bus0, bus1 = FakeSMBus.instances[0], FakeSMBus.instances[1]
+    assert bus0.calls[:2] == [('read_registers', 0x10, [1, 2], False),
+                              ('read_i2c_block_data', 0x11, 5)]
+    assert bus1.calls[:2] == [('read_registers', 0x20, [2], True),
+                              ('read_byte', 0x21)]
+    assert bus0.threads.isdisjoint(bus1.threads)
+    assert bus0.closed and bus1.closed
+
+
+def test_factory_failure_stops_workers():
+    def smbus_factory(bus):
+        if bus == 1:
+            raise IOError(2, 'No such file or directory')
+        return FakeSMBus(bus)
+    FakeSMBus.instances.clear()
+    with pytest.raises(IOError):
+        Poller([(0, 0x10, 1, 'byte_data'), (1, 0x20, 2, 'byte_data')],
+               smbus_factory)
+    assert list(FakeSMBus.instances) == [0]
+    assert FakeSMBus.instances[0].closed
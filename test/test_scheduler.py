@@ -0,0 +1,164 @@
+import errno
+import threading
+import time
+
+import pytest
+import smbus.scheduler
+from smbus import SMBus
+from smbus.scheduler import RingBuffer, Scheduler
+from smbus.sim import SimulatedBus, RegisterDevice
+from smbus.smbus import SMBUS
+
+
+def factory(**kwargs):
+    sims = {}
+
+    def smbus_factory(bus):
+        sims[bus] = SimulatedBus(
+            {0x48: RegisterDevice({0: 0x34, 1: 0x12, 2: 0x56}),
+             0x49: RegisterDevice({0: 0x99})}, **kwargs)
+        return SMBus(bus, backend=sims[bus])
+    return smbus_factory, sims
+
+
+class FakeTime(object):
+    """Virtual clock of every thread, advancing by a microsecond per
+    reading and by the time waited, until end"""
+
+    def __init__(self, end):
+        self.end = end
+        self.local = threading.local()
+
+    def clock(self):
+        self.local.now = getattr(self.local, 'now', 0.0) + 1e-6
+        return self.local.now
+
+    def wait(self, seconds):
+        self.local.now = getattr(self.local, 'now', 0.0) + seconds
+        return self.local.now >= self.end
+
+
+def test_ring_buffer():
+    ring = RingBuffer(3)
+    for i in range(5):
+        ring.append(i, i * 10, 0, i, i + 0.5)
+    assert len(ring) == 3
+    assert ring.overflows == 2
+    assert ring.read() == [(2, 20, 0, 2.0, 2.5), (3, 30, 0, 3.0, 3.5),
+                           (4, 40, 0, 4.0, 4.5)]
+    assert ring.read() == []
+    ring.append(7, -1, errno.EIO, 0, 0)
+    assert ring.read() == [(7, -1, errno.EIO, 0.0, 0.0)]
+
+
+def test_schedule(monkeypatch):
+    smbus_factory, sims = factory()
+    plan = [(1, 0x48, 0, 'word_data', 0.01),
+            (1, 0x48, 2, 'byte_data', 0.01),
+            (1, 0x49, 0, 'byte_data', 0.03),
+            (2, 0x48, 0, 'byte_data', 0.02)]
+    fake = FakeTime(0.195)
+    monkeypatch.setattr(smbus.scheduler, '_clock', fake.clock)
+    scheduler = Scheduler(plan, smbus_factory=smbus_factory)
+    scheduler._wait = fake.wait
+    scheduler.start()
+    for worker in scheduler._workers:
+        worker.join()
+    scheduler.stop()
+    samples = scheduler.read()
+    by_entry = {}
+    for sample in samples:
+        by_entry.setdefault(sample[:4], []).append(sample)
+    assert set(s.value for s in by_entry[(1, 0x48, 0, 'word_data')]) == \
+        set([0x1234])
+    assert set(s.value for s in by_entry[(1, 0x48, 2, 'byte_data')]) == \
+        set([0x56])
+    assert set(s.value for s in by_entry[(1, 0x49, 0, 'byte_data')]) == \
+        set([0x99])
+    assert all(s.errno == 0 for s in samples)
+    fast = by_entry[(1, 0x48, 0, 'word_data')]
+    slow = by_entry[(1, 0x49, 0, 'byte_data')]
+    assert len(fast) == 20
+    assert len(slow) == 7
+    assert len(by_entry[(2, 0x48, 0, 'byte_data')]) == 10
+    # deadlines follow the absolute schedule
+    deadlines = [s.deadline for s in fast]
+    steps = [b - a for a, b in zip(deadlines, deadlines[1:])]
+    assert all(abs(step - 0.01) < 1e-9 for step in steps)
+    assert all(s.timestamp >= s.deadline for s in samples)
+    # reads due at the same tick share one transfer
+    stats = scheduler.stats()
+    assert sims[1].stats['I2C_RDWR'] == len(fast)
+    assert sims[1].stats['I2C_SMBUS'] == 0
+    assert stats['ticks'] == 30
+    assert stats['missed'] == [0, 0, 0, 0]
+    assert stats['overflows'] == 0
+    assert scheduler.read() == []
+
+
+def test_schedule_without_i2c():
+    smbus_factory, sims = factory(funcs=SMBUS.I2C_FUNC_SMBUS_BYTE_DATA |
+                                  SMBUS.I2C_FUNC_SMBUS_WORD_DATA)
+    plan = [(1, 0x48, 0, 'byte_data', 0.01), (1, 0x48, 1, 'byte_data', 0.01)]
+    with Scheduler(plan, smbus_factory=smbus_factory) as scheduler:
+        time.sleep(0.05)
+    samples = scheduler.read()
+    assert [s.value for s in samples[:2]] == [0x34, 0x12]
+    assert sims[1].stats['I2C_RDWR'] == 0
+
+
+def test_missed_deadlines_and_errors():
+    smbus_factory, sims = factory(latency=0.025)
+    plan = [(1, 0x48, 0, 'byte_data', 0.01), (1, 0x50, 0, 'byte_data', 0.01)]
+    with Scheduler(plan, capacity=2, smbus_factory=smbus_factory) as sched:
+        time.sleep(0.3)
+    stats = sched.stats()
+    assert stats['missed'][0] > 0
+    assert stats['missed'][0] == stats['missed'][1]
+    assert stats['max_lateness'] > 0.01
+    assert stats['overflows'] > 0
+    samples = sched.read()
+    assert len(samples) == 2
+    # the missing device does not fail the reads of the present one
+    assert set((s.addr, s.value, s.errno) for s in samples) == \
+        set([(0x48, 0x34, 0), (0x50, 0, errno.ENXIO)])
+
+
+def test_batches():
+    smbus_factory, sims = factory()
+    plan = [(1, 0x48, 0, 'byte_data', 0.01)] * 30 + \
+        [(1, 0x49, 0, 'byte_data', 0.01)] * 5
+    scheduler = Scheduler(plan, smbus_factory=smbus_factory)
+    worker = smbus.scheduler._Worker(scheduler, smbus_factory(1),
+                                     list(range(len(plan))))
+    batches = worker.batches(list(range(len(plan))))
+    # a write and a read message per entry
+    first = SMBUS.I2C_RDRW_IOCTL_MAX_MSGS // 2
+    assert [len(b) for b in batches] == [first, len(plan) - first]
+    assert worker.read_rdwr(list(range(len(plan)))) == \
+        [(0x34, 0)] * 30 + [(0x99, 0)] * 5
+
+
+def test_start_closes_buses_on_failure():
+    opened = []
+
+    def smbus_factory(bus):
+        if bus == 2:
+            raise IOError(errno.ENOENT, 'No such file or directory')
+        opened.append(SMBus(bus, backend=SimulatedBus({})))
+        return opened[-1]
+    scheduler = Scheduler([(1, 0x48, 0, 'byte_data', 0.01),
+                           (2, 0x48, 0, 'byte_data', 0.01)],
+                          smbus_factory=smbus_factory)
+    with pytest.raises(IOError):
+        scheduler.start()
+    assert len(opened) == 1
+    assert opened[0]._fd == -1
+    assert scheduler._workers == []
+
+
+def test_invalid_plan():
+    with pytest.raises(ValueError):
+        Scheduler([(1, 0x48, 0, 'block_data', 0.01)])
+    with pytest.raises(ValueError):
+        Scheduler([(1, 0x48, 0, 'byte_data', 0)])
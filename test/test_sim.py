@@ -0,0 +1,208 @@
+import errno
+import os
+import time
+from array import array
+
+import pytest
+from smbus import SMBus, i2c_msg
+from smbus.sim import SimulatedBus, RegisterDevice, EepromDevice
+from smbus.smbus import SMBUS
+
+ADDR = 0x50
+
+
+@pytest.fixture
+def devices():
+    return lambda: {ADDR: RegisterDevice(bytearray(range(256)))}
+
+
+@pytest.fixture
+def bus(bus):
+    bus._compat = True
+    return bus
+
+
+def test_single_value(bus, sim):
+    assert bus.read_byte_data(ADDR, 0x10) == 0x10
+    assert bus.read_word_data(ADDR, 0x10) == 0x1110
+    bus.write_byte_data(ADDR, 0x20, 0xAA)
+    bus.write_word_data(ADDR, 0x30, 0xBEEF)
+    regs = sim.devices[ADDR].registers
+    assert (regs[0x20], regs[0x30], regs[0x31]) == (0xAA, 0xEF, 0xBE)
+    bus.write_byte(ADDR, 0x40)
+    assert bus.read_byte(ADDR) == 0x40
+    assert bus.process_call(ADDR, 0x50, 0x1234) == 0x1234
+    bus.write_quick(ADDR)
+    # the slave address is only selected once
+    assert sim.stats['I2C_SLAVE'] == 1
+
+
+def test_block(bus, sim):
+    bus.write_i2c_block_data(ADDR, 0x10, b'\x01\x02\x03')
+    assert bus.read_i2c_block_data(ADDR, 0x10, 3) == [1, 2, 3]
+    buf = bytearray(4)
+    assert bus.read_i2c_block_data_into(ADDR, 0x10, buf) == 4
+    assert buf == bytearray(b'\x01\x02\x03\x13')
+    bus.write_block_data(ADDR, 7, [9, 8, 7])
+    assert bus.read_block_data(ADDR, 7) == [9, 8, 7]
+    assert bus.read_block_data_into(ADDR, 7, buf) == 3
+    assert bus.block_process_call(ADDR, 8, [5, 6]) == [5, 6]
+    assert sim.devices[ADDR].blocks[7] == bytearray([9, 8, 7])
+
+
+def test_block_bytes(bus):
+    bus.write_i2c_block_data(ADDR, 0x10, [1, 2, 3])
+    assert bus.read_i2c_block_data_bytes(ADDR, 0x10, 3) == b'\x01\x02\x03'
+    assert len(bus.read_i2c_block_data_bytes(ADDR, 0x10)) == 32
+    bus.write_block_data(ADDR, 7, b'\x09\x08')
+    assert bus.read_block_data_bytes(ADDR, 7) == b'\x09\x08'
+    # results do not share the scratch union of the bus
+    first = bus.read_i2c_block_data(ADDR, 0x10, 2)
+    bus.read_i2c_block_data(ADDR, 0x20, 2)
+    assert first == [1, 2]
+
+
+def test_registers(bus):
+    bus.write_registers(ADDR, [(1, 0x11), (2, 0x22)])
+    assert bus.read_registers(ADDR, [1, 2, 3]) == bytearray([0x11, 0x22, 3])
+    bus.write_registers(ADDR, [(4, 0x1234)], True)
+    assert bus.read_registers(ADDR, [4], True) == array('H', [0x1234])
+
+
+class PagedDevice(RegisterDevice):
+
+    def __init__(self):
+        RegisterDevice.__init__(self)
+        self.writes = []
+
+    def write(self, cmd, data):
+        self.writes.append((cmd, len(data)))
+        RegisterDevice.write(self, cmd, data)
+
+
+def test_stream():
+    device = PagedDevice()
+    sim = SimulatedBus({ADDR: device})
+    bus = SMBus(1, backend=sim)
+    data = bytes(bytearray(range(100)))
+    bus.write_i2c_block_data_stream(ADDR, 10, data, chunk=16)
+    assert device.writes == [(10, 6), (16, 16), (32, 16), (48, 16), (64, 16),
+                             (80, 16), (96, 14)]
+    assert device.registers[10:110] == bytearray(data)
+    ioctls = sim.stats['I2C_SMBUS']
+    assert bus.read_i2c_block_data_stream(ADDR, 10, 100) == bytearray(data)
+    assert sim.stats['I2C_SMBUS'] == ioctls + 4
+    buf = bytearray(40)
+    assert bus.read_i2c_block_data_stream(ADDR, 20, buf, chunk=8) is buf
+    assert buf == bytearray(data[10:50])
+    assert bus.read_i2c_block_data_stream(ADDR, 0, 0) == bytearray()
+    bus.write_i2c_block_data_stream(ADDR, 0, [1, 2, 3])
+    assert device.registers[:3] == bytearray([1, 2, 3])
+    with pytest.raises(OverflowError):
+        bus.read_i2c_block_data_stream(ADDR, 200, 57)
+    with pytest.raises(OverflowError):
+        bus.write_i2c_block_data_stream(ADDR, 0, data, chunk=33)
+    with pytest.raises(BufferError):
+        bus.read_i2c_block_data_stream(ADDR, 0, b'read only')
+    sim.inject(ADDR, errno.EREMOTEIO)
+    with pytest.raises(IOError) as excinfo:
+        bus.write_i2c_block_data_stream(ADDR, 0, data, tries=1)
+    assert excinfo.value.errno == errno.EREMOTEIO
+    assert excinfo.value.written == 0
+
+
+@pytest.mark.parametrize('funcs', [None, 'I2C_FUNC_I2C'])
+def test_stream_eeprom(funcs):
+    device = EepromDevice(page_size=16, write_time=0.002)
+    sim = SimulatedBus({ADDR: device},
+                       funcs=funcs and getattr(SMBUS, funcs))
+    bus = SMBus(1, backend=sim)
+    bus.funcs_policy = 'emulate'
+    data = bytes(bytearray(range(1, 65)))
+    # every page waits for the write cycle of the previous one
+    bus.write_i2c_block_data_stream(ADDR, 8, data, chunk=16)
+    assert device.busy > 0
+    time.sleep(0.004)
+    assert device.registers[8:72] == bytearray(data)
+    # without retries the second page hits the write cycle of the first
+    data = bytes(bytearray(range(100, 164)))
+    with pytest.raises(IOError) as excinfo:
+        bus.write_i2c_block_data_stream(ADDR, 0, data, chunk=16, tries=1)
+    assert excinfo.value.errno == errno.ENXIO
+    assert excinfo.value.written == 16
+    assert device.registers[:17] == bytearray(data[:16]) + bytearray([9])
+
+
+def test_eeprom_page_wrap():
+    device = EepromDevice(page_size=8, write_time=0)
+    bus = SMBus(1, backend=SimulatedBus({ADDR: device}))
+    bus.write_i2c_block_data(ADDR, 6, [1, 2, 3, 4])
+    assert device.registers[:8] == bytearray([3, 4, 0, 0, 0, 0, 1, 2])
+
+
+def test_stream_emulated():
+    device = PagedDevice()
+    sim = SimulatedBus({ADDR: device}, funcs=SMBUS.I2C_FUNC_I2C)
+    bus = SMBus(1, backend=sim)
+    bus.funcs_policy = 'emulate'
+    data = bytes(bytearray(range(40)))
+    bus.write_i2c_block_data_stream(ADDR, 4, data, chunk=32)
+    assert device.writes == [(4, 28), (32, 12)]
+    assert sim.stats['I2C_SMBUS'] == 0
+    assert bus.read_i2c_block_data_stream(ADDR, 4, 40) == bytearray(data)
+    assert sim.stats['I2C_RDWR'] == 3
+
+
+def test_transfer(bus, sim):
+    read = i2c_msg.read(ADDR, 2)
+    bus.transfer([i2c_msg.write(ADDR, [0x60]), read])
+    assert read.tolist() == [0x60, 0x61]
+    assert sim.stats['I2C_RDWR'] == 1
+
+
+def test_missing_device(bus):
+    with pytest.raises(IOError) as excinfo:
+        bus.read_byte_data(0x51, 0)
+    assert excinfo.value.args[0] == errno.ENXIO
+    assert excinfo.value.errno == errno.ENXIO
+    assert excinfo.value.strerror == os.strerror(errno.ENXIO)
+    with pytest.raises(IOError) as excinfo:
+        bus.transfer([i2c_msg.read(0x51, 1)])
+    assert excinfo.value.errno == errno.ENXIO
+
+
+def test_inject(bus, sim):
+    sim.inject(ADDR, errno.EREMOTEIO, count=2)
+    for i in range(2):
+        with pytest.raises(IOError) as excinfo:
+            bus.read_byte_data(ADDR, 0)
+        assert excinfo.value.args[0] == errno.EREMOTEIO
+    assert bus.read_byte_data(ADDR, 0) == 0
+    sim.inject(ADDR, errno.EIO, count=None)
+    for i in range(3):
+        with pytest.raises(IOError):
+            bus.read_word_data(ADDR, 0)
+    sim.clear_faults()
+    assert bus.read_word_data(ADDR, 0) == 0x0100
+
+
+def test_error_rate(sim):
+    sim.error_rate = 0.5
+    bus = SMBus(1, backend=sim)
+    failures = 0
+    for i in range(200):
+        try:
+            bus.read_byte_data(ADDR, 0)
+        except IOError:
+            failures += 1
+    assert 50 < failures < 150
+
+
+def test_funcs(sim):
+    sim.funcs_mask = 0
+    bus = SMBus(1, backend=sim)
+    assert not bus.funcs.smbus_read_byte_data
+    bus.funcs_policy = 'check'
+    with pytest.raises(IOError):
+        bus.read_byte_data(ADDR, 0)
+    assert sim.stats['I2C_SMBUS'] == 0
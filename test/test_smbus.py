@@ -1,3 +1,8 @@
+import os
+import subprocess
+import sys
+
+import pytest
 from smbus import SMBus
 
 
@@ -50,3 +55,72 @@ def test_smbus_data_to_list():
     data = ffi.new("union i2c_smbus_data *")
     list_to_smbus_data(data, lst)
     assert smbus_data_to_list(data) == list(range(10))
+
+
+@pytest.fixture
+def devnull_bus():
+    """SMBus connected to a file that does not implement the i2c ioctls"""
+    bus = SMBus()
+    bus._fd = os.open(os.devnull, os.O_RDWR)
+    bus._addr = 0x50
+    yield bus
+    bus.close()
+
+
+def test_read_registers_not_a_bus(devnull_bus):
+    with pytest.raises(IOError):
+        devnull_bus.read_registers(0x50, [0, 1, 2])
+    with pytest.raises(IOError):
+        devnull_bus.read_registers(0x50, [0, 1, 2], True)
+    with pytest.raises(IOError):
+        devnull_bus.write_registers(0x50, [(0, 1), (1, 2)])
+
+
+def test_read_into_not_a_bus(devnull_bus):
+    with pytest.raises(IOError):
+        devnull_bus.read_i2c_block_data_into(0x50, 0, bytearray(8))
+    with pytest.raises(IOError):
+        devnull_bus.read_block_data_into(0x50, 0, bytearray(32))
+
+
+def test_read_into_buffer_checks(devnull_bus):
+    with pytest.raises(OverflowError):
+        devnull_bus.read_i2c_block_data_into(0x50, 0, bytearray(33))
+    with pytest.raises(OverflowError):
+        devnull_bus.read_i2c_block_data_into(0x50, 0, bytearray())
+    with pytest.raises(BufferError):
+        devnull_bus.read_i2c_block_data_into(0x50, 0, b'readonly')
+
+
+def test_single_value_not_a_bus(devnull_bus):
+    import errno
+    with pytest.raises(IOError) as excinfo:
+        devnull_bus.read_byte_data(0x51, 0)
+    assert excinfo.value.args[0] == errno.ENOTTY
+    # the selected slave address is unknown after a failed transaction
+    assert devnull_bus._addr == -1
+    for args in [('write_quick', 0x50), ('read_byte', 0x50),
+                 ('write_byte', 0x50, 1), ('write_byte_data', 0x50, 1, 2),
+                 ('read_word_data', 0x50, 1),
+                 ('write_word_data', 0x50, 1, 2),
+                 ('process_call', 0x50, 1, 2)]:
+        with pytest.raises(IOError):
+            getattr(devnull_bus, args[0])(*args[1:])
+
+
+def test_single_value_not_connected():
+    import errno
+    bus = SMBus()
+    with pytest.raises(IOError) as excinfo:
+        bus.read_byte(0x50)
+    assert excinfo.value.args[0] == errno.EBADF
+
+
+def test_import_is_lazy():
+    code = ("import sys, smbus\n"
+            "assert 'smbus._smbus_cffi' not in sys.modules\n"
+            "bus = smbus.SMBus()\n"
+            "assert 'smbus._smbus_cffi' in sys.modules\n"
+            "assert smbus.ffi is sys.modules['smbus._smbus_cffi'].ffi\n")
+    cwd = os.path.join(os.path.dirname(__file__), '..')
+    subprocess.check_call([sys.executable, '-c', code], cwd=cwd)
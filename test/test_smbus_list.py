@@ -1,5 +1,6 @@
 import pytest
 from smbus import ffi, list_to_smbus_data, smbus_data_to_list
+from smbus import smbus_data_to_bytes
 
 
 def test_list_to_smbus_data():
@@ -18,6 +19,14 @@ def test_smbus_data_to_list():
     assert smbus_data_to_list(data) == list(range(10))
 
 
+def test_smbus_data_to_bytes():
+    data = ffi.new("union i2c_smbus_data *")
+    list_to_smbus_data(data, b'\x01\x02\xff')
+    assert smbus_data_to_bytes(data) == b'\x01\x02\xff'
+    list_to_smbus_data(data, list(range(32)))
+    assert smbus_data_to_bytes(data) == bytes(bytearray(range(32)))
+
+
 def test_list_to_smbus_data_errors():
     data = ffi.new("union i2c_smbus_data *")
     l = list(range(33))
@@ -34,3 +43,19 @@ def test_list_to_smbus_full():
     assert data.block[0] == len(lst)
     for i in range(len(lst)):
         assert data.block[i + 1] == i + 1
+
+
+@pytest.mark.parametrize('vals', [
+    b'\x01\x02\x03', bytearray(b'\x01\x02\x03'), memoryview(b'\x01\x02\x03')])
+def test_buffer_to_smbus_data(vals):
+    data = ffi.new("union i2c_smbus_data *")
+    list_to_smbus_data(data, vals)
+    assert smbus_data_to_list(data) == [1, 2, 3]
+
+
+def test_buffer_to_smbus_data_errors():
+    data = ffi.new("union i2c_smbus_data *")
+    with pytest.raises(OverflowError):
+        list_to_smbus_data(data, bytes(bytearray(33)))
+    with pytest.raises(OverflowError):
+        list_to_smbus_data(data, bytearray())
@@ -0,0 +1,116 @@
+import errno
+import os
+
+import pytest
+from smbus import SMBus
+from smbus.cache import RegisterCache
+from smbus.metrics import Metrics
+from smbus.sim import SimulatedBus
+from smbus.smbus import SMBUS
+from smbus.trace import TraceRecorder
+
+ADDR = 0x50
+
+
+def test_status(bus, sim):
+    assert bus.read_byte_data_status(ADDR, 1) == (0x11, 0)
+    assert bus.read_word_data_status(ADDR, 1) == (0x2211, 0)
+    assert bus.write_byte_data_status(ADDR, 3, 0x33) == (None, 0)
+    assert bus.write_word_data_status(ADDR, 4, 0x4444) == (None, 0)
+    assert bus.write_byte_status(ADDR, 3) == (None, 0)
+    assert bus.read_byte_status(ADDR) == (0x33, 0)
+    assert bus.write_quick_status(ADDR) == (None, 0)
+    assert bus.read_byte_data_status(0x51, 1) == (None, errno.ENXIO)
+    assert bus._addr == -1
+    sim.inject(ADDR, errno.EREMOTEIO)
+    assert bus.write_byte_data_status(ADDR, 3, 0) == (None, errno.EREMOTEIO)
+    assert sim.devices[ADDR].registers[3] == 0x33
+
+
+def test_status_retry(bus, sim, monkeypatch):
+    import smbus.sim
+    sleeps = []
+    monkeypatch.setattr(smbus.sim.time, 'sleep', sleeps.append)
+    sim.inject(ADDR, errno.EREMOTEIO, count=3)
+    before = sim.stats['I2C_SMBUS']
+    assert bus.read_byte_data_status(ADDR, 2, tries=5, delay=0.001) == \
+        (0x22, 0)
+    assert sim.stats['I2C_SMBUS'] - before == 4
+    assert sleeps == [0.001] * 3
+    sim.inject(ADDR, errno.EREMOTEIO, count=3)
+    assert bus.read_byte_data_status(ADDR, 2, 2) == (None, errno.EREMOTEIO)
+    sim.clear_faults()
+    # only a missing acknowledge is retried
+    sim.inject(ADDR, errno.EIO, count=3)
+    before = sim.stats['I2C_SMBUS']
+    assert bus.read_byte_data_status(ADDR, 2, tries=5) == (None, errno.EIO)
+    assert sim.stats['I2C_SMBUS'] - before == 1
+
+
+def test_wait_ack(bus, sim):
+    assert bus.wait_ack(ADDR) == 1
+    sim.inject(ADDR, errno.ENXIO, count=6)
+    assert bus.wait_ack(ADDR, delay=0) == 7
+    sim.inject(ADDR, errno.ENXIO, count=None)
+    with pytest.raises(IOError) as excinfo:
+        bus.wait_ack(ADDR, tries=3, delay=0)
+    assert excinfo.value.args[0] == errno.ENXIO
+
+
+def test_status_not_a_bus():
+    bus = SMBus()
+    bus._fd = os.open(os.devnull, os.O_RDWR)
+    try:
+        assert bus.read_byte_data_status(ADDR, 1, tries=3) == \
+            (None, errno.ENOTTY)
+        assert bus.write_quick_status(ADDR) == (None, errno.ENOTTY)
+    finally:
+        bus.close()
+
+
+def test_status_funcs_policy(sim):
+    sim = SimulatedBus(sim.devices, funcs=SMBUS.I2C_FUNC_I2C)
+    bus = SMBus(1, backend=sim)
+    bus.funcs_policy = 'check'
+    assert bus.read_word_data_status(ADDR, 1) == (None, errno.EOPNOTSUPP)
+    bus.funcs_policy = 'emulate'
+    assert bus.read_word_data_status(ADDR, 1) == (0x2211, 0)
+    sim.inject(ADDR, errno.EREMOTEIO, count=1)
+    assert bus.read_word_data_status(ADDR, 1, tries=2) == (0x2211, 0)
+    assert bus.write_quick_status(ADDR) == (None, errno.EOPNOTSUPP)
+    assert sim.stats['I2C_SMBUS'] == 0
+
+
+def test_status_metrics(bus, sim):
+    metrics = Metrics()
+    bus.add_layer(metrics)
+    bus.read_word_data_status(ADDR, 1)
+    bus.read_word_data_status(0x51, 1)
+    series = dict(((t['addr'], t['transaction']), t)
+                  for t in metrics.snapshot()['transactions'])
+    assert series[(ADDR, 'read_word_data_status')]['bytes'] == 2
+    assert series[(ADDR, 'read_word_data_status')]['errors'] == {}
+    assert series[(0x51, 'read_word_data_status')]['errors'] == \
+        {errno.ENXIO: 1}
+
+
+@pytest.mark.parametrize('layer', [Metrics, RegisterCache, TraceRecorder])
+def test_delay_under_layers(bus, sim, monkeypatch, layer):
+    import smbus.sim
+    sleeps = []
+    monkeypatch.setattr(smbus.sim.time, 'sleep', sleeps.append)
+    bus.add_layer(layer())
+    calls = [
+        (lambda: bus.read_byte_data_status(ADDR, 1, 3, 0.002), (0x11, 0)),
+        (lambda: bus.read_byte_data_status(ADDR, 1, delay=0.002, tries=3),
+         (0x11, 0)),
+        (lambda: bus.write_quick_status(ADDR, 3, 0.002), (None, 0)),
+        (lambda: bus.write_byte_status(ADDR, 1, delay=0.002, tries=3),
+         (None, 0)),
+        (lambda: bus.wait_ack(ADDR, 3, 0.002), 3),
+        (lambda: bus.wait_ack(ADDR, delay=0.002), 3),
+    ]
+    for call, result in calls:
+        sim.inject(ADDR, errno.ENXIO, count=2)
+        assert call() == result
+    assert sleeps == [pytest.approx(0.002)] * (2 * len(calls))
@@ -0,0 +1,86 @@
+import os
+import threading
+
+import pytest
+from smbus import SMBus, ThreadSafeSMBus, shared_bus
+from smbus import threadsafe
+from smbus.threadsafe import release_shared_bus
+
+
+class RecordingLock(object):
+    def __init__(self):
+        self.events = []
+
+    def __enter__(self):
+        self.events.append('acquire')
+
+    def __exit__(self, *args):
+        self.events.append('release')
+
+
+def test_transactions_hold_lock():
+    lock = RecordingLock()
+    bus = ThreadSafeSMBus(lock=lock)
+    with pytest.raises(IOError):
+        bus.read_byte_data(0x50, 1)
+    assert lock.events == ['acquire', 'release']
+    with pytest.raises(OverflowError):
+        bus.transfer([])
+    assert lock.events == ['acquire', 'release'] * 2
+
+
+def test_locked_methods_keep_docs():
+    assert ThreadSafeSMBus.read_byte.__doc__ == SMBus.read_byte.__doc__
+
+
+def test_bus_lock_is_shared():
+    assert threadsafe.bus_lock(3) is threadsafe.bus_lock(3)
+    assert threadsafe.bus_lock(3) is not threadsafe.bus_lock(4)
+
+
+@pytest.fixture
+def fake_open(monkeypatch):
+    opened = []
+
+    def open(self, bus):
+        self._fd = os.open(os.devnull, os.O_RDWR)
+        self._bus = bus
+        opened.append(bus)
+    monkeypatch.setattr(SMBus, 'open', open)
+    return opened
+
+
+def test_shared_bus_refcount(fake_open):
+    a = shared_bus(7)
+    b = shared_bus(7)
+    assert a is b
+    assert fake_open == [7]
+    assert a._lock is threadsafe.bus_lock(7)
+    a.close()
+    assert b._fd != -1
+    b.close()
+    assert b._fd == -1
+    assert 7 not in threadsafe._shared
+    b.close()
+    with pytest.raises(ValueError):
+        release_shared_bus(7)
+    c = shared_bus(7)
+    assert c is not a and c._refs == 1
+    c.close()
+
+
+def test_shared_bus_threads(fake_open):
+    handles = []
+
+    def worker():
+        handles.append(shared_bus(8))
+    threads = [threading.Thread(target=worker) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(set(map(id, handles))) == 1
+    assert fake_open == [8]
+    for handle in handles:
+        handle.close()
+    assert 8 not in threadsafe._shared
@@ -0,0 +1,142 @@
+import errno
+from array import array
+
+import pytest
+from smbus import SMBus, i2c_msg
+from smbus.sim import RegisterDevice
+from smbus.trace import TraceRecorder, read_trace, replay
+
+
+@pytest.fixture
+def devices():
+    return lambda: {0x50: RegisterDevice({1: 0x11, 2: 0x22}),
+                    0x51: RegisterDevice(blocks={5: b'xyz'})}
+
+
+def exercise(bus, sim):
+    bus.read_byte_data(0x50, 1)
+    bus.write_byte_data(0x50, 3, 0x33)
+    bus.read_word_data(addr=0x50, cmd=1)
+    bus.write_i2c_block_data(0x51, 0, b'abcd')
+    bus.read_i2c_block_data(0x51, 0, 4)
+    bus.read_block_data_into(0x51, 5, bytearray(8))
+    bus.read_registers(0x50, [1, 2, 3], word=True)
+    bus.write_registers(0x50, [(4, 0x44), (5, 0x55)])
+    bus.transfer([i2c_msg.write(0x50, [1]), i2c_msg.read(0x50, 3)])
+    sim.inject(0x50, errno.EREMOTEIO)
+    with pytest.raises(IOError):
+        bus.read_byte(0x50)
+
+
+def test_record_and_replay(bus, sim, make_sim, tmpdir):
+    path = str(tmpdir.join('trace.smbt'))
+    recorder = TraceRecorder(path)
+    bus.add_layer(recorder)
+    exercise(bus, sim)
+    recorder.close()
+
+    start_time, records = read_trace(path)
+    assert len(records) == 10
+    names = [r.transaction for r in records]
+    assert names[0] == 'read_byte_data'
+    assert records[0].args == (0x50, 1)
+    assert records[0].result == 0x11
+    assert records[2].args == (0x50, 1)
+    assert records[2].result == 0x2211
+    assert records[4].result == list(b'abcd')
+    assert records[5].args[2] == bytearray(8)
+    assert records[5].result == 3
+    assert records[6].result == array('H', [0x2211, 0x3322, 0x0033])
+    assert records[7].args[1] == [(4, 0x44), (5, 0x55)]
+    assert [m.tobytes() for m in records[8].args[0]] == \
+        [b'\x01', b'\x11\x22\x33']
+    assert records[9].errno == errno.EREMOTEIO
+    assert records[9].result is None
+    times = [r.time for r in records]
+    assert times == sorted(times)
+    assert all(r.duration >= 0 for r in records)
+
+    summary = replay(path, SMBus(1, backend=make_sim()), speed=None)
+    assert summary['transactions'] == 10
+    # the injected fault is not part of the trace
+    assert [m[0] for m in summary['mismatches']] == [9]
+
+    replay_sim = make_sim()
+    replay_sim.devices[0x50].registers[1] = 0x99
+    summary = replay(records[:9], SMBus(1, backend=replay_sim), speed=None)
+    assert [m[0] for m in summary['mismatches']] == [0, 2, 6, 8]
+
+
+def test_ring(bus, tmpdir):
+    recorder = TraceRecorder(ring=3)
+    bus.add_layer(recorder)
+    for cmd in range(10):
+        bus.read_byte_data(0x50, cmd)
+    assert [r.args[1] for r in recorder.records()] == [7, 8, 9]
+
+    path = str(tmpdir.join('ring.smbt'))
+    recorder.dump(path)
+    start_time, records = read_trace(path)
+    assert start_time == recorder.start_time
+    assert list(recorder.records()) == records
+
+    bus.remove_layer(recorder)
+    bus.read_byte_data(0x50, 0)
+    assert len(list(recorder.records())) == 3
+
+
+def test_replay_timing(bus, make_sim):
+    recorder = TraceRecorder()
+    bus.add_layer(recorder)
+    bus.read_byte_data(0x50, 1)
+    records = list(recorder.records())
+    records.append(records[0]._replace(time=records[0].time + 0.05))
+    summary = replay(records, SMBus(1, backend=make_sim()))
+    assert summary['elapsed'] >= 0.05
+    assert summary['mismatches'] == []
+    summary = replay(records, SMBus(1, backend=make_sim()), speed=None)
+    assert summary['elapsed'] < 0.05
+
+
+def test_not_a_trace(tmpdir):
+    path = tmpdir.join('bogus')
+    path.write('hello world, not a trace')
+    with pytest.raises(ValueError):
+        read_trace(str(path))
+
+
+def test_old_version(tmpdir):
+    path = tmpdir.join('old.smbt')
+    path.write_binary(b'SMBT\x01' + b'\x00' * 8)
+    with pytest.raises(ValueError) as e:
+        read_trace(str(path))
+    assert 'version 1' in str(e.value)
+
+
+def test_float_and_keyword_args(bus, make_sim):
+    recorder = TraceRecorder()
+    bus.add_layer(recorder)
+    assert bus.read_byte_data_status(0x50, 1, 3, 0.001) == (0x11, 0)
+    assert bus.read_byte_data_status(0x50, 2, delay=0.002) == (0x22, 0)
+    records = list(recorder.records())
+    assert records[0].args == (0x50, 1, 3, 0.001)
+    assert records[1].args == (0x50, 2, 1, 0.002)
+    assert replay(records, SMBus(1, backend=make_sim()),
+                  speed=None)['mismatches'] == []
+
+
+def test_encoding_failure_keeps_result(bus, sim, monkeypatch):
+    import smbus.trace
+
+    def broken(*args):
+        raise TypeError("cannot encode")
+    monkeypatch.setattr(smbus.trace, '_encode_record', broken)
+    recorder = TraceRecorder()
+    bus.add_layer(recorder)
+    assert bus.read_byte_data(0x50, 1) == 0x11
+    sim.inject(0x50, errno.EREMOTEIO)
+    with pytest.raises(IOError) as e:
+        bus.read_byte_data(0x50, 1)
+    assert e.value.args[0] == errno.EREMOTEIO
+    assert recorder.dropped == 2
+    assert list(recorder.records()) == []
@@ -1,5 +1,5 @@
-from smbus.util import validate
-import py
+import pytest
+from smbus.util import validate, Block
 
 
 @validate(a=int, b=str, c=float, d=dict, e=list)
@@ -22,27 +22,33 @@ def test_all():
 
 
 def test_missing_args():
-    py.test.raises(TypeError, "fn(1, '123', 1.0)")
+    with pytest.raises(TypeError):
+        fn(1, '123', 1.0)
 
 
 def test_int():
-    py.test.raises(TypeError, "fn(1.0, '123', 1.0, {'a': 2}, [1])")
+    with pytest.raises(TypeError):
+        fn(1.0, '123', 1.0, {'a': 2}, [1])
 
 
 def test_float():
-    py.test.raises(TypeError, "fn(1, '123', '1', {'a': 2}, [1])")
+    with pytest.raises(TypeError):
+        fn(1, '123', '1', {'a': 2}, [1])
 
 
 def test_string():
-    py.test.raises(TypeError, "fn(1, 123, '1', {'a': 2}, [1])")
+    with pytest.raises(TypeError):
+        fn(1, 123, '1', {'a': 2}, [1])
 
 
 def test_list():
-    py.test.raises(TypeError, "fn(1, 123, '1', {'a': 2}, '1')")
+    with pytest.raises(TypeError):
+        fn(1, 123, '1', {'a': 2}, '1')
 
 
 def test_dict():
-    py.test.raises(TypeError, "fn(1, 123, '1', 2, [1])")
+    with pytest.raises(TypeError):
+        fn(1, 123, '1', 2, [1])
 
 
 def test_partial_spec():
@@ -52,11 +58,37 @@ def test_partial_spec():
 def test_default_arg():
     assert fn3(1, 2) == (1, 2, 3.2)
     assert fn3(1, 2, 4.1) == (1, 2, 4.1)
-    py.test.raises(TypeError, "fn3(1, 123, '1')")
+    with pytest.raises(TypeError):
+        fn3(1, 123, '1')
 
 
-@py.test.mark.skipif("sys.version_info[0] < 3")
+@pytest.mark.skipif("sys.version_info[0] < 3")
 def test_default_kwarg():
     args = [1, 2]
     assert fn3(*args) == (1, 2, 3.2)
-    # currently not supported assert fn3(*args, c=4) == (1, 2, 4)
+    assert fn3(*args, c=4.0) == (1, 2, 4.0)
+    with pytest.raises(TypeError):
+        fn3(*args, c=4)
+
+
+def test_keeps_name_and_doc():
+    @validate(a=int)
+    def documented(a):
+        """docstring"""
+    assert documented.__name__ == 'documented'
+    assert documented.__doc__ == 'docstring'
+
+
+@validate(a=Block)
+def fn4(a):
+    return a
+
+
+def test_block():
+    assert fn4([1]) == [1]
+    assert fn4(b'\x01') == b'\x01'
+    assert fn4(bytearray(b'\x01')) == bytearray(b'\x01')
+    with pytest.raises(TypeError):
+        fn4(1)
+    with pytest.raises(TypeError):
+        fn4({'a': 2})